@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+# Make the pipeline modules importable when running from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "main_code"))
+
+from synthetic_data import generate_dataset
+from logger_config import setup_logger
+
+# This script times every pipeline stage on synthetic data sets of increasing size and records
+# peak memory, writing machine-readable results so runs on different versions can be compared.
+# The results and the log of the run are written to benchmarks/results unless --output says otherwise.
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Named data set sizes: (contigs, genes per contig, exons per transcript, contig length)
+SIZES = {
+    "small": (1, 200, 5, 1_000_000),
+    "medium": (4, 2_000, 8, 10_000_000),
+    "large": (12, 5_000, 10, 50_000_000),
+}
+
+
+def git_version():
+    """
+    Returns the current git commit of the repository, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def time_stage(name, function, *args, trace_memory=False, **kwargs):
+    """
+    Runs one stage and returns (result, measurements).
+    process_peak_rss_mb is the peak RSS of the whole benchmark process up to the end of the stage
+    (ru_maxrss never decreases), not the memory of the stage alone.
+    With trace_memory, the peak of Python allocations during the stage is measured with tracemalloc.
+    """
+    from profiling import peak_rss_mb
+    if trace_memory:
+        tracemalloc.start()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    result = function(*args, **kwargs)
+    measurements = {
+        "stage": name,
+        "wall_seconds": round(time.perf_counter() - start_wall, 4),
+        "cpu_seconds": round(time.process_time() - start_cpu, 4),
+        "process_peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if trace_memory:
+        measurements["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 1)
+        tracemalloc.stop()
+    return result, measurements
+
+# Function to benchmark the pipeline on one data set
+def run_benchmark(size, work_dir, annotation_format="gff3", trace_memory=False, output_options=None):
+    """
+    Generates the data set for `size` in work_dir and times make_introns_file, create_database,
+    add_sequences and write_output on it. Returns a result dictionary.
+    """
+    from input_processing import make_introns_file
+    from database import create_database
+    from fasta_processing import add_sequences
+    from output import write_output
+
+    contigs, genes_per_contig, exons_per_transcript, contig_length = SIZES[size]
+    start = time.perf_counter()
+    annotation_file, fasta_file = generate_dataset(
+        work_dir, contigs, genes_per_contig, exons_per_transcript, contig_length, annotation_format
+    )
+    generation_seconds = round(time.perf_counter() - start, 2)
+
+    stages = []
+    introns_file, measurements = time_stage(
+        "make_introns_file", make_introns_file, annotation_file, os.path.join(work_dir, "synthetic_introns.gff"),
+        trace_memory=trace_memory
+    )
+    stages.append(measurements)
+    engine, measurements = time_stage("create_database", create_database, introns_file, trace_memory=trace_memory)
+    stages.append(measurements)
+    engine, measurements = time_stage("add_sequences", add_sequences, engine, fasta_file, trace_memory=trace_memory)
+    stages.append(measurements)
+    _, measurements = time_stage(
+        "write_fastas_zip", write_output, engine, os.path.join(work_dir, "introns"), **(output_options or {}),
+        trace_memory=trace_memory
+    )
+    stages.append(measurements)
+
+    with open(introns_file) as f:
+        intron_count = sum(not line.startswith("#") for line in f)  # Transcript comment lines are not introns
+    return {
+        "size": size,
+        "format": annotation_format,
+        "contigs": contigs,
+        "genes_per_contig": genes_per_contig,
+        "exons_per_transcript": exons_per_transcript,
+        "contig_length": contig_length,
+        "introns": intron_count,
+        "generation_seconds": generation_seconds,
+        "total_seconds": round(sum(stage["wall_seconds"] for stage in stages), 4),
+        "stages": stages,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GetIntronSeq pipeline stages on synthetic data.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small"], help="Data set sizes to run (default: small).")
+    parser.add_argument("--format", choices=["gff3", "gtf"], default="gff3", help="Annotation format (default: gff3).")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "benchmark_results.json"),
+                        help="Results file (default: benchmarks/results/benchmark_results.json); the log is written next to it.")
+    parser.add_argument("--work-dir", required=False, help="Keep generated data in this directory instead of a temporary one.")
+    parser.add_argument("--trace-memory", action="store_true", help="Measure per-stage peak Python allocations with tracemalloc (slower).")
+    args = parser.parse_args()
+    # Configured before the pipeline modules are imported, since the first setup_logger call wins
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(output_dir, exist_ok=True)
+    setup_logger(os.path.join(output_dir, "GetIntronSeq.log"))
+
+    results = {
+        "version": git_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": [],
+    }
+    for size in args.sizes:
+        if args.work_dir:
+            work_dir = os.path.join(args.work_dir, size)
+            results["runs"].append(run_benchmark(size, work_dir, args.format, args.trace_memory))
+        else:
+            with tempfile.TemporaryDirectory() as work_dir:
+                results["runs"].append(run_benchmark(size, work_dir, args.format, args.trace_memory))
+        run = results["runs"][-1]
+        print(f"{size}: {run['introns']} introns in {run['total_seconds']} s")
+
+    with open(args.output, "w") as out:
+        json.dump(results, out, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import os
+import random
+import argparse
+
+# This script generates a synthetic genome (FASTA) and a matching annotation (GFF3 or GTF)
+# of configurable size, so the pipeline can be benchmarked well beyond the sample data.
+
+# Maps every byte value to a base, so random bytes can be turned into sequence quickly
+BASE_TABLE = bytes(b"ACGT"[i % 4] for i in range(256))
+
+
+def write_fasta(fasta_file, contigs, contig_length, line_width=60, seed=0):
+    """
+    Writes `contigs` random contigs of contig_length bases, wrapped at line_width.
+    """
+    rng = random.Random(seed)
+    with open(fasta_file, "wb") as out:
+        for number in range(1, contigs + 1):
+            out.write(f">contig{number}\n".encode())
+            sequence = rng.getrandbits(contig_length * 8).to_bytes(contig_length, "little").translate(BASE_TABLE)
+            for start in range(0, contig_length, line_width):
+                out.write(sequence[start:start + line_width] + b"\n")
+    return fasta_file
+
+def gene_models(contigs, genes_per_contig, exons_per_transcript, contig_length, seed=0):
+    """
+    Yields (contig, gene, strand, exons) with non-overlapping genes spread evenly along each contig.
+    exons is a sorted list of (start, end), 1-based and inclusive.
+    """
+    rng = random.Random(seed)
+    span = contig_length // genes_per_contig
+    # Each exon and intron needs room: keep at least 20 bp per exon and 20 bp per intron
+    if span < exons_per_transcript * 40 + 2:
+        raise ValueError("Contigs are too short for the requested number of genes and exons.")
+
+    for contig_number in range(1, contigs + 1):
+        contig = f"contig{contig_number}"
+        for gene_number in range(1, genes_per_contig + 1):
+            gene_start = (gene_number - 1) * span + 1
+            # Split the gene span into 2 * exons - 1 alternating exon/intron segments
+            segment = (span - 2) // (2 * exons_per_transcript - 1)
+            exons = []
+            position = gene_start
+            for _ in range(exons_per_transcript):
+                length = rng.randint(max(20, segment // 2), segment)
+                exons.append((position, position + length - 1))
+                position += segment + rng.randint(max(20, segment // 2), segment)
+            yield contig, f"{contig}.g{gene_number}", rng.choice("+-"), exons
+
+def intron_spans(exons):
+    """
+    Returns the (start, end) of the gaps between consecutive exons, as AUGUSTUS reports introns.
+    """
+    return [(previous[1] + 1, following[0] - 1) for previous, following in zip(exons, exons[1:])]
+
+def write_gff3(annotation_file, models):
+    """
+    Writes gene, transcript, exon, CDS and intron features in GFF3, AUGUSTUS-style IDs (gene.t1 transcripts).
+    """
+    with open(annotation_file, "w") as out:
+        out.write("##gff-version 3\n")
+        for contig, gene, strand, exons in models:
+            transcript = f"{gene}.t1"
+            start, end = exons[0][0], exons[-1][1]
+            out.write(f"{contig}\tsynthetic\tgene\t{start}\t{end}\t.\t{strand}\t.\tID={gene}\n")
+            out.write(f"{contig}\tsynthetic\ttranscript\t{start}\t{end}\t.\t{strand}\t.\tID={transcript};Parent={gene}\n")
+            for exon_start, exon_end in exons:
+                out.write(f"{contig}\tsynthetic\texon\t{exon_start}\t{exon_end}\t.\t{strand}\t.\tParent={transcript}\n")
+                out.write(f"{contig}\tsynthetic\tCDS\t{exon_start}\t{exon_end}\t.\t{strand}\t0\tID={transcript}.cds;Parent={transcript}\n")
+            for intron_start, intron_end in intron_spans(exons):
+                out.write(f"{contig}\tsynthetic\tintron\t{intron_start}\t{intron_end}\t.\t{strand}\t.\tParent={transcript}\n")
+    return annotation_file
+
+def write_gtf(annotation_file, models):
+    """
+    Writes transcript, exon, CDS and intron features in GTF.
+    """
+    with open(annotation_file, "w") as out:
+        for contig, gene, strand, exons in models:
+            attributes = f'gene_id "{gene}"; transcript_id "{gene}.t1";'
+            out.write(f"{contig}\tsynthetic\ttranscript\t{exons[0][0]}\t{exons[-1][1]}\t.\t{strand}\t.\t{attributes}\n")
+            for exon_start, exon_end in exons:
+                out.write(f"{contig}\tsynthetic\texon\t{exon_start}\t{exon_end}\t.\t{strand}\t.\t{attributes}\n")
+                out.write(f"{contig}\tsynthetic\tCDS\t{exon_start}\t{exon_end}\t.\t{strand}\t0\t{attributes}\n")
+            for intron_start, intron_end in intron_spans(exons):
+                out.write(f"{contig}\tsynthetic\tintron\t{intron_start}\t{intron_end}\t.\t{strand}\t.\t{attributes}\n")
+    return annotation_file
+
+# Function to generate a complete synthetic data set
+def generate_dataset(out_dir, contigs=1, genes_per_contig=100, exons_per_transcript=5, contig_length=1_000_000,
+                     annotation_format="gff3", line_width=60, seed=0):
+    """
+    Writes synthetic.fasta and synthetic.gff3 (or synthetic.gtf) into out_dir.
+    Returns (annotation_file, fasta_file).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    fasta_file = write_fasta(os.path.join(out_dir, "synthetic.fasta"), contigs, contig_length, line_width, seed)
+    models = gene_models(contigs, genes_per_contig, exons_per_transcript, contig_length, seed)
+    if annotation_format == "gtf":
+        annotation_file = write_gtf(os.path.join(out_dir, "synthetic.gtf"), models)
+    else:
+        annotation_file = write_gff3(os.path.join(out_dir, "synthetic.gff3"), models)
+    return annotation_file, fasta_file
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic genome and annotation for benchmarking GetIntronSeq.")
+    parser.add_argument("--output", required=True, help="Output directory.")
+    parser.add_argument("--contigs", type=int, default=1, help="Number of contigs (default: 1).")
+    parser.add_argument("--genes-per-contig", type=int, default=100, help="Genes per contig (default: 100).")
+    parser.add_argument("--exons-per-transcript", type=int, default=5, help="Exons per transcript (default: 5).")
+    parser.add_argument("--contig-length", type=int, default=1_000_000, help="Length of each contig in bases (default: 1000000).")
+    parser.add_argument("--format", choices=["gff3", "gtf"], default="gff3", help="Annotation format (default: gff3).")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+    args = parser.parse_args()
+
+    annotation_file, fasta_file = generate_dataset(
+        args.output, args.contigs, args.genes_per_contig, args.exons_per_transcript,
+        args.contig_length, args.format, seed=args.seed
+    )
+    print(f"Annotation written to {annotation_file}")
+    print(f"FASTA written to {fasta_file}")
+
+if __name__ == "__main__":
+    main()
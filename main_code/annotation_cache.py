@@ -0,0 +1,116 @@
+import os
+import hashlib
+import sqlite3
+import logging
+from logger_config import setup_logger
+from compressed_io import open_binary
+from database import working_engine
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script keeps an on-disk cache of intron databases keyed by the content hash of the inputs.
+# A cached intron table lets later runs skip parsing the annotation and loading the database;
+# a cached table with sequences also skips sequence attachment.
+
+DEFAULT_CACHE_SIZE = 2 * 1024 ** 3  # 2 GiB
+# Bump when the database schema, intron derivation or sequence extraction changes, so old entries are not reused
+CACHE_VERSION = "8"
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of a file's content (uncompressed, for gzip files).
+    """
+    digest = hashlib.sha256()
+    with open_binary(path) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_key(*parts):
+    """
+    Combines the cache version and the given parts (digests, options) into one cache key.
+    """
+    return hashlib.sha256("\t".join((CACHE_VERSION,) + parts).encode()).hexdigest()
+
+def cache_entry_path(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.sqlite")
+
+# Function to load a cached database into a new working engine
+def load_cached_database(cache_dir, key, spill_path=None, pragmas=None):
+    """
+    Returns an engine restored from the cache entry for key, or None on a miss. The engine is in memory,
+    or spilled to the file at spill_path (as create_database does), so a warm cache keeps the --spill-dir bound.
+    A hit refreshes the entry's modification time, which drives LRU eviction.
+    """
+    path = cache_entry_path(cache_dir, key)
+    try:
+        source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.OperationalError:
+        return None
+
+    engine = working_engine(spill_path, pragmas)
+    try:
+        raw = engine.raw_connection()
+        try:
+            source.backup(raw.driver_connection)
+        finally:
+            raw.close()
+        os.utime(path)
+    except (sqlite3.Error, OSError) as error:
+        logging.warning(f"Could not read cache entry {path}: {error}")
+        engine.dispose()
+        return None
+    finally:
+        source.close()
+
+    logging.info(f"Cache hit: {path}")
+    return engine
+
+# Function to store a database in the cache
+def store_cached_database(engine, cache_dir, key, max_bytes=DEFAULT_CACHE_SIZE):
+    """
+    Saves the engine's database under key and evicts least recently used entries
+    until the cache fits in max_bytes.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_entry_path(cache_dir, key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    target = sqlite3.connect(tmp_path)
+    raw = engine.raw_connection()
+    try:
+        raw.driver_connection.backup(target)
+    finally:
+        raw.close()
+        target.close()
+    os.replace(tmp_path, path)
+    logging.info(f"Stored cache entry: {path}")
+    evict_cache(cache_dir, max_bytes)
+    return path
+
+def evict_cache(cache_dir, max_bytes=DEFAULT_CACHE_SIZE):
+    """
+    Deletes the least recently used cache entries until the total size is at most max_bytes.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".sqlite"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue  # Removed by another process
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            logging.info(f"Evicted cache entry: {path}")
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
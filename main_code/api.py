@@ -0,0 +1,136 @@
+import logging
+from bisect import bisect_left, bisect_right
+from logger_config import setup_logger
+from file_type_validation import detect_file_format
+from intron_deriver import iter_intron_records
+from genome_store import open_genome
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script is the in-process API: it derives introns straight from an annotation file and reads their
+# sequences through the FASTA index, without the SQLite database or any output files.
+#
+#     from api import iter_introns, IntronIndex
+#     for intron in iter_introns("genome.gff3", "genome.fasta"):
+#         print(intron.gene, intron.beg, intron.end, len(intron))
+#     index = IntronIndex.from_file("genome.gff3")
+#     index.introns_in("contig1", 10000, 20000)
+
+
+class IntronRecord:
+    """
+    One intron. beg and end are 1-based and inclusive, as in the GFF; seq is the sequence written by
+    the pipeline (reverse-complemented on the minus strand by default), or None without a FASTA file.
+    """
+    __slots__ = ("contig", "gene", "transcript", "beg", "end", "strand", "seq")
+
+    def __init__(self, contig, gene, transcript, beg, end, strand, seq=None):
+        self.contig = contig
+        self.gene = gene
+        self.transcript = transcript
+        self.beg = beg
+        self.end = end
+        self.strand = strand
+        self.seq = seq
+
+    def __len__(self):
+        return self.end - self.beg + 1
+
+    def __eq__(self, other):
+        if not isinstance(other, IntronRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"IntronRecord({self.contig}:{self.beg}-{self.end}{self.strand} gene={self.gene} transcript={self.transcript})"
+
+# Function to iterate over the introns of an annotation file
+def iter_introns(annotation_file, fasta_file=None, unique=True, strand_aware=True, genome_store=False, file_format=None):
+    """
+    Lazily yields an IntronRecord for every intron derived from the exons of the annotation file.
+    With fasta_file, each record carries its sequence, read on demand through the FASTA index
+    (or the 2-bit genome store with genome_store=True). With unique, an intron shared by several
+    transcripts of a gene is yielded once, as in the intron database.
+    """
+    gtf = (file_format or detect_file_format(annotation_file)) == "GTF"
+    genome = open_genome(fasta_file, genome_store) if fasta_file else None
+    seen = set()
+    missing_contigs = set()
+    try:
+        for gene, transcript, contig, beg, end, strand, _, _ in iter_intron_records(annotation_file, gtf=gtf):
+            if unique:
+                key = (gene, beg, end, strand)
+                if key in seen:
+                    continue
+                seen.add(key)
+
+            seq = None
+            if genome is not None:
+                if contig in genome:
+                    seq = genome.fetch(contig, beg - 1, end, strand if strand_aware else "+")
+                elif contig not in missing_contigs:
+                    missing_contigs.add(contig)
+                    logging.warning(f"Contig {contig} not found in FASTA file {fasta_file}. Sequences are left empty.")
+            yield IntronRecord(contig, gene, transcript, beg, end, strand, seq)
+    finally:
+        if genome is not None:
+            genome.close()
+
+
+class IntronIndex:
+    """
+    In-memory interval index of introns, one sorted array per contig.
+    introns_in() finds the introns overlapping a region by binary search on the start positions
+    and on the running maximum of the end positions, so no database query is needed.
+    """
+
+    def __init__(self, records):
+        by_contig = {}
+        for record in records:
+            by_contig.setdefault(record.contig, []).append(record)
+
+        self._records = {}
+        self._begs = {}
+        self._max_ends = {}
+        for contig, contig_records in by_contig.items():
+            contig_records.sort(key=lambda record: (record.beg, record.end))
+            max_ends = []
+            max_end = 0
+            for record in contig_records:
+                max_end = max(max_end, record.end)
+                max_ends.append(max_end)
+            self._records[contig] = contig_records
+            self._begs[contig] = [record.beg for record in contig_records]
+            self._max_ends[contig] = max_ends
+
+    @classmethod
+    def from_file(cls, annotation_file, fasta_file=None, **kwargs):
+        """
+        Builds the index from iter_introns(annotation_file, fasta_file, **kwargs).
+        """
+        return cls(iter_introns(annotation_file, fasta_file, **kwargs))
+
+    def __len__(self):
+        return sum(len(records) for records in self._records.values())
+
+    def __iter__(self):
+        for records in self._records.values():
+            yield from records
+
+    def contigs(self):
+        return list(self._records)
+
+    def introns_in(self, contig, start, end, contained=False):
+        """
+        Returns the introns of contig that overlap [start, end] (1-based, inclusive), sorted by position.
+        With contained, only the introns that lie entirely inside the region are returned.
+        """
+        if contig not in self._records:
+            return []
+        records = self._records[contig]
+        # Introns before `first` all end before start; introns from `last` on all begin after end
+        first = bisect_left(self._max_ends[contig], start)
+        last = bisect_right(self._begs[contig], end)
+        if contained:
+            return [record for record in records[first:last] if record.beg >= start and record.end <= end]
+        return [record for record in records[first:last] if record.end >= start]
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import logging
+from logger_config import setup_logger
+from annotation_cache import file_digest
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script keeps the checkpoint manifest of a batch run: one JSON entry per input in <output_dir>/manifest,
+# recording the stage reached, fingerprints of the inputs, the settings and the files written.
+# A re-run of the batch skips completed inputs and resumes the others from their last finished stage.
+
+MANIFEST_DIR = "manifest"
+MANIFEST_VERSION = 1
+# Stages in the order they are reached: the introns file is written, then the output
+STAGES = ("started", "introns", "completed")
+
+
+def manifest_path(output_dir, name):
+    return os.path.join(output_dir, MANIFEST_DIR, f"{name}.json")
+
+def load_manifest_entry(output_dir, name):
+    """
+    Returns the manifest entry of an input, or None when there is none (or it cannot be read).
+    """
+    path = manifest_path(output_dir, name)
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as error:
+        logging.warning(f"Ignoring unreadable manifest entry {path}: {error}")
+        return None
+    return entry if entry.get("version") == MANIFEST_VERSION else None
+
+def save_manifest_entry(output_dir, name, entry):
+    """
+    Writes the manifest entry of an input atomically, so a killed run never leaves a partial entry.
+    """
+    path = manifest_path(output_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as out:
+        json.dump(entry, out, indent=2)
+    os.replace(tmp_path, path)
+
+def input_fingerprint(path, previous=None):
+    """
+    Returns the size, modification time and SHA-256 of a file. The digest recorded in `previous`
+    is reused when the size and modification time have not changed, so large genomes are not re-hashed.
+    """
+    if path is None:
+        return None
+    stat = os.stat(path)
+    fingerprint = {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if previous and all(previous.get(key) == fingerprint[key] for key in ("path", "size", "mtime_ns")):
+        fingerprint["sha256"] = previous["sha256"]
+    else:
+        fingerprint["sha256"] = file_digest(path)
+    return fingerprint
+
+def same_content(fingerprint, previous):
+    if fingerprint is None or previous is None:
+        return fingerprint is previous
+    return fingerprint["sha256"] == previous.get("sha256")
+
+# Function to decide where a batch input can resume
+def resume_stage(entry, inputs, settings):
+    """
+    Returns the last finished stage of a manifest entry that is still valid for the given input
+    fingerprints and settings: "completed" when the output can be reused as it is, "introns" when only
+    the introns file can be reused, or None when the input has to be processed from the start.
+    """
+    if not entry or not same_content(inputs["gff"], entry.get("inputs", {}).get("gff")):
+        return None
+    if entry.get("settings", {}).get("introns") != settings["introns"]:
+        return None
+
+    stage = entry.get("stage")
+    if stage not in STAGES:
+        return None
+    introns_file = entry.get("introns_file")
+    introns_ready = STAGES.index(stage) >= STAGES.index("introns") and introns_file and os.path.exists(introns_file)
+    if (stage == "completed"
+            and same_content(inputs["fasta"], entry.get("inputs", {}).get("fasta"))
+            and entry.get("settings") == settings
+            and (entry.get("output") is None or os.path.exists(entry["output"]))):
+        return "completed"
+    return "introns" if introns_ready else None
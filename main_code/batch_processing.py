@@ -1,88 +1,236 @@
 import os
+import json
+import time
 import logging
-from input_processing import make_introns_file, input_contains_sequences, add_sequences
-from file_type_validation import detect_file_format
-from fasta_processing import preprocess_fasta, is_fasta_preprocessed
-from database import create_database
-from output import write_fastas_zip
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from input_processing import process_single_file
+from output import write_sequence_store
+from input_scanner import scan_input
+from compressed_io import strip_compression_extension
+from intron_store import genome_name
 from logger_config import setup_logger
+from annotation_cache import DEFAULT_CACHE_SIZE
+from batch_manifest import load_manifest_entry, save_manifest_entry, input_fingerprint, resume_stage, MANIFEST_VERSION
+from profiling import profiler, enable_profiling, take_stages, add_stages
 
 # Setup logger
 setup_logger("GetIntronSeq.log")
 
+# Annotation extensions picked up in batch mode, and FASTA extensions tried for each of them
+# (compressed variants are read as streams)
+ANNOTATION_EXTENSIONS = tuple(extension + suffix for suffix in ("", ".gz", ".bgz") for extension in (".gff", ".gff3", ".gtf"))
+FASTA_EXTENSIONS = tuple(extension + suffix for suffix in ("", ".gz", ".bgz") for extension in (".fasta", ".fa", ".fna"))
+# What to do when an input needs a FASTA file that cannot be found
+MISSING_FASTA_POLICIES = ("skip", "fail")
+
 # This script processes multiple GFF and FASTA files in a specified directory.
-def process_batch(input_dir, output_dir):
+
+def find_fasta_file(input_dir, file):
     """
-    Processes multiple GFF and FASTA files in the specified input directory.
-    Generates output files in the specified output directory.
+    Returns the FASTA file that sits next to an annotation file (same name, FASTA extension), or None.
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    stem = os.path.splitext(strip_compression_extension(file))[0]
+    for extension in FASTA_EXTENSIONS:
+        fasta_file = os.path.join(input_dir, stem + extension)
+        if os.path.exists(fasta_file):
+            return fasta_file
+    return None
+
+def batch_item_name(gff_file):
+    """
+    Returns the name of an input's output, manifest entry and shared-store genome: its base name without extensions.
+    """
+    return genome_name(gff_file)
+
+def plan_batch(input_dir, missing_fasta="skip"):
+    """
+    Lists the input directory and returns (jobs, skipped).
+    jobs is a list of (gff_file, fasta_file, scan) tuples to process; skipped is a list of summary entries
+    for the files that will not be processed. Annotations are scanned by the workers; only those without
+    a FASTA file next to them are scanned here, for a ##FASTA section (scan is then handed to the worker).
+    Raises FileNotFoundError for a missing FASTA file when missing_fasta is "fail", and ValueError when two
+    inputs share a name (e.g. a.gff3 and a.gtf), before any work has started.
+    """
+    if missing_fasta not in MISSING_FASTA_POLICIES:
+        raise ValueError(f"Unknown missing FASTA policy: {missing_fasta}. Choose from {', '.join(MISSING_FASTA_POLICIES)}.")
 
-    for file in os.listdir(input_dir):
-        if file.endswith(".gff") or file.endswith(".gff3") or file.endswith(".gtf"):
-            gff_file = os.path.join(input_dir, file)
+    files = [file for file in sorted(os.listdir(input_dir)) if file.endswith(ANNOTATION_EXTENSIONS)]
+    # Inputs with the same name would write the same output, manifest entry and store genome
+    names = {}
+    for file in files:
+        names.setdefault(batch_item_name(file), []).append(file)
+    collisions = [", ".join(group) for group in names.values() if len(group) > 1]
+    if collisions:
+        raise ValueError(f"Batch inputs must have distinct names; rename one of: {'; '.join(collisions)}.")
 
-            # Step 1: Detect file format
-            format_detected = detect_file_format(gff_file)
-            if format_detected not in ["GFF", "GFF3", "GTF", "GZIP"]:
+    jobs = []
+    skipped = []
+    for file in files:
+        gff_file = os.path.join(input_dir, file)
+        scan = None
+
+        # Look for the FASTA file, falling back to sequences embedded in the GFF file
+        fasta_file = find_fasta_file(input_dir, file)
+        if fasta_file is None:
+            scan = scan_input(gff_file)
+            if scan.format not in ["GFF", "GFF3", "GTF"]:
                 logging.warning(f"Skipping file {file}: format not recognized as GFF, GFF3, or GTF.")
+                skipped.append({"input": gff_file, "status": "skipped", "reason": "unrecognized format"})
                 continue
+        if fasta_file is None and scan.has_sequences:
+            logging.info(f"File {file} contains embedded sequences. No separate FASTA needed.")
+        elif fasta_file is None:
+            if missing_fasta == "fail":
+                raise FileNotFoundError(f"FASTA file for {file} not found in {input_dir}.")
+            logging.warning(f"FASTA file for {file} not found. Skipping.")
+            skipped.append({"input": gff_file, "status": "skipped", "reason": "missing FASTA file"})
+            continue
+        jobs.append((gff_file, fasta_file, scan))
 
-            fasta_file = os.path.join(input_dir, file.replace(".gff", ".fasta").replace(".gff3", ".fasta").replace(".gtf", ".fasta"))
+    return jobs, skipped
 
-            # Step 2: Check if the GFF file contains sequences
-            if input_contains_sequences(gff_file):
-                logging.info(f"File {file} contains embedded sequences. No separate FASTA needed.")
-                fasta_needed = False
-            else:
-                fasta_needed = True
-
-            # Step 3: If needed, verify existence of corresponding FASTA file
-            if fasta_needed:
-                if not os.path.exists(fasta_file):
-                    logging.warning(f"FASTA file for {file} not found.")
-                    user_input = input(f"FASTA file for {file} is missing. Please provide the path to the FASTA file: ").strip()
-                    if os.path.exists(user_input):
-                        fasta_file = user_input
-                    else:
-                        logging.error(f"Provided FASTA file path {user_input} does not exist. Skipping {file}.")
-                        continue
-
-            # Generate output paths
-            introns_file = os.path.join(output_dir, file.replace(".gff", "_introns.gff").replace(".gff3", "_introns.gff").replace(".gtf", "_introns.gff").replace(".gz", "_introns.gff"))
-            preprocessed_fasta = os.path.join(output_dir, file.replace(".gff", "_preprocessed.fasta").replace(".gff3", "_preprocessed.fasta").replace(".gtf", "_preprocessed.fasta").replace(".gz", "_preprocessed.fasta"))
-            zip_file = os.path.join(output_dir, "introns.zip")
-
-            # Step 4: Extract introns
-            logging.info(f"Processing GFF file: {gff_file}")
-            make_introns_file(gff_file, introns_file)
-
-            # Step 5: Create database
-            logging.info(f"Creating database for introns in: {introns_file}")
-            engine = create_database(introns_file)
-
-            # Step 6: Add sequences if needed
-            if not fasta_needed:
-                logging.info(f"Sequences already present in {file}. No FASTA processing needed.")
+def process_batch_item(gff_file, fasta_file, output_dir, sqlite_pragmas=None, use_gffutils=False, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE,
+                       scan=None, output_options=None, profile=False, sequence_options=None,
+                       export_options=None, stats_options=None, store_options=None, resume=True):
+    """
+    Processes one input genome into its own output (archive, directory or file) inside output_dir.
+    Runs in a worker process; errors are caught and reported in the returned summary entry.
+    With profile, the stage metrics of this input are returned in the entry under "stages".
+    Progress is checkpointed in the batch manifest; with resume, an input completed by an earlier run
+    with the same inputs and settings is not processed again, and a finished introns file is reused.
+    With store_options, the genome is appended to the persistent store (see intron_store.py).
+    """
+    if profile and not profiler.enabled:
+        enable_profiling()  # Worker process: stage metrics only, cProfile stays in the parent
+    first_stage = len(profiler.stages)
+    name = batch_item_name(gff_file)
+    output_name = os.path.join(output_dir, name)
+    start_time = time.perf_counter()
+    entry = {"input": gff_file, "fasta": fasta_file}
+    try:
+        # Compare the inputs and settings with the manifest entry of the previous run
+        previous = (load_manifest_entry(output_dir, name) if resume else None) or {}
+        previous_inputs = previous.get("inputs", {})
+        inputs = {
+            "gff": input_fingerprint(gff_file, previous_inputs.get("gff")),
+            "fasta": input_fingerprint(fasta_file, previous_inputs.get("fasta")),
+        }
+        settings = json.loads(json.dumps({
+            "introns": "gffutils" if use_gffutils else "native",
+            "output": output_options, "sequences": sequence_options, "export": export_options, "stats": stats_options,
+            "store": store_options,
+        }))
+        stage = resume_stage(previous, inputs, settings)
+        if stage != "completed" and scan is None:
+            # Scan the file once, here in the worker; the scan is handed on so it is not read again
+            scan = scan_input(gff_file, compute_digest=bool(cache_dir))
+
+        if stage == "completed":
+            logging.info(f"Skipping {gff_file}: completed by an earlier run.")
+            entry.update({"status": previous["status"], "output": previous["output"], "resumed_from": stage})
+            if previous.get("reason"):
+                entry["reason"] = previous["reason"]
+        elif scan.format not in ["GFF", "GFF3", "GTF"]:
+            logging.warning(f"Skipping file {gff_file}: format not recognized as GFF, GFF3, or GTF.")
+            entry.update({"status": "skipped", "reason": "unrecognized format"})
+        else:
+            record = {"version": MANIFEST_VERSION, "input": gff_file, "fasta": fasta_file, "inputs": inputs,
+                      "settings": settings, "stage": "started"}
+            if stage == "introns":
+                logging.info(f"Resuming {gff_file} from its introns file: {previous['introns_file']}")
+                record.update({"stage": stage, "introns_file": previous["introns_file"]})
+                entry["resumed_from"] = stage
+            save_manifest_entry(output_dir, name, record)
+
+            def checkpoint(stage, **details):
+                record.update(details, stage=stage)
+                save_manifest_entry(output_dir, name, record)
+
+            output_path = process_single_file(gff_file, fasta_file, output_name, sqlite_pragmas, use_gffutils, work_dir=output_dir,
+                                           cache_dir=cache_dir, cache_size=cache_size, scan=scan, output_options=output_options,
+                                           sequence_options=sequence_options, export_options=export_options, stats_options=stats_options,
+                                           introns_file=record.get("introns_file"), checkpoint=checkpoint, store_options=store_options)
+            if output_path is None:
+                entry.update({"status": "skipped", "reason": "no introns"})
             else:
-                # Preprocess FASTA if necessary
-                if not is_fasta_preprocessed(fasta_file):
-                    logging.info(f"Preprocessing FASTA file: {fasta_file}")
-                    preprocess_fasta(fasta_file, preprocessed_fasta)
-                else:
-                    preprocessed_fasta = fasta_file
+                entry.update({"status": "completed", "output": output_path})
+            checkpoint("completed", status=entry["status"], output=output_path, reason=entry.get("reason"))
+    except Exception as error:
+        logging.error(f"Processing of {gff_file} failed: {error}")
+        entry.update({"status": "failed", "reason": str(error)})
+    entry["seconds"] = round(time.perf_counter() - start_time, 3)
+    if profile:
+        entry["stages"] = [dict(stage, input=gff_file) for stage in take_stages(first_stage)]
+    return entry
+
+def write_batch_summary(summary, output_dir):
+    """
+    Writes the per-file summary report to batch_summary.json in the output directory and logs totals.
+    """
+    summary_file = os.path.join(output_dir, "batch_summary.json")
+    with open(summary_file, "w") as out:
+        json.dump(summary, out, indent=2)
+
+    counts = {}
+    for entry in summary:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    totals = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    logging.info(f"Batch summary written to {summary_file}: {totals or 'no inputs'}.")
+    return summary_file
+
+def process_batch(input_dir, output_dir, workers=1, missing_fasta="skip", sqlite_pragmas=None, use_gffutils=False,
+                  cache_dir=None, cache_size=DEFAULT_CACHE_SIZE, output_options=None, sequence_options=None,
+                  export_options=None, stats_options=None, store_options=None, resume=True):
+    """
+    Processes multiple GFF and FASTA files in the specified input directory.
+    Each input genome is written to its own output in the output directory, using up to
+    `workers` processes. Inputs without a FASTA file are skipped, or abort the run before any
+    work starts when missing_fasta is "fail". Returns the summary report (one entry per file).
+    With resume (the default), inputs completed by an earlier run into the same output directory are
+    skipped and interrupted ones resume from their last finished stage (see batch_manifest.py).
+    With the unique layout, the genomes share one sequence store: each distinct sequence of the batch is
+    written once, to sequences.zip (or sequences.fa.gz), with cross-genome statistics in sequences_dedup_stats.json.
+    With store_options, every genome is appended to one persistent store; workers append one at a time
+    (the store's write lock serializes them).
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    output_options = dict(output_options or {})
+    if output_options.get("layout") == "unique":
+        output_options["sequence_store"] = os.path.join(output_dir, "sequences.sqlite")
 
-                logging.info(f"Adding sequences from FASTA file: {preprocessed_fasta}")
-                add_sequences(engine, preprocessed_fasta)
+    jobs, summary = plan_batch(input_dir, missing_fasta)
+    logging.info(f"Batch processing {len(jobs)} files from {input_dir} with {workers} worker(s).")
 
-            # Step 7: Output intron FASTA files to ZIP
-            logging.info(f"Writing intron FASTA files to ZIP: {zip_file}")
-            write_fastas_zip(engine, output_dir)
+    if workers <= 1:
+        for gff_file, fasta_file, scan in jobs:
+            summary.append(process_batch_item(gff_file, fasta_file, output_dir, sqlite_pragmas, use_gffutils, cache_dir, cache_size, scan,
+                                              output_options, profiler.enabled, sequence_options, export_options,
+                                              stats_options, store_options, resume))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(process_batch_item, gff_file, fasta_file, output_dir, sqlite_pragmas, use_gffutils, cache_dir, cache_size, scan,
+                                output_options, profiler.enabled, sequence_options, export_options, stats_options, store_options, resume)
+                for gff_file, fasta_file, scan in jobs
+            ]
+            for future in as_completed(futures):
+                summary.append(future.result())
 
+    summary.sort(key=lambda entry: entry["input"])
+    if output_options.get("sequence_store"):
+        genomes = [batch_item_name(entry["input"]) for entry in summary if entry["status"] == "completed"]
+        write_sequence_store(output_options["sequence_store"], os.path.join(output_dir, "sequences"), genomes,
+                             output_options.get("compression", "deflate"), output_options.get("compresslevel"),
+                             output_options.get("threads", 1))
+    # Stage metrics go to the profiling report, not to the batch summary
+    for entry in summary:
+        add_stages(entry.pop("stages", []))
+    write_batch_summary(summary, output_dir)
     logging.info("Batch processing completed.")
+    return summary
 
 if __name__ == "__main__":
     input_directory = "input_files"  # Replace with your input directory path
     output_directory = "output_files"  # Replace with your output directory path
-    process_batch(input_directory, output_directory)
\ No newline at end of file
+    process_batch(input_directory, output_directory)
@@ -0,0 +1,259 @@
+import os
+import gzip
+import zlib
+import struct
+import logging
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from logger_config import setup_logger
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script lets every stage read gzip-compressed inputs as streams instead of extracting them to disk.
+# BGZF files (bgzip) additionally get a .gzi block index so that byte ranges can be read without
+# decompressing the whole file.
+
+GZIP_MAGIC = b"\x1f\x8b"
+COMPRESSED_EXTENSIONS = (".gz", ".bgz")
+BGZF_BLOCK_SIZE = 0xff00  # Uncompressed bytes per BGZF block, as in htslib
+
+
+def is_gzip(path):
+    """
+    Checks the magic bytes to tell whether a file is gzip-compressed (including BGZF).
+    """
+    with open(path, "rb") as f:
+        return f.read(2) == GZIP_MAGIC
+
+def is_bgzf(path):
+    """
+    Checks whether a file is BGZF-compressed: a gzip member with a "BC" extra subfield.
+    """
+    with open(path, "rb") as f:
+        header = f.read(18)
+    return len(header) == 18 and header[:4] == b"\x1f\x8b\x08\x04" and header[12:14] == b"BC"
+
+def strip_compression_extension(path):
+    """
+    Removes a trailing .gz/.bgz extension, e.g. "genome.gff.gz" -> "genome.gff".
+    """
+    for extension in COMPRESSED_EXTENSIONS:
+        if path.endswith(extension):
+            return path[:-len(extension)]
+    return path
+
+def open_text(path):
+    """
+    Opens a plain or gzip-compressed file for reading text line by line.
+    """
+    if is_gzip(path):
+        return gzip.open(path, "rt")
+    return open(path, "r")
+
+def open_binary(path):
+    """
+    Opens a plain or gzip-compressed file for reading bytes.
+    """
+    if is_gzip(path):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def gzi_path(path):
+    return path + ".gzi"
+
+def read_bgzf_block_header(f):
+    """
+    Reads a BGZF block header at the current position and returns the total block size,
+    or None at end of file.
+    """
+    header = f.read(12)
+    if len(header) < 12:
+        return None
+    if header[:2] != GZIP_MAGIC:
+        raise ValueError(f"Invalid BGZF block at offset {f.tell() - len(header)}.")
+    xlen = struct.unpack("<H", header[10:12])[0]
+    extra = f.read(xlen)
+    position = 0
+    while position + 4 <= len(extra):
+        subfield_id = extra[position:position + 2]
+        subfield_length = struct.unpack("<H", extra[position + 2:position + 4])[0]
+        if subfield_id == b"BC":
+            return struct.unpack("<H", extra[position + 4:position + 6])[0] + 1
+        position += 4 + subfield_length
+    raise ValueError(f"Missing BGZF block size at offset {f.tell() - len(header) - xlen}.")
+
+# Function to build a samtools-compatible .gzi index for a BGZF file
+def build_gzi_index(path):
+    """
+    Walks the BGZF block headers (no decompression needed) and writes a .gzi index next to the file.
+    Returns the list of (compressed offset, uncompressed offset) pairs, starting with (0, 0).
+    """
+    logging.info(f"Building BGZF block index for: {path}")
+    blocks = [(0, 0)]
+    with open(path, "rb") as f:
+        compressed = uncompressed = 0
+        while True:
+            block_size = read_bgzf_block_header(f)
+            if block_size is None:
+                break
+            f.seek(compressed + block_size - 4)
+            isize = struct.unpack("<I", f.read(4))[0]
+            compressed += block_size
+            uncompressed += isize
+            if isize:
+                blocks.append((compressed, uncompressed))
+            f.seek(compressed)
+    # The last entry points past the end of the data; an empty file (only the EOF block) has no data block
+    if len(blocks) > 1:
+        blocks.pop()
+
+    write_gzi_index(path, blocks)
+    return blocks
+
+def write_gzi_index(path, blocks):
+    """
+    Writes the (compressed offset, uncompressed offset) block list to the .gzi file next to path.
+    The leading (0, 0) entry is implicit in the .gzi format and is not written.
+    """
+    tmp_file = f"{gzi_path(path)}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as out:
+        out.write(struct.pack("<Q", len(blocks) - 1))
+        for compressed, uncompressed in blocks[1:]:
+            out.write(struct.pack("<QQ", compressed, uncompressed))
+    os.replace(tmp_file, gzi_path(path))
+    logging.info(f"BGZF block index written to {gzi_path(path)}: {len(blocks)} blocks.")
+
+def load_gzi_index(path):
+    """
+    Loads the .gzi index for a BGZF file, (re)building it when it is missing or stale.
+    """
+    index_file = gzi_path(path)
+    if not os.path.exists(index_file) or os.path.getmtime(index_file) < os.path.getmtime(path):
+        return build_gzi_index(path)
+    with open(index_file, "rb") as f:
+        count = struct.unpack("<Q", f.read(8))[0]
+        data = f.read(16 * count)
+    return [(0, 0)] + [struct.unpack_from("<QQ", data, 16 * i) for i in range(count)]
+
+
+class BgzfReader:
+    """
+    Random access to the uncompressed bytes of a BGZF file through its .gzi block index.
+    Slicing (reader[start:end]) decompresses only the blocks that cover the range.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        blocks = load_gzi_index(path)
+        self._compressed = [block[0] for block in blocks]
+        self._uncompressed = [block[1] for block in blocks]
+        self._file = open(path, "rb")
+        self._cached_block = (None, b"")  # Last decompressed block: (block number, data)
+
+    def _block(self, number):
+        if self._cached_block[0] != number:
+            self._file.seek(self._compressed[number])
+            block_size = read_bgzf_block_header(self._file)
+            self._file.seek(self._compressed[number])
+            data = zlib.decompress(self._file.read(block_size), 31)
+            self._cached_block = (number, data)
+        return self._cached_block[1]
+
+    def read(self, start, end):
+        """
+        Returns the uncompressed bytes in [start, end).
+        """
+        chunks = []
+        number = bisect_right(self._uncompressed, start) - 1
+        while start < end and number < len(self._compressed):
+            data = self._block(number)
+            block_start = self._uncompressed[number]
+            chunks.append(data[start - block_start:end - block_start])
+            start = max(start, block_start + len(data))
+            number += 1
+        return b"".join(chunks)
+
+    def __getitem__(self, item):
+        return self.read(item.start, item.stop)
+
+    def close(self):
+        self._file.close()
+
+
+def compress_bgzf_block(data, compresslevel=6):
+    """
+    Compresses up to BGZF_BLOCK_SIZE bytes into one BGZF block (a gzip member with a "BC" extra field).
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    deflated = compressor.compress(data) + compressor.flush()
+    block_size = 18 + len(deflated) + 8
+    header = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff" + struct.pack("<HccHH", 6, b"B", b"C", 2, block_size - 1)
+    return header + deflated + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+class BgzfWriter:
+    """
+    Writes a BGZF file, compressing blocks on a thread pool when threads > 1 (zlib releases the GIL).
+    Blocks are written in order; the block offsets are kept so a .gzi index can be written on close.
+    """
+
+    def __init__(self, path, threads=1, compresslevel=6, write_gzi=True):
+        self.path = path
+        self.compresslevel = compresslevel
+        self.write_gzi = write_gzi
+        self.blocks = [(0, 0)]
+        self._file = open(path, "wb")
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._threads = threads
+        self._executor = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= BGZF_BLOCK_SIZE:
+            self._submit(bytes(self._buffer[:BGZF_BLOCK_SIZE]))
+            del self._buffer[:BGZF_BLOCK_SIZE]
+
+    def tell(self):
+        """
+        Returns the number of uncompressed bytes written so far.
+        """
+        return self.blocks[-1][1] + sum(size for size, _ in self._pending) + len(self._buffer)
+
+    def _submit(self, chunk):
+        if self._executor is None:
+            self._write_block(compress_bgzf_block(chunk, self.compresslevel), len(chunk))
+            return
+        self._pending.append((len(chunk), self._executor.submit(compress_bgzf_block, chunk, self.compresslevel)))
+        # Keep a bounded number of blocks in flight
+        while len(self._pending) > self._threads * 4:
+            self._drain_one()
+
+    def _drain_one(self):
+        size, future = self._pending.popleft()
+        self._write_block(future.result(), size)
+
+    def _write_block(self, block, size):
+        self._file.write(block)
+        compressed, uncompressed = self.blocks[-1]
+        self.blocks.append((compressed + len(block), uncompressed + size))
+
+    def close(self):
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._drain_one()
+        if self._executor is not None:
+            self._executor.shutdown()
+        self._file.write(compress_bgzf_block(b"", self.compresslevel))  # End-of-file marker block
+        self._file.close()
+        if self.write_gzi:
+            write_gzi_index(self.path, self.blocks[:-1] or [(0, 0)])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
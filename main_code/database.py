@@ -1,70 +1,214 @@
 import sqlalchemy as sql
-from metadata import metadata, genes, introns  # Importing table definitions from metadata.py
+from metadata import metadata, genes, introns, indexes  # Importing table definitions from metadata.py
 from logger_config import setup_logger
 import logging
+from profiling import profiled_stage, count
+from intron_deriver import parse_attributes, TRANSCRIPT_COMMENT
 # Setup logger
 setup_logger("GetIntronSeq.log")
 # This script creates an SQLite database in memory and populates it with intron information from a GFF file.
 
-def create_database(introns_file):
+# SQLite pragmas that can be set when the database is created
+SQLITE_PRAGMAS = ("journal_mode", "synchronous", "cache_size")
+# Pragmas of a database spilled to a file: it is deleted after the run, so it needs no crash safety
+SPILL_PRAGMAS = {"journal_mode": "OFF", "synchronous": "OFF"}
+
+def set_sqlite_pragmas(engine, pragmas):
+    """
+    Applies the given SQLite pragmas (journal_mode, synchronous, cache_size) to every new connection.
+    """
+    statements = []
+    for name, value in (pragmas or {}).items():
+        if value is None:
+            continue
+        if name not in SQLITE_PRAGMAS:
+            raise ValueError(f"Unsupported SQLite pragma: {name}. Choose from {', '.join(SQLITE_PRAGMAS)}.")
+        if not str(value).lstrip("-").isalnum():
+            raise ValueError(f"Invalid value for SQLite pragma {name}: {value}")
+        statements.append(f"PRAGMA {name}={value}")
+
+    if statements:
+        @sql.event.listens_for(engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.close()
+        logging.info(f"SQLite pragmas: {'; '.join(statements)}")
+
+def working_engine(path=None, pragmas=None):
+    """
+    Returns the engine of a working database: in memory, or spilled to the file at path
+    (with SPILL_PRAGMAS unless pragmas override them).
+    """
+    if path is None:
+        engine = sql.create_engine("sqlite+pysqlite:///:memory:", echo=False)
+    else:
+        engine = sql.create_engine(f"sqlite+pysqlite:///{path}", echo=False)
+        pragmas = {**SPILL_PRAGMAS, **{name: value for name, value in (pragmas or {}).items() if value is not None}}
+        logging.info(f"Spilling the database to {path}")
+    set_sqlite_pragmas(engine, pragmas)
+    return engine
+
+def copy_database(engine, shared=False):
+    """
+    Returns a new in-memory engine holding a copy of the engine's database.
+    The default in-memory pool gives each thread its own database; with shared, the copy keeps a single
+    connection usable from every thread instead (the caller serializes its use).
+    """
+    if shared:
+        copy = sql.create_engine("sqlite+pysqlite:///:memory:", echo=False, poolclass=sql.pool.StaticPool,
+                                 connect_args={"check_same_thread": False})
+    else:
+        copy = working_engine()
+    source, target = engine.raw_connection(), copy.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        source.close()
+        target.close()
+    return copy
+
+@profiled_stage("create_database")
+def create_database(introns_file, batch_size=50000, pragmas=None, path=None):
     """
     Creates an in-memory SQLite database and populates it with:
     1. A table for genes per contig.
     2. A table for introns per gene, enumerating introns as "intron1", "intron2", etc.
     Ensures no duplicate entries are added efficiently.
+    Rows are buffered and inserted in batches of batch_size; the indexes from metadata.py
+    are built once the load is complete. pragmas is an optional dict of SQLite pragmas.
+    With path, the database is spilled to that file instead of memory (with SPILL_PRAGMAS unless
+    pragmas override them), so genomes larger than memory can be processed; the caller deletes it.
     """
-    engine = sql.create_engine("sqlite+pysqlite:///:memory:", echo=False)
-    metadata.create_all(engine)  # Create the table structure in the database using the defined schema
+    engine = working_engine(path, pragmas)
+
+    with engine.begin() as conn:
+        # Create the tables only; indexes are deferred until after the load
+        for table in metadata.sorted_tables:
+            conn.execute(sql.schema.CreateTable(table, if_not_exists=True))
 
     with open(introns_file, "r") as file:
         with engine.begin() as conn:
-            # Initialize intron counts for each gene
-            intron_counts = {}
-            existing_genes = {}
-            existing_introns = {}
-
-            for line in file:
-                # Parse the intron information
-                fields = line.strip().split("\t")
-                contig = fields[0]
-                gene = fields[8].split(";")[0].split("=")[-1].strip(".t1")  # Extract gene name
-                beg = int(fields[3])
-                end = int(fields[4])
-                ori = fields[6]
-                obs = fields[8]
-
-                # Add the gene to the genes table if not already added
-                if gene not in existing_genes:
-                    conn.execute(
-                        genes.insert().values(
-                            contig=contig,
-                            gene=gene
-                        )
-                    )
-                    existing_genes[gene] = contig
-                    existing_introns[gene] = set()
-                    intron_counts[gene] = 0
-
-                # Check if the intron already exists
-                if (beg, end, ori) in existing_introns[gene]:
-                    continue  # Skip duplicate intron
-
-                # Increment the intron count for the gene
-                intron_counts[gene] += 1
-                intron_number = f"intron{intron_counts[gene]}"
-
-                # Add the intron to the introns table
-                conn.execute(
-                    introns.insert().values(
-                        gene=gene,
-                        intron=intron_number,
-                        beg=beg,
-                        end=end,
-                        ori=ori,
-                        obs=obs
-                    )
-                )
-                existing_introns[gene].add((beg, end, ori))
-
-    logging.info("Database created successfully.")
-    return engine
\ No newline at end of file
+            gene_count = 0
+            gene_rows = []
+            intron_rows = []
+            loaded = 0
+
+            for gene_row, intron_row in iter_table_rows(file):
+                if gene_row is not None:
+                    gene_rows.append(gene_row)
+                    gene_count += 1
+                intron_rows.append(intron_row)
+
+                if len(intron_rows) >= batch_size:
+                    loaded += flush_rows(conn, gene_rows, intron_rows)
+
+            loaded += flush_rows(conn, gene_rows, intron_rows)
+
+            # Build the indexes now that the tables are populated
+            for index in indexes:
+                index.create(conn, checkfirst=True)
+
+    count("genes", gene_count)
+    count("introns", loaded)
+    logging.info(f"Database created successfully: {gene_count} genes, {loaded} introns.")
+    return engine
+
+def iter_transcript_groups(lines):
+    """
+    Groups intron lines by the transcript they were derived from and yields (transcript, list of fields).
+    The transcript is named by the TRANSCRIPT_COMMENT line that derive_introns writes before its introns;
+    introns files without these lines (gffutils derivation, earlier runs) are grouped by consecutive lines
+    with the same Parent (GFF3) or transcript_id (GTF), or None when there is neither.
+    """
+    transcript = None
+    group = []
+    commented = False
+    for line in lines:
+        if line.startswith("#"):
+            if line.startswith(TRANSCRIPT_COMMENT):
+                if group:
+                    yield transcript, group
+                transcript, group, commented = line[len(TRANSCRIPT_COMMENT):].strip(), [], True
+            continue
+        fields = line.strip().split("\t")
+        if not commented:
+            attributes = parse_attributes(fields[8], gtf="=" not in fields[8])
+            parent = (attributes.get("Parent") or attributes.get("transcript_id") or [None])[0]
+            if group and parent != transcript:
+                yield transcript, group
+                group = []
+            transcript = parent
+        group.append(fields)
+    if group:
+        yield transcript, group
+
+# Function to turn intron lines into database rows
+def iter_table_rows(lines):
+    """
+    Parses intron GFF lines and yields (gene_row, intron_row) for every new intron, in load order:
+    gene_row is the genes table row of a gene seen for the first time (None otherwise), and intron_row
+    the introns table row, numbered "intron1", "intron2", ... per gene. Duplicate introns of a gene are skipped.
+    The gene name is the first attribute value with ".t1" characters stripped, which can merge several
+    transcripts; the transcript the intron was derived from is kept in the transcript column (see
+    iter_transcript_groups), with the intron's position in it from the 5' end, out of intron_count.
+    An intron shared by several transcripts of a gene is stored once, with the first transcript's values.
+    The streaming pipeline (pipeline.py) uses the same rows without the database.
+    """
+    # Initialize intron counts for each gene
+    intron_counts = {}
+    existing_introns = {}
+
+    for transcript, group in iter_transcript_groups(lines):
+        for rank, fields in enumerate(group, 1):
+            # Parse the intron information
+            contig = fields[0]
+            gene = fields[8].split(";")[0].split("=")[-1].strip(".t1")  # Extract gene name
+            beg = int(fields[3])
+            end = int(fields[4])
+            ori = fields[6]
+            obs = fields[8]
+
+            # Add the gene to the genes table if not already added
+            gene_row = None
+            if gene not in existing_introns:
+                gene_row = {"contig": contig, "gene": gene}
+                existing_introns[gene] = set()
+                intron_counts[gene] = 0
+
+            # Check if the intron already exists
+            if (beg, end, ori) in existing_introns[gene]:
+                continue  # Skip duplicate intron
+
+            # Increment the intron count for the gene
+            intron_counts[gene] += 1
+            intron_number = f"intron{intron_counts[gene]}"
+
+            existing_introns[gene].add((beg, end, ori))
+            yield gene_row, {
+                "gene": gene,
+                "intron": intron_number,
+                "beg": beg,
+                "end": end,
+                "ori": ori,
+                "obs": obs,
+                "transcript": transcript or gene,
+                # The introns of a transcript are sorted by beg: on the minus strand the 5' end is the last one
+                "position": len(group) - rank + 1 if ori == "-" else rank,
+                "intron_count": len(group)
+            }
+
+def flush_rows(conn, gene_rows, intron_rows):
+    """
+    Inserts the buffered gene and intron rows with executemany and clears the buffers.
+    Returns the number of introns inserted.
+    """
+    if gene_rows:
+        conn.execute(genes.insert(), gene_rows)
+        gene_rows.clear()
+    inserted = len(intron_rows)
+    if intron_rows:
+        conn.execute(introns.insert(), intron_rows)
+        intron_rows.clear()
+    return inserted
@@ -0,0 +1,182 @@
+import logging
+from itertools import islice
+from logger_config import setup_logger
+from output import iter_intron_rows, iter_unique_rows, intron_name
+from intron_stats import STATS_COLUMNS
+from profiling import profiled_stage, count
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script exports the intron table (genes joined with introns) as BED, TSV, Arrow IPC or Parquet.
+# The sinks are fed in batches from one database cursor, so several formats are written in a single pass.
+# Arrow and Parquet need the optional pyarrow package.
+
+EXPORT_FORMATS = ("bed", "tsv", "arrow", "parquet")
+# Columns of the TSV, Arrow and Parquet exports (start/end are 1-based and inclusive, as in the GFF)
+COLUMNS = ("contig", "gene", "intron", "start", "end", "strand", "length", "attributes")
+
+
+def import_pyarrow():
+    """
+    Imports pyarrow, with an installation hint when it is missing.
+    """
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Arrow and Parquet export need pyarrow. Install it with: pip install pyarrow") from None
+    return pyarrow
+
+def row_values(row, include_sequence=False, include_stats=False):
+    """
+    Returns the export columns of one intron row (see COLUMNS), plus its stats and sequence when requested.
+    """
+    values = (row.contig, row.gene, row.intron, row.beg, row.end, row.ori, row.end - row.beg + 1, row.obs)
+    if include_stats:
+        values += tuple(getattr(row, column) for column in STATS_COLUMNS)
+    if include_sequence:
+        values += (row.seq or "",)
+    return values
+
+
+class TextSink:
+    """
+    Writes rows as tab-separated lines. Subclasses choose the header and the columns.
+    """
+
+    def __init__(self, path, include_sequence=False, include_stats=False):
+        self.path = path
+        self.include_sequence = include_sequence
+        self.include_stats = include_stats
+        self.file = open(path, "w")
+
+    def write_batch(self, rows):
+        self.file.writelines("\t".join(map(str, self.values(row))) + "\n" for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class TsvSink(TextSink):
+    """
+    TSV with a header line and the columns in COLUMNS (plus stats and sequence). Missing stats are written as NA.
+    """
+
+    def __init__(self, path, include_sequence=False, include_stats=False):
+        super().__init__(path, include_sequence, include_stats)
+        header = COLUMNS + (STATS_COLUMNS if include_stats else ()) + (("sequence",) if include_sequence else ())
+        self.file.write("\t".join(header) + "\n")
+
+    def values(self, row):
+        return ("NA" if value is None else value for value in row_values(row, self.include_sequence, self.include_stats))
+
+
+class BedSink(TextSink):
+    """
+    BED6 with 0-based, half-open coordinates: contig, start, end, intron name, score 0 and strand.
+    The sequence is added as a seventh column when requested; the stats are not exported to BED.
+    """
+
+    def values(self, row):
+        values = (row.contig, row.beg - 1, row.end, intron_name(row), 0, row.ori)
+        if self.include_sequence:
+            values += (row.seq or "",)
+        return values
+
+
+class ArrowSink:
+    """
+    Writes each batch as one record batch of an Arrow IPC file.
+    """
+
+    def __init__(self, path, include_sequence=False, include_stats=False):
+        self.path = path
+        self.pyarrow = import_pyarrow()
+        self.include_sequence = include_sequence
+        self.include_stats = include_stats
+        self.schema = arrow_schema(self.pyarrow, include_sequence, include_stats)
+        self.writer = self.open_writer()
+
+    def open_writer(self):
+        import pyarrow.ipc
+        return pyarrow.ipc.new_file(self.path, self.schema)
+
+    def record_batch(self, rows):
+        names = self.schema.names
+        columns = list(zip(*(row_values(row, self.include_sequence, self.include_stats) for row in rows)))
+        return self.pyarrow.RecordBatch.from_arrays(
+            [self.pyarrow.array(column, type=self.schema.field(name).type) for name, column in zip(names, columns)],
+            schema=self.schema
+        )
+
+    def write_batch(self, rows):
+        self.writer.write_batch(self.record_batch(rows))
+
+    def close(self):
+        self.writer.close()
+
+
+class ParquetSink(ArrowSink):
+    """
+    Writes each batch as one row group of a Parquet file.
+    """
+
+    def open_writer(self):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self.path, self.schema)
+
+    def write_batch(self, rows):
+        self.writer.write_table(self.pyarrow.Table.from_batches([self.record_batch(rows)]))
+
+def arrow_schema(pyarrow, include_sequence=False, include_stats=False):
+    fields = [
+        ("contig", pyarrow.string()), ("gene", pyarrow.string()), ("intron", pyarrow.string()),
+        ("start", pyarrow.int64()), ("end", pyarrow.int64()), ("strand", pyarrow.string()),
+        ("length", pyarrow.int64()), ("attributes", pyarrow.string()),
+    ]
+    if include_stats:
+        fields += [
+            ("gc", pyarrow.float64()), ("donor", pyarrow.string()), ("acceptor", pyarrow.string()),
+            ("splice_site", pyarrow.string()), ("branch_points", pyarrow.int64()), ("branch_point", pyarrow.int64()),
+            ("position", pyarrow.int64()), ("intron_count", pyarrow.int64()),
+        ]
+    if include_sequence:
+        fields.append(("sequence", pyarrow.large_string()))
+    return pyarrow.schema(fields)
+
+SINKS = {"bed": (BedSink, ".bed"), "tsv": (TsvSink, ".tsv"), "arrow": (ArrowSink, ".arrow"), "parquet": (ParquetSink, ".parquet")}
+
+# Function to export the intron table in several formats from one cursor
+@profiled_stage("export_introns")
+def export_introns(engine, out_name, formats, include_sequence=False, include_stats=False, batch_size=10000):
+    """
+    Streams the intron table, sorted by contig and start, into one file per format (out_name.bed,
+    out_name.tsv, out_name.arrow, out_name.parquet). Every batch of batch_size rows is handed to all
+    sinks, and becomes one record batch/row group in Arrow and Parquet. Duplicate intron names are
+    skipped, as in the FASTA output. include_stats adds the intron stats columns (TSV, Arrow and Parquet),
+    which add_intron_stats must have filled. Returns the list of paths written.
+    """
+    for export_format in formats:
+        if export_format not in SINKS:
+            raise ValueError(f"Unsupported export format: {export_format}. Choose from {', '.join(EXPORT_FORMATS)}.")
+
+    sinks = []
+    try:
+        for export_format in dict.fromkeys(formats):
+            sink_class, extension = SINKS[export_format]
+            sinks.append(sink_class(out_name + extension, include_sequence, include_stats))
+        logging.info(f"Exporting introns to: {', '.join(sink.path for sink in sinks)}")
+
+        exported = 0
+        with engine.connect() as conn:
+            rows = iter_unique_rows(iter_intron_rows(conn, order_by_contig=True, batch_size=batch_size, with_stats=include_stats))
+            for batch in iter(lambda: list(islice(rows, batch_size)), []):
+                for sink in sinks:
+                    sink.write_batch(batch)
+                exported += len(batch)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+    count("rows_exported", exported)
+    logging.info(f"Exported {exported} introns in {len(sinks)} format(s).")
+    return [sink.path for sink in sinks]
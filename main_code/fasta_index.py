@@ -0,0 +1,169 @@
+import os
+import mmap
+import logging
+from logger_config import setup_logger
+from compressed_io import open_binary, is_gzip, is_bgzf, BgzfReader
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script builds and reads faidx-compatible (.fai) indexes so that intron sequences can be fetched
+# straight from the FASTA file through a memory map, without loading whole contigs into memory.
+# Offsets in the index always refer to the uncompressed FASTA, so it also works for bgzip-compressed files.
+
+# Complement of each base (IUPAC codes included), case preserving; other characters are kept as they are
+BASES, COMPLEMENT_BASES = "ACGTRYKMBVDHacgtrykmbvdh", "TGCAYRMKVBHDtgcayrmkvbhd"
+COMPLEMENT = str.maketrans(BASES, COMPLEMENT_BASES)
+
+
+def reverse_complement(sequence):
+    """
+    Returns the reverse complement of a sequence string.
+    """
+    return sequence.translate(COMPLEMENT)[::-1]
+
+def index_path(fasta_file):
+    """
+    Returns the path of the .fai index stored next to the FASTA file.
+    """
+    return fasta_file + ".fai"
+
+# Function to build a faidx-compatible index for a FASTA file
+def build_fasta_index(fasta_file, start=0):
+    """
+    Scans the FASTA file once and writes a .fai index next to it.
+    Each line holds: contig name, length, byte offset, bases per line and bytes per line.
+    Lines before the first header are skipped, so the file can also be a GFF3 file with a ##FASTA section;
+    start is the (uncompressed) byte offset where scanning begins, e.g. InputScan.fasta_offset.
+    Returns the index as a dictionary of contig name -> (length, offset, linebases, linewidth).
+    """
+    logging.info(f"Building FASTA index for: {fasta_file}" + (f" (from byte {start})" if start else ""))
+    index = {}
+    with open_binary(fasta_file) as fasta:
+        contig = None
+        length = offset = linebases = linewidth = 0
+        short_line = False  # Set once a line shorter than the first one has been seen
+        fasta.seek(start)
+        position = start
+        for line in fasta:
+            position += len(line)
+            if line.startswith(b">"):
+                if contig is not None:
+                    index[contig] = (length, offset, linebases, linewidth)
+                contig = line[1:].split()[0].decode() if line[1:].strip() else ""
+                length = linebases = linewidth = 0
+                offset = position
+                short_line = False
+                continue
+            if contig is None:
+                continue  # Annotation lines of a GFF3 file before its ##FASTA section
+            bases = len(line.rstrip(b"\r\n"))
+            if bases == 0:
+                short_line = short_line or linebases > 0  # Blank lines are only allowed at the end of a contig
+                continue
+            if linebases == 0:
+                linebases = bases
+                linewidth = len(line)
+            elif short_line or bases > linebases:
+                raise ValueError(f"FASTA file {fasta_file} has inconsistent line lengths in contig {contig}.")
+            if bases < linebases or len(line) != linewidth:
+                short_line = True
+            length += bases
+        if contig is not None:
+            index[contig] = (length, offset, linebases, linewidth)
+
+    # Write to a temporary file first so concurrent workers never read a partial index
+    tmp_file = f"{index_path(fasta_file)}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as out:
+        for contig, (length, offset, linebases, linewidth) in index.items():
+            out.write(f"{contig}\t{length}\t{offset}\t{linebases}\t{linewidth}\n")
+    os.replace(tmp_file, index_path(fasta_file))
+    logging.info(f"FASTA index written to {index_path(fasta_file)}: {len(index)} contigs.")
+    return index
+
+# Function to load a .fai index, building it first if it is missing or older than the FASTA file
+def load_fasta_index(fasta_file, start=0):
+    """
+    Loads the .fai index for the FASTA file, (re)building it from byte start when needed.
+    """
+    fai_file = index_path(fasta_file)
+    if not os.path.exists(fai_file) or os.path.getmtime(fai_file) < os.path.getmtime(fasta_file):
+        return build_fasta_index(fasta_file, start)
+
+    logging.info(f"Reusing FASTA index: {fai_file}")
+    index = {}
+    with open(fai_file, "r") as fai:
+        for line in fai:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 5:
+                continue
+            index[fields[0]] = tuple(int(value) for value in fields[1:5])
+    return index
+
+
+class IndexedFasta:
+    """
+    Random-access reader over a memory-mapped FASTA file and its .fai index.
+    BGZF-compressed files are read block by block through their .gzi index; other gzip files
+    cannot be seeked and are decompressed into memory once.
+    Coordinates passed to fetch() behave like Python string slices on the contig sequence.
+    fasta_file can be a GFF3 file with a ##FASTA section; start is then the offset of that section.
+    """
+
+    def __init__(self, fasta_file, start=0):
+        self.fasta_file = fasta_file
+        self.index = load_fasta_index(fasta_file, start)
+        self._file = open(fasta_file, "rb")
+        if is_bgzf(fasta_file):
+            self._map = BgzfReader(fasta_file)
+        elif is_gzip(fasta_file):
+            logging.warning(f"{fasta_file} is gzip- but not BGZF-compressed; decompressing it into memory. Use bgzip for random access.")
+            with open_binary(fasta_file) as fasta:
+                self._map = fasta.read()
+        elif os.path.getsize(fasta_file) > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = b""
+
+    def __contains__(self, contig):
+        return contig in self.index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def contigs(self):
+        return list(self.index)
+
+    def length(self, contig):
+        return self.index[contig][0]
+
+    def fetch(self, contig, beg, end, strand="+"):
+        """
+        Returns the sequence of contig[beg:end], reading only the bytes that cover the range.
+        The sequence is reverse-complemented when strand is "-".
+        """
+        length, offset, linebases, linewidth = self.index[contig]
+        beg, end, _ = slice(beg, end).indices(length)
+        if end <= beg:
+            return ""
+        start_byte = offset + (beg // linebases) * linewidth + beg % linebases
+        end_byte = offset + ((end - 1) // linebases) * linewidth + (end - 1) % linebases + 1
+        chunk = self._map[start_byte:end_byte]
+        if linewidth != linebases:
+            chunk = chunk.replace(b"\n", b"").replace(b"\r", b"")
+        if strand == "-":
+            return reverse_complement(chunk.decode())
+        return chunk.decode()
+
+    def fetch_many(self, contig, ranges):
+        """
+        Returns the sequences of a list of (beg, end, strand) ranges on one contig.
+        """
+        return [self.fetch(contig, beg, end, strand) for beg, end, strand in ranges]
+
+    def close(self):
+        if isinstance(self._map, (mmap.mmap, BgzfReader)):
+            self._map.close()
+        self._file.close()
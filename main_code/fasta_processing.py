@@ -1,7 +1,16 @@
 import sqlalchemy as sql
-from metadata import genes, introns  # Importing the intron_sequences table from metadata.py
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from metadata import genes, introns, sequences  # Importing the table definitions from metadata.py
 import logging
-from logger_config import setup_logger
+import time
+from itertools import groupby
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from logger_config import setup_logger, AggregatedWarning
+from genome_store import open_genome
+from sequence_store import sequence_digest
+from compressed_io import open_text, strip_compression_extension
+from profiling import profiled_stage, count
 # Setup logger
 setup_logger("GetIntronSeq.log")
 # This script processes FASTA files to ensure that each contig's sequence is on a single line, and adds sequences to the database.
@@ -13,9 +22,9 @@ def preprocess_fasta(fasta_file):
     """
     Preprocesses a FASTA file to ensure each contig's sequence is on a single line.
     """
-    out_file = fasta_file.replace(".fasta", "_preprocessed.fasta")
+    out_file = strip_compression_extension(fasta_file).replace(".fasta", "_preprocessed.fasta")
     logging.info(f"Preprocessing FASTA file: {fasta_file}")
-    with open(fasta_file, "r") as fasta:
+    with open_text(fasta_file) as fasta:
         with open(out_file, "w") as out:
             curr_seq = ""
             for line in fasta:
@@ -38,7 +47,7 @@ def parse_fasta(fasta_file):
     """
     logging.info(f"Parsing FASTA file: {fasta_file}")
     sequences = {}
-    with open(fasta_file, "r") as fasta:
+    with open_text(fasta_file) as fasta:
         contig = None
         sequence = []
         for line in fasta:
@@ -56,16 +65,180 @@ def parse_fasta(fasta_file):
     return sequences
 
 # Function to add sequences from a FASTA file to the database
-def add_sequences(engine, fasta_file):
+@profiled_stage("add_sequences")
+def add_sequences(engine, fasta_file, bulk=True, batch_size=10000, strand_aware=True, genome_store=False, workers=1, genome=None):
     """
     Updates the database with sequences from the FASTA file.
-    Ensures no duplicate sequences are added for the same intron.
+    Sequences are read through a .fai index and a memory map, so only the intron ranges are loaded.
+    All intron coordinates are loaded with a single query, the introns of each contig are extracted
+    in one batch and the sequences are written back with batched executemany updates inside one transaction.
+    Each distinct sequence is stored once in the sequences table; introns reference it by digest.
+    Minus-strand introns are reverse-complemented unless strand_aware is False.
+    genome_store=True reads from the compact 2-bit genome store (see genome_store.py) instead of the FASTA text.
+    With workers > 1, the contigs are extracted in parallel by a pool of worker processes (see extract_contig).
+    genome is an already opened genome of fasta_file (e.g. one cached by the service) to read from instead
+    of opening it here; it is left open.
+    Set bulk=False to use the per-intron SELECT/UPDATE loop instead.
     """
+    if not bulk:
+        return add_sequences_per_intron(engine, fasta_file, strand_aware, genome_store)
+
     logging.info(f"Adding sequences from FASTA file: {fasta_file}")
-    sequences = parse_fasta(fasta_file)  # Parse the FASTA file
+    start_time = time.perf_counter()
+    updated = 0
+    duplicates = 0
+    missing_contigs = set()
+
+    update_stmt = (
+        sql.update(introns)
+        .where(introns.c.id == sql.bindparam("intron_id"))
+        .values(digest=sql.bindparam("intron_digest"))
+    )
+
+    # The genome is opened here even with workers, so the .fai index or genome store is built only once
+    with (nullcontext(genome) if genome is not None else open_genome(fasta_file, genome_store)) as fasta, engine.begin() as conn:
+        # Load every intron coordinate in one query, grouped by contig so reads stay local
+        coords_stmt = (
+            sql.select(introns.c.id, genes.c.contig, introns.c.beg, introns.c.end, introns.c.ori, introns.c.digest)
+            .join(genes, genes.c.gene == introns.c.gene)
+            .order_by(genes.c.contig, introns.c.beg)
+        )
+        shards = []
+        for contig, contig_rows in groupby(conn.execute(coords_stmt), key=lambda row: row.contig):
+            if contig not in fasta:
+                missing_contigs.add(contig)
+                continue
+            shards.append((contig, [(row.id, row.beg, row.end, row.ori if strand_aware else "+", row.digest) for row in contig_rows]))
+
+        if workers > 1 and len(shards) > 1:
+            results = extract_contigs_parallel(shards, fasta_file, genome_store, workers)
+        else:
+            results = (extract_shard(fasta, contig, rows) for contig, rows in shards)
+
+        batch = []
+        new_sequences = {}
+        for updates, shard_sequences, shard_duplicates, bases in results:
+            duplicates += shard_duplicates
+            count("bases_extracted", bases)
+            new_sequences.update(shard_sequences)
+            for intron_id, digest in updates:
+                batch.append({"intron_id": intron_id, "intron_digest": digest})
+                if len(batch) >= batch_size:
+                    updated += flush_sequences(conn, update_stmt, batch, new_sequences)
+
+        updated += flush_sequences(conn, update_stmt, batch, new_sequences)
+        log_dedup_stats(conn)
+
+    for contig in sorted(missing_contigs):
+        logging.warning(f"Contig {contig} not found in FASTA file {fasta_file}. Skipping.")
+    if duplicates:
+        logging.warning(f"{duplicates} introns already had the same sequence. Skipped.")
+    count("introns", updated)
+    log_throughput(updated, time.perf_counter() - start_time)
+    logging.info(f"Sequences added to the database from {fasta_file}")
+    return engine
+
+def extract_shard(fasta, contig, rows):
+    """
+    Extracts the introns of one contig; rows are (id, beg, end, strand, digest) tuples.
+    Returns the (id, digest) updates, the new sequences by digest (each distinct sequence once),
+    the number of introns whose digest was already set, and the number of bases extracted.
+    """
+    # GFF coordinates are 1-based and inclusive; fetch() takes Python slice coordinates
+    seq_slices = fasta.fetch_many(contig, [(beg - 1, end, strand) for _, beg, end, strand, _ in rows])
+    updates = []
+    new_sequences = {}
+    duplicates = 0
+    bases = 0
+    for (intron_id, _, _, _, old_digest), seq_slice in zip(rows, seq_slices):
+        digest = sequence_digest(seq_slice)
+        if old_digest == digest:
+            duplicates += 1
+            continue
+        bases += len(seq_slice)
+        new_sequences[digest] = seq_slice
+        updates.append((intron_id, digest))
+    return updates, new_sequences, duplicates, bases
+
+# Genome opened once by each extraction worker process (see init_extract_worker)
+_worker_genome = None
+
+def init_extract_worker(fasta_file, genome_store):
+    global _worker_genome
+    _worker_genome = open_genome(fasta_file, genome_store)
+
+def extract_contig(contig, rows):
+    """
+    Worker task: extract_shard on the worker's own memory map of the genome, so it reads only the bytes of
+    its contig's introns. Only the digests and the distinct intron sequences go back to the main process.
+    """
+    return extract_shard(_worker_genome, contig, rows)
+
+def extract_contigs_parallel(shards, fasta_file, genome_store, workers):
+    """
+    Yields the extract_shard results of the contigs as the worker pool finishes them.
+    The contigs with the most introns are submitted first, so one large contig does not finish last.
+    """
+    shards = sorted(shards, key=lambda shard: len(shard[1]), reverse=True)
+    workers = min(workers, len(shards))
+    logging.info(f"Extracting {len(shards)} contigs with {workers} worker processes.")
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_extract_worker,
+                             initargs=(fasta_file, genome_store)) as executor:
+        futures = [executor.submit(extract_contig, contig, rows) for contig, rows in shards]
+        for future in as_completed(futures):
+            yield future.result()
+
+def flush_sequences(conn, update_stmt, batch, new_sequences):
+    """
+    Stores the buffered sequences (once per digest), points the buffered introns at them and clears the buffers.
+    Returns the number of introns updated.
+    """
+    if new_sequences:
+        conn.execute(
+            sqlite_insert(sequences).on_conflict_do_nothing(),
+            [{"digest": digest, "seq": seq, "length": len(seq)} for digest, seq in new_sequences.items()]
+        )
+        new_sequences.clear()
+    updated = len(batch)
+    if batch:
+        conn.execute(update_stmt, batch)
+        batch.clear()
+    return updated
+
+def log_dedup_stats(conn):
+    """
+    Logs how many distinct sequences the introns share and how many bases that saves.
+    """
+    intron_count, total_bases = conn.execute(
+        sql.select(sql.func.count(introns.c.id), sql.func.coalesce(sql.func.sum(sequences.c.length), 0))
+        .join(sequences, sequences.c.digest == introns.c.digest)
+    ).one()
+    unique_sequences, stored_bases = conn.execute(
+        sql.select(sql.func.count(), sql.func.coalesce(sql.func.sum(sequences.c.length), 0)).select_from(sequences)
+    ).one()
+    count("unique_sequences", unique_sequences)
+    logging.info(
+        f"Deduplicated {intron_count} intron sequences into {unique_sequences} unique sequences: "
+        f"{stored_bases} of {total_bases} bases stored."
+    )
+
+# Function to add sequences one intron at a time (kept for comparison with the bulk path)
+def add_sequences_per_intron(engine, fasta_file, strand_aware=True, genome_store=False):
+    """
+    Updates the database with sequences from the FASTA file, issuing one SELECT and one UPDATE per intron.
+    Ensures no duplicate sequences are added for the same intron.
+    """
+    logging.info(f"Adding sequences from FASTA file (per-intron): {fasta_file}")
+    start_time = time.perf_counter()
+    updated = 0
+    duplicates = AggregatedWarning("Duplicate sequences skipped")
+    with open_genome(fasta_file, genome_store) as fasta, engine.begin() as conn:
+        contigs = conn.execute(sql.select(genes.c.contig).distinct()).scalars().all()
+        for contig in contigs:
+            if contig not in fasta:
+                logging.warning(f"Contig {contig} not found in FASTA file {fasta_file}. Skipping.")
+                continue
 
-    with engine.begin() as conn:
-        for contig, sequence in sequences.items():
             # Query the database for genes associated with the current contig
             genes_stmt = sql.select(genes.c.gene).where(genes.c.contig == contig)
             gene_rows = conn.execute(genes_stmt).fetchall()
@@ -74,46 +247,62 @@ def add_sequences(engine, fasta_file):
                 gene = gene_row.gene
 
                 # Query the database for introns associated with the current gene
-                introns_stmt = sql.select(introns.c.gene, introns.c.beg, introns.c.end).where(introns.c.gene == gene)
+                introns_stmt = sql.select(introns.c.gene, introns.c.beg, introns.c.end, introns.c.ori).where(introns.c.gene == gene)
                 introns_rows = conn.execute(introns_stmt).fetchall()
 
                 for intron_row in introns_rows:
                     beg = intron_row.beg
                     end = intron_row.end
 
-                    # Extract the sequence slice for the intron
-                    seq_slice = sequence[beg:end]
+                    # Extract the sequence slice for the intron (1-based, inclusive GFF coordinates)
+                    seq_slice = fasta.fetch(contig, beg - 1, end, intron_row.ori if strand_aware else "+")
+
+                    digest = sequence_digest(seq_slice)
 
                     # Check if the sequence already exists in the database
                     existing_entry = conn.execute(
-                        sql.select(introns.c.seq).where(
+                        sql.select(introns.c.digest).where(
                             (introns.c.gene == gene) &
                             (introns.c.beg == beg) &
                             (introns.c.end == end)
                         )
                     ).fetchone()
 
-                    if existing_entry and existing_entry[0] == seq_slice:
-                        logging.warning(f"Duplicate sequence detected for gene {gene}, intron {beg}-{end}. Skipping.")
+                    if existing_entry and existing_entry[0] == digest:
+                        duplicates.add(f"{gene} {beg}-{end}")
                         continue
 
-                    # Update the introns table with the sequence
+                    # Store the sequence once and point the intron at it
+                    conn.execute(
+                        sqlite_insert(sequences).on_conflict_do_nothing(),
+                        {"digest": digest, "seq": seq_slice, "length": len(seq_slice)}
+                    )
                     update_introns_stmt = sql.update(introns).where(
                         (introns.c.gene == gene) &
                         (introns.c.beg == beg) &
                         (introns.c.end == end)
-                    ).values(seq=seq_slice)
+                    ).values(digest=digest)
                     conn.execute(update_introns_stmt)
+                    updated += 1
 
+    duplicates.flush()
+    log_throughput(updated, time.perf_counter() - start_time)
     logging.info(f"Sequences added to the database from {fasta_file}")
     return engine
 
+def log_throughput(rows, seconds):
+    """
+    Logs how many intron rows were updated and the resulting rows/second.
+    """
+    rate = rows / seconds if seconds > 0 else float("inf")
+    logging.info(f"Updated {rows} intron sequences in {seconds:.2f} s ({rate:,.0f} rows/s).")
+
 # Function to check if a FASTA file is already preprocessed
 def is_fasta_preprocessed(fasta_file):
     """
     Checks if the FASTA file is already in the correct format (one line per sequence).
     """
-    with open(fasta_file, "r") as fasta:
+    with open_text(fasta_file) as fasta:
         for line in fasta:
             if line.startswith(">"):  # Contig header
                 continue
@@ -0,0 +1,301 @@
+import os
+import json
+import logging
+from logger_config import setup_logger
+from compressed_io import open_binary
+from fasta_index import IndexedFasta, BASES as IUPAC_BASES, COMPLEMENT_BASES
+
+# numpy is imported on first use (see require_numpy): only the compact genome store needs it
+np = None
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script converts a FASTA file into a compact genome store: bases packed 2 bits each (4 per byte)
+# into a .npy file that is memory-mapped on open, with runs of other characters (N, IUPAC codes) and
+# soft-masked (lowercase) runs kept separately in runs.npz so the original sequence is reproduced exactly.
+# All introns of a contig are extracted in vectorized batches, reverse-complemented on the minus strand.
+
+STORE_VERSION = 1
+# Order of the 2-bit base codes
+BASES = b"ACGT"
+# Longest stretch of a contig unpacked at once when extracting a batch of introns
+WINDOW_BASES = 1 << 24
+
+
+def store_path(fasta_file):
+    """
+    Returns the path of the genome store directory kept next to the FASTA file.
+    """
+    return fasta_file + ".gstore"
+
+def require_numpy():
+    """
+    Imports numpy and builds the lookup tables on first use.
+    """
+    global np, BASE_CODES, BASE_ASCII, COMPLEMENT_CODES
+    if np is not None:
+        return
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The genome store needs numpy. Install it with: pip install numpy") from None
+
+    # Maps byte values to 2-bit codes; 255 marks characters kept as runs instead
+    BASE_CODES = numpy.full(256, 255, dtype=numpy.uint8)
+    for code, base in enumerate(BASES):
+        BASE_CODES[base] = code
+    BASE_ASCII = numpy.frombuffer(BASES, dtype=numpy.uint8)
+    # Complement of every byte value, case preserving; other characters map to themselves
+    COMPLEMENT_CODES = numpy.frombuffer(
+        bytes(range(256)).translate(bytes.maketrans(IUPAC_BASES.encode(), COMPLEMENT_BASES.encode())), dtype=numpy.uint8
+    )
+    np = numpy
+
+def iter_contigs(fasta_file, start=0):
+    """
+    Yields (name, sequence bytes) for each contig of the FASTA file, one contig in memory at a time.
+    Reading begins at byte start (e.g. the ##FASTA section of a GFF3 file); lines before the first header are skipped.
+    """
+    with open_binary(fasta_file) as fasta:
+        fasta.seek(start)
+        contig = None
+        lines = []
+        for line in fasta:
+            if line.startswith(b">"):
+                if contig is not None:
+                    yield contig, b"".join(lines)
+                contig = line[1:].split()[0].decode() if line[1:].strip() else ""
+                lines = []
+            elif contig is not None:
+                lines.append(line.rstrip(b"\r\n"))
+        if contig is not None:
+            yield contig, b"".join(lines)
+
+def find_runs(flags):
+    """
+    Returns (starts, ends) of the runs of True values in a boolean array.
+    """
+    edges = np.diff(np.concatenate(([0], flags.view(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def run_positions(starts, ends, beg, end):
+    """
+    Returns the positions covered by the runs, relative to beg and clipped to [beg, end),
+    and the clipped length of each run.
+    """
+    starts = np.maximum(starts, beg) - beg
+    lengths = np.minimum(ends, end) - beg - starts
+    # Each run contributes starts[i], starts[i] + 1, ...: offset a global arange by the run start
+    run_firsts = np.cumsum(lengths) - lengths
+    positions = np.arange(lengths.sum()) + np.repeat(starts - run_firsts, lengths)
+    return positions, lengths
+
+def pack_contig(sequence):
+    """
+    Packs a contig into 2-bit codes. Returns (packed uint8 array, other-character runs, soft-mask runs).
+    Other runs are (starts, ends, characters) arrays with one character per run; mask runs are (starts, ends).
+    """
+    raw = np.frombuffer(sequence, dtype=np.uint8)
+    lowercase = (raw >= ord("a")) & (raw <= ord("z"))
+    upper = np.where(lowercase, raw - 32, raw).astype(np.uint8)
+    codes = BASE_CODES[upper]
+
+    # Runs of characters that have no 2-bit code, split wherever the character changes
+    other = codes == 255
+    boundary = other.copy()
+    boundary[1:] &= ~other[:-1] | (upper[1:] != upper[:-1])
+    starts = np.flatnonzero(boundary)
+    last = other.copy()
+    last[:-1] &= ~other[1:] | (upper[1:] != upper[:-1])
+    ends = np.flatnonzero(last) + 1
+    other_runs = (starts, ends, upper[starts])
+    mask_runs = find_runs(lowercase)
+
+    codes[other] = 0
+    padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+    padded[:len(codes)] = codes
+    quads = padded.reshape(-1, 4)
+    packed = (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+    return packed.astype(np.uint8), other_runs, mask_runs
+
+# Function to build the genome store for a FASTA file
+def build_genome_store(fasta_file, out_dir=None, start=0):
+    """
+    Packs every contig of the FASTA file and writes sequence.npy, runs.npz and index.json into out_dir
+    (default: <fasta_file>.gstore). index.json holds, per contig, its length, its byte offset in
+    sequence.npy and the range of its runs in runs.npz. start is passed to iter_contigs.
+    Returns the store directory.
+    """
+    require_numpy()
+    out_dir = out_dir or store_path(fasta_file)
+    os.makedirs(out_dir, exist_ok=True)
+    logging.info(f"Building genome store for: {fasta_file}")
+
+    contigs = {}
+    chunks = []
+    runs = {name: [] for name in ("other_starts", "other_ends", "other_chars", "mask_starts", "mask_ends")}
+    offset = other_count = mask_count = 0
+    for contig, sequence in iter_contigs(fasta_file, start):
+        packed, other_runs, mask_runs = pack_contig(sequence)
+        contigs[contig] = {
+            "length": len(sequence), "offset": offset,
+            "other_runs": [other_count, other_count + len(other_runs[0])],
+            "mask_runs": [mask_count, mask_count + len(mask_runs[0])],
+        }
+        chunks.append(packed)
+        for name, values in zip(runs, other_runs + mask_runs):
+            runs[name].append(values)
+        offset += len(packed)
+        other_count += len(other_runs[0])
+        mask_count += len(mask_runs[0])
+
+    # Write to temporary files first so concurrent workers never open a partial store
+    tmp_suffix = f".{os.getpid()}.tmp"
+    sequence_file = os.path.join(out_dir, "sequence.npy")
+    np.save(sequence_file + tmp_suffix + ".npy", np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint8))
+    os.replace(sequence_file + tmp_suffix + ".npy", sequence_file)
+    runs_file = os.path.join(out_dir, "runs.npz")
+    np.savez(runs_file + tmp_suffix + ".npz", **{
+        name: np.concatenate(values) if values else np.zeros(0, dtype=np.int64) for name, values in runs.items()
+    })
+    os.replace(runs_file + tmp_suffix + ".npz", runs_file)
+    index_file = os.path.join(out_dir, "index.json")
+    with open(index_file + tmp_suffix, "w") as out:
+        json.dump({"version": STORE_VERSION, "source_size": os.path.getsize(fasta_file), "contigs": contigs}, out)
+    os.replace(index_file + tmp_suffix, index_file)
+
+    total = sum(entry["length"] for entry in contigs.values())
+    logging.info(f"Genome store written to {out_dir}: {len(contigs)} contigs, {total} bases in {offset} bytes.")
+    return out_dir
+
+def genome_store_is_current(fasta_file, store_dir):
+    """
+    Checks that the store exists, has the current version and is newer than the FASTA file.
+    """
+    index_file = os.path.join(store_dir, "index.json")
+    if not os.path.exists(index_file) or os.path.getmtime(index_file) < os.path.getmtime(fasta_file):
+        return False
+    with open(index_file) as f:
+        index = json.load(f)
+    return index.get("version") == STORE_VERSION and index.get("source_size") == os.path.getsize(fasta_file)
+
+
+class GenomeStore:
+    """
+    Memory-mapped 2-bit genome store with the same fetch interface as IndexedFasta.
+    Coordinates behave like Python string slices on the contig sequence.
+    """
+
+    def __init__(self, store_dir):
+        require_numpy()
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "index.json")) as f:
+            self.index = json.load(f)["contigs"]
+        self._packed = np.load(os.path.join(store_dir, "sequence.npy"), mmap_mode="r")
+        with np.load(os.path.join(store_dir, "runs.npz")) as runs:
+            self._runs = {name: runs[name] for name in runs.files}
+
+    def __contains__(self, contig):
+        return contig in self.index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def contigs(self):
+        return list(self.index)
+
+    def length(self, contig):
+        return self.index[contig]["length"]
+
+    def runs(self, contig):
+        """
+        Returns the (starts, ends, characters) of the contig's other-character runs and the (starts, ends)
+        of its soft-masked runs, sorted by position so the runs overlapping a window are found by binary search.
+        """
+        entry = self.index[contig]
+        first, last = entry["other_runs"]
+        mask_first, mask_last = entry["mask_runs"]
+        return (
+            self._runs["other_starts"][first:last], self._runs["other_ends"][first:last], self._runs["other_chars"][first:last],
+            self._runs["mask_starts"][mask_first:mask_last], self._runs["mask_ends"][mask_first:mask_last],
+        )
+
+    def unpack(self, contig, beg, end):
+        """
+        Returns contig[beg:end] (0 <= beg <= end <= length) as a uint8 array of ASCII characters.
+        """
+        offset = self.index[contig]["offset"]
+        packed = self._packed[offset + beg // 4:offset + -(-end // 4)]
+        codes = np.stack((packed >> 6, (packed >> 4) & 3, (packed >> 2) & 3, packed & 3), axis=1).ravel()
+        region = BASE_ASCII[codes[beg % 4:beg % 4 + end - beg]]
+
+        other_starts, other_ends, other_chars, mask_starts, mask_ends = self.runs(contig)
+        first, last = np.searchsorted(other_ends, beg, side="right"), np.searchsorted(other_starts, end)
+        positions, lengths = run_positions(other_starts[first:last], other_ends[first:last], beg, end)
+        region[positions] = np.repeat(other_chars[first:last], lengths)
+        first, last = np.searchsorted(mask_ends, beg, side="right"), np.searchsorted(mask_starts, end)
+        positions, _ = run_positions(mask_starts[first:last], mask_ends[first:last], beg, end)
+        region[positions] += 32
+        return region
+
+    def fetch(self, contig, beg, end, strand="+"):
+        """
+        Returns the sequence of contig[beg:end], reverse-complemented when strand is "-".
+        """
+        return self.fetch_many(contig, [(beg, end, strand)])[0]
+
+    def fetch_many(self, contig, ranges):
+        """
+        Returns the sequences of a list of (beg, end, strand) ranges on one contig.
+        The contig is unpacked once per window of at most WINDOW_BASES covering consecutive ranges.
+        """
+        length = self.length(contig)
+        bounds = [slice(beg, end).indices(length)[:2] for beg, end, _ in ranges]
+        order = sorted(range(len(ranges)), key=lambda number: bounds[number][0])
+        sequences = [""] * len(ranges)
+
+        position = 0
+        while position < len(order):
+            # Grow the window over the next ranges while it stays within WINDOW_BASES
+            window_beg, window_end = bounds[order[position]][0], 0
+            group = []
+            while position < len(order):
+                beg, end = bounds[order[position]]
+                if group and max(window_end, end) - window_beg > WINDOW_BASES:
+                    break
+                window_end = max(window_end, end)
+                group.append(order[position])
+                position += 1
+
+            region = self.unpack(contig, window_beg, max(window_beg, window_end))
+            for number in group:
+                beg, end = bounds[number]
+                if end <= beg:
+                    continue
+                chunk = region[beg - window_beg:end - window_beg]
+                if ranges[number][2] == "-":
+                    chunk = COMPLEMENT_CODES[chunk[::-1]]
+                sequences[number] = chunk.tobytes().decode()
+        return sequences
+
+    def close(self):
+        self._packed = None
+
+# Function to open a FASTA file for intron extraction
+def open_genome(fasta_file, use_store=False, start=0):
+    """
+    Returns a GenomeStore for the FASTA file when use_store is True (built or rebuilt next to it
+    when missing or stale), or an IndexedFasta otherwise. start is the byte offset of the sequences
+    when they are built from the ##FASTA section of a GFF3 file.
+    """
+    if not use_store:
+        return IndexedFasta(fasta_file, start)
+    store_dir = store_path(fasta_file)
+    if not genome_store_is_current(fasta_file, store_dir):
+        build_genome_store(fasta_file, store_dir, start)
+    else:
+        logging.info(f"Reusing genome store: {store_dir}")
+    return GenomeStore(store_dir)
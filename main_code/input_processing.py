@@ -1,117 +1,205 @@
-import gffutils
 import logging
 from logger_config import setup_logger
-from file_type_validation import detect_file_format
+from intron_deriver import derive_introns, iter_features
+from input_scanner import scan_input
+from compressed_io import strip_compression_extension
 from database import create_database
-from fasta_processing import preprocess_fasta, is_fasta_preprocessed, add_sequences
-from output import write_fastas_zip
-import shutil
+from fasta_processing import add_sequences
+from output import write_output
+from export_sinks import export_introns
+from intron_stats import add_intron_stats
+from pipeline import run_pipeline
+from genome_store import open_genome
+from intron_store import append_genome, genome_name
+from profiling import profiled_stage, count
+from annotation_cache import file_digest, cache_key, load_cached_database, store_cached_database, DEFAULT_CACHE_SIZE
 import os
-import gzip
+import tempfile
 
 # Setup logger
 setup_logger("GetIntronSeq.log")
+
+def intermediate_path(in_file, suffix, work_dir=None):
+    """
+    Returns the path of an intermediate file derived from in_file, placed in work_dir when given.
+    """
+    stem = os.path.splitext(strip_compression_extension(in_file))[0]
+    if work_dir is not None:
+        stem = os.path.join(work_dir, os.path.basename(stem))
+    return stem + suffix
+
 # Function to create an introns file from a GFF file
-def make_introns_file(in_file):
+@profiled_stage("make_introns_file")
+def make_introns_file(in_file, out_file=None, use_gffutils=False, file_format=None):
     """
     Creates an output file containing intron information extracted from a GFF file.
+    Introns are derived in a single pass by intron_deriver; set use_gffutils=True
+    to build a gffutils database and use create_introns("exon") instead.
+    file_format can be passed when it is already known (e.g. from scan_input).
     """
-    out_file = os.path.splitext(in_file)[0] + "_introns.gff"    
+    if out_file is None:
+        out_file = intermediate_path(in_file, "_introns.gff")
     logging.info(f"Creating introns file from input: {in_file}")
-    db = gffutils.create_db(in_file, dbfn=":memory:", id_spec=None, verbose=True, merge_strategy="create_unique", force=True)
+    if use_gffutils:
+        import gffutils  # Only needed for the gffutils derivation
+        db = gffutils.create_db(in_file, dbfn=":memory:", id_spec=None, verbose=True, merge_strategy="create_unique", force=True)
+        introns = (str(intron) for intron in db.create_introns("exon"))
+    else:
+        introns = derive_introns(in_file, file_format=file_format)
     with open(out_file, 'w') as fout:
-        for intron in db.create_introns("exon"):
-            fout.write(str(intron) + "\n")
+        written = 0
+        for intron in introns:
+            fout.write(intron + "\n")
+            written += not intron.startswith("#")  # Transcript comment lines are not introns
+    count("introns", written)
     return out_file
 
-def make_fasta_file(in_file):
-    """
-    Creates a FASTA file from a GFF file.
-    """
-    out_file = os.path.splitext(in_file)[0] + "_sequences.fasta"    
-    logging.info(f"Creating FASTA file from input: {in_file}")
-    with open(in_file, 'r') as fin, open(out_file, 'w') as fout:
-        for line in fin:
-            if line.startswith("#"):
-                if "start gene" in line:
-                    gene_name = line.split(" ")[3]
-                    fout.write(f">{gene_name}\n")
-                elif "coding sequence" in line:
-                    seq = line.split("[")[1].strip("]").strip()
-                    fout.write(f"{seq}\n")
-                else:
-                    continue
-    return out_file
-
-def input_contains_introns(input_file):
+def input_contains_introns(input_file, use_gffutils=False):
     """
     Checks if the input file contains intron information.
     """
+    if not use_gffutils:
+        return any(fields[2] == "intron" for fields in iter_features(input_file))
+    import gffutils  # Only needed for the gffutils derivation
     db = gffutils.create_db(input_file, dbfn=":memory:", id_spec=None, verbose=True, merge_strategy="create_unique", force=True)
     for feature in db.all_features():
         if feature.featuretype == "intron":
             return True
     return False
 
-def input_contains_sequences(input_file):
+def open_embedded_genome(input_file, fasta_offset, genome_store=False):
     """
-    Checks if the input file contains sequence information.
+    Indexes the ##FASTA section of a GFF3 file in place: the .fai index (or genome store) is built next to
+    the input from fasta_offset on, and its offsets point into the input itself, so intron sequences are read
+    from the annotation file with random access, without a FASTA copy. Returns input_file, to be used as the FASTA file.
     """
-    with open(input_file, 'r') as f:
-        lines = f.readlines()
-        if "coding sequence" in lines:
-            return True
-    return False
+    logging.info(f"Reading sequences from the ##FASTA section of {input_file} (byte {fasta_offset})")
+    with open_genome(input_file, genome_store, fasta_offset):
+        pass
+    return input_file
 
-#Function to process gzip files
-def extract_gzip(input_file, output_dir):
+def write_results(db, output_name, output_options=None, export_options=None, stats_options=None):
     """
-    Extracts a GZIP file into the specified output directory.
+    Writes the intron FASTA output and, when export_options are given, the table exports next to it.
+    With stats_options, the intron stats are computed first and summarized in <output_name>_intron_stats.json;
+    the table exports then include the stats columns.
+    Returns the path of the FASTA output.
     """
-    os.makedirs(output_dir, exist_ok=True)
-    extracted_file_path = os.path.join(output_dir, os.path.basename(input_file).replace(".gz", ""))
-    with gzip.open(input_file, 'rb') as f_in:
-        with open(extracted_file_path, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
-    return extracted_file_path
-
-def process_single_file(input_file, fasta_file, output_name):
+    if stats_options is not None:
+        add_intron_stats(db, output_name + "_intron_stats.json", **stats_options)
+    output_path = write_output(db, output_name, **(output_options or {}))
+    if export_options:
+        export_introns(db, output_name, **export_options, include_stats=stats_options is not None)
+    return output_path
+
+def process_single_file(input_file, fasta_file, output_name, sqlite_pragmas=None, use_gffutils=False, work_dir=None,
+                        cache_dir=None, cache_size=DEFAULT_CACHE_SIZE, scan=None, output_options=None, sequence_options=None,
+                        export_options=None, stats_options=None, introns_file=None, checkpoint=None, streaming=False,
+                        keep_intermediates=False, store_options=None):
     """
     Processes a single GFF file to extract introns and generate output.
+    sqlite_pragmas is an optional dict of SQLite pragmas used while loading the database.
+    use_gffutils switches intron derivation back to the gffutils database.
+    Intermediate files are written next to the input, or into work_dir when given.
+    When cache_dir is set, intron tables (keyed by the GFF content) and intron tables with
+    sequences (keyed by the GFF and FASTA content) are cached there, up to cache_size bytes.
+    scan is the InputScan of input_file; the file is scanned once here when it is not given.
+    output_options are passed to output.write_output (layout, compression, compresslevel, threads, write_fai).
+    sequence_options are passed to fasta_processing.add_sequences (strand_aware, genome_store, workers).
+    export_options, when given, are passed to export_sinks.export_introns (formats, include_sequence).
+    stats_options, when given, are passed to intron_stats.add_intron_stats (strand_aware).
+    introns_file is an introns file finished by an earlier run, reused instead of deriving the introns again.
+    checkpoint(stage, **details) is called once the introns file is written (stage "introns").
+    With streaming, the introns flow from derivation through extraction into the ZIP writer without the
+    database (see pipeline.py); the introns file is only written with keep_intermediates.
+    store_options, when given, is a dict with the path of a persistent multi-genome store, to which the
+    intron tables are appended under the input's genome name (see intron_store.py), and optionally a
+    spill_dir where the working database is kept as a temporary file instead of in memory.
+    Returns the path of the output written, or None if the input has no introns.
     """
-    # Detect file format
-    format_type = detect_file_format(input_file)
+    # Scan the input once: format, feature types and embedded sequences
+    if scan is None:
+        scan = scan_input(input_file, compute_digest=bool(cache_dir))
+    format_type = scan.format
     print(f"Detected file format: {format_type}")
 
     if format_type == "Unknown":
         raise ValueError("Unsupported file format. Please provide GFF, GFF3, or GTF file.")
 
     # Check if the input file contains introns
-    if not input_contains_introns(input_file):
+    if use_gffutils:
+        contains_introns = input_contains_introns(input_file, use_gffutils)
+    else:
+        contains_introns = scan.has_introns
+    if not contains_introns:
         print("The input file does not contain introns. Exiting.")
-        return
+        return None
 
-    # Check if the input file contains sequences
-    if not input_contains_sequences(input_file):
-        if not fasta_file:
+    # Use the FASTA file when given, otherwise the GFF3 ##FASTA section of the input file, read in place
+    if not fasta_file:
+        if not scan.has_sequences:
             raise ValueError("The input file does not contain sequences. Please provide a FASTA file using the --fasta argument.")
-    else:
-        # If sequences are present in the input file, use it as the FASTA file
-        fasta_file = make_fasta_file(input_file)
-        print(f"FASTA file created: {fasta_file}")
+        fasta_file = open_embedded_genome(input_file, scan.fasta_offset, (sequence_options or {}).get("genome_store", False))
+
+    if streaming:
+        if use_gffutils or cache_dir or export_options or stats_options is not None or store_options:
+            raise ValueError("The streaming mode does not support --use-gffutils, --cache-dir, --export, --intron-stats or --store.")
+        introns_path = intermediate_path(input_file, "_introns.gff", work_dir) if keep_intermediates else None
+        output_path = run_pipeline(input_file, fasta_file, output_name, format_type, output_options,
+                                   introns_file=introns_path, **(sequence_options or {}))
+        print(f"Processing of {input_file} completed successfully (streaming).")
+        return output_path
 
-    # Process the input file to extract introns
-    introns_file = make_introns_file(input_file)
+    store_options = store_options or {}
+    spill_path = None
+    if store_options.get("spill_dir"):
+        os.makedirs(store_options["spill_dir"], exist_ok=True)
+        spill_fd, spill_path = tempfile.mkstemp(prefix=genome_name(input_file) + "_", suffix=".sqlite", dir=store_options["spill_dir"])
+        os.close(spill_fd)
+    db = None
+    try:
+        # Look up the cache: first the intron table with sequences, then the intron table alone
+        if cache_dir:
+            gff_digest = scan.digest or file_digest(input_file)
+            introns_key = cache_key("introns", gff_digest, "gffutils" if use_gffutils else "native")
+            orientation = "stranded" if (sequence_options or {}).get("strand_aware", True) else "genomic"
+            sequences_key = cache_key("sequences", introns_key, file_digest(fasta_file), orientation)
+            db = load_cached_database(cache_dir, sequences_key, spill_path, sqlite_pragmas)
+            if db is not None:
+                output_path = write_results(db, output_name, output_options, export_options, stats_options)
+                if store_options.get("path"):
+                    append_genome(db, store_options["path"], genome_name(input_file))
+                print(f"Processing of {input_file} completed successfully (cached sequences).")
+                return output_path
+            db = load_cached_database(cache_dir, introns_key, spill_path, sqlite_pragmas)
 
-    # Create the database
-    db = create_database(introns_file)
+        if db is None:
+            # Process the input file to extract introns, unless an earlier run already did
+            if introns_file is None:
+                introns_file = make_introns_file(input_file, intermediate_path(input_file, "_introns.gff", work_dir), use_gffutils, format_type)
+                if checkpoint is not None:
+                    checkpoint("introns", introns_file=introns_file)
+            else:
+                logging.info(f"Reusing introns file: {introns_file}")
 
-    # Check if the FASTA file needs preprocessing
-    if not is_fasta_preprocessed(fasta_file):
-        fasta_file = preprocess_fasta(fasta_file)  # Use the preprocessed file
+            # Create the database
+            db = create_database(introns_file, pragmas=sqlite_pragmas, path=spill_path)
+            if cache_dir:
+                store_cached_database(db, cache_dir, introns_key, cache_size)
 
-    # Add sequences to the database and write FASTA files to a ZIP archive
-    db = add_sequences(db, fasta_file)
-    write_fastas_zip(db, output_name)
+        # Add sequences to the database and write the intron FASTA output
+        # (sequences are read through the FASTA index, so no preprocessing is needed)
+        db = add_sequences(db, fasta_file, **(sequence_options or {}))
+        if cache_dir:
+            store_cached_database(db, cache_dir, sequences_key, cache_size)
+        output_path = write_results(db, output_name, output_options, export_options, stats_options)
+        if store_options.get("path"):
+            append_genome(db, store_options["path"], genome_name(input_file))
+    finally:
+        if spill_path is not None:
+            if db is not None:
+                db.dispose()
+            os.remove(spill_path)
 
-    print(f"Processing of {input_file} completed successfully.")
\ No newline at end of file
+    print(f"Processing of {input_file} completed successfully.")
+    return output_path
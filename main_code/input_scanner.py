@@ -0,0 +1,111 @@
+import hashlib
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from logger_config import setup_logger
+from compressed_io import open_binary
+from profiling import profiled_stage, count
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script reads an annotation file once and collects everything the pipeline needs to know
+# before the real work starts: format, feature types, contigs and whether sequences are embedded.
+
+
+@dataclass
+class InputScan:
+    """
+    Result of a single pass over an annotation file.
+    """
+    path: str
+    format: str = "Unknown"                              # "GFF3", "GTF" or "Unknown", as detect_file_format
+    feature_counts: Counter = field(default_factory=Counter)
+    contigs: list = field(default_factory=list)          # Contig names in order of first appearance
+    has_coding_sequences: bool = False                   # AUGUSTUS-style "# coding sequence = [...]" comments (not a genome)
+    fasta_offset: int = None                             # Byte offset of the first line after ##FASTA (uncompressed)
+    digest: str = None                                   # SHA-256 of the whole file, when requested
+
+    @property
+    def has_introns(self):
+        return self.feature_counts.get("intron", 0) > 0
+
+    @property
+    def has_sequences(self):
+        # Only a ##FASTA section holds the genome; AUGUSTUS coding sequences are per-gene CDS, named after genes
+        return self.fasta_offset is not None
+
+
+def line_format(fields):
+    """
+    Classifies a feature line the way detect_file_format does.
+    """
+    if len(fields) < 3:
+        return "Unknown"
+    if len(fields) >= 9:
+        attributes = fields[8]
+        if "=" in attributes:
+            return "GFF3"
+        elif '"' in attributes and ";" in attributes:
+            return "GTF"
+        return "Unknown"
+    return None  # Not decisive: detect_file_format keeps reading
+
+# Function to scan an annotation file in a single pass
+@profiled_stage("scan_input")
+def scan_input(input_file, compute_digest=False, chunk_size=1 << 20):
+    """
+    Streams through the annotation file once and returns an InputScan.
+    Feature lines are parsed up to a ##FASTA section; the rest of the file is only hashed
+    when compute_digest is True.
+    """
+    scan = InputScan(path=input_file)
+    digest = hashlib.sha256() if compute_digest else None
+    seen_contigs = set()
+    format_known = False
+    position = 0
+
+    with open_binary(input_file) as fin:
+        for raw_line in fin:
+            position += len(raw_line)
+            if digest is not None:
+                digest.update(raw_line)
+
+            if raw_line.startswith(b"#"):
+                if raw_line.startswith(b"##FASTA"):
+                    scan.fasta_offset = position
+                    break
+                if b"coding sequence" in raw_line:
+                    scan.has_coding_sequences = True
+                continue
+
+            line = raw_line.decode().strip()
+            if not line:
+                continue
+            fields = line.split("\t")
+
+            if not format_known:
+                detected = line_format(fields)
+                if detected is not None:
+                    scan.format = detected
+                    format_known = True
+
+            if len(fields) < 9:
+                continue
+            scan.feature_counts[fields[2]] += 1
+            if fields[0] not in seen_contigs:
+                seen_contigs.add(fields[0])
+                scan.contigs.append(fields[0])
+
+        # The digest covers the uncompressed content, like annotation_cache.file_digest
+        if digest is not None:
+            for chunk in iter(lambda: fin.read(chunk_size), b""):
+                digest.update(chunk)
+            scan.digest = digest.hexdigest()
+
+    count("features", sum(scan.feature_counts.values()))
+    count("bytes_read", position)
+    logging.info(
+        f"Scanned {input_file}: format {scan.format}, {sum(scan.feature_counts.values())} features, "
+        f"{len(scan.contigs)} contigs, embedded sequences: {scan.has_sequences}"
+    )
+    return scan
@@ -0,0 +1,160 @@
+import logging
+from logger_config import setup_logger
+from file_type_validation import detect_file_format
+from compressed_io import open_text
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script derives introns from the exons of a GFF3 or GTF file in a single pass, without building
+# a gffutils database. Its intron lines match gffutils' FeatureDB.create_introns("exon") line for line.
+
+# Comment line written before the introns of each transcript: an intron's attributes are merged from its
+# two exons, so they cannot tell which transcript it was derived from when exons are shared
+TRANSCRIPT_COMMENT = "# transcript "
+
+
+def parse_attributes(field, gtf=False):
+    """
+    Parses the attributes column into an ordered dictionary of key -> list of values.
+    """
+    attributes = {}
+    for item in field.strip().split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        if gtf:
+            key, _, value = item.partition(" ")
+            values = [value.strip().strip('"')]
+        else:
+            key, _, value = item.partition("=")
+            values = value.split(",") if value else []
+        attributes.setdefault(key.strip(), []).extend(values)
+    return attributes
+
+def format_attributes(attributes, gtf=False):
+    """
+    Formats an attribute dictionary back into a GFF3 or GTF attributes column.
+    """
+    if gtf:
+        return " ".join(f'{key} "{",".join(values)}";' for key, values in attributes.items())
+    return ";".join(f"{key}={','.join(values)}" for key, values in attributes.items())
+
+def merge_attributes(attr1, attr2):
+    """
+    Merges the attributes of two neighbouring exons: values are combined, deduplicated and sorted.
+    """
+    merged = {key: list(values) for key, values in attr1.items()}
+    for key, values in attr2.items():
+        merged.setdefault(key, []).extend(values)
+    return {key: sorted(set(values)) for key, values in merged.items()}
+
+# Function to stream the feature lines of a GFF3/GTF file
+def iter_features(in_file):
+    """
+    Yields the nine columns of every feature line, stopping at a GFF3 ##FASTA section.
+    """
+    with open_text(in_file) as fin:
+        for line in fin:
+            if line.startswith("#"):
+                if line.startswith("##FASTA"):
+                    break
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 9:
+                continue
+            yield fields
+
+# Function to derive introns from exons grouped by their parent transcript
+def derive_introns(in_file, exon_featuretype="exon", new_featuretype="intron", file_format=None):
+    """
+    Reads the annotation once, groups exons by parent transcript, sorts them by start
+    and yields one GFF/GTF line per intron (the gap between two consecutive exons).
+    Transcripts are visited gene by gene in file order (by ID for GTF), as gffutils does, and the
+    introns of each one follow a TRANSCRIPT_COMMENT line with its ID (see database.iter_table_rows).
+    file_format ("GFF3" or "GTF") is detected from the file when not given.
+    """
+    gtf = (file_format or detect_file_format(in_file)) == "GTF"
+    current = None
+    for _, transcript_id, contig, beg, end, strand, first, attributes in iter_intron_records(in_file, exon_featuretype, gtf):
+        if transcript_id != current:
+            current = transcript_id
+            yield TRANSCRIPT_COMMENT + transcript_id
+        yield "\t".join([
+            contig, "gffutils_derived", new_featuretype, str(beg), str(end),
+            first[4], strand, first[6], format_attributes(attributes, gtf)
+        ])
+
+def iter_intron_records(in_file, exon_featuretype="exon", gtf=False):
+    """
+    Yields (gene ID, transcript ID, contig, beg, end, strand, first exon, merged attributes) for every
+    intron of every transcript, in the order used by derive_introns: the introns of a transcript are
+    consecutive and sorted by beg. beg and end are 1-based and inclusive.
+    """
+    gene_order = []            # Gene IDs in order of first appearance
+    gene_children = {}         # Gene ID -> IDs of its first-level children, in order
+    exons = {}                 # Transcript ID -> list of exon records
+
+    def add_child(gene_id, child_id):
+        if gene_id not in gene_children:
+            gene_order.append(gene_id)
+            gene_children[gene_id] = []
+        if child_id not in gene_children[gene_id]:
+            gene_children[gene_id].append(child_id)
+
+    for fields in iter_features(in_file):
+        featuretype = fields[2]
+        attributes = parse_attributes(fields[8], gtf)
+
+        if gtf:
+            # GTF has no explicit hierarchy: genes and transcripts are implied by gene_id/transcript_id
+            gene_id = attributes.get("gene_id", [None])[0]
+            transcript_id = attributes.get("transcript_id", [None])[0]
+            if gene_id is not None and transcript_id is not None:
+                add_child(gene_id, transcript_id)
+            parents = [transcript_id] if transcript_id is not None else []
+        else:
+            if featuretype == "gene":
+                for gene_id in attributes.get("ID", []):
+                    if gene_id not in gene_children:
+                        gene_order.append(gene_id)
+                        gene_children[gene_id] = []
+            elif "Parent" in attributes and "ID" in attributes:
+                for parent in attributes["Parent"]:
+                    if parent in gene_children:
+                        for child_id in attributes["ID"]:
+                            add_child(parent, child_id)
+            parents = attributes.get("Parent", [])
+
+        if featuretype == exon_featuretype:
+            record = (fields[0], fields[1], int(fields[3]), int(fields[4]), fields[5], fields[6], fields[7], attributes)
+            for parent in parents:
+                exons.setdefault(parent, []).append(record)
+
+    logging.info(f"Parsed {sum(len(v) for v in exons.values())} exons in {len(exons)} transcripts from {in_file}")
+
+    if gtf:
+        # gffutils infers GTF genes and transcripts, and returns them ordered by ID
+        gene_order.sort()
+        for children in gene_children.values():
+            children.sort()
+
+    for gene_id in gene_order:
+        for transcript_id in gene_children[gene_id]:
+            transcript_exons = sorted(exons.get(transcript_id, []), key=lambda exon: exon[2])
+            if len(transcript_exons) < 2:
+                continue
+            first = transcript_exons[0]
+            previous = first
+            for exon in transcript_exons[1:]:
+                if exon[0] != previous[0]:
+                    first = previous = exon
+                    continue
+                beg = previous[3] + 1
+                end = exon[2] - 1
+                if beg <= end:
+                    strand = exon[5] if exon[5] == previous[5] else "."
+                    attributes = merge_attributes(previous[7], exon[7])
+                    if not gtf and len(attributes.get("ID", [])) > 1:
+                        attributes["ID"] = ["-".join(attributes["ID"])]
+                    yield gene_id, transcript_id, previous[0], beg, end, strand, first, attributes
+                previous = exon
@@ -0,0 +1,246 @@
+import json
+import logging
+import time
+import sqlalchemy as sql
+from logger_config import setup_logger
+from metadata import introns, sequences
+from profiling import profiled_stage, count
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script computes per-intron feature statistics once the sequences are in the database: GC content,
+# donor and acceptor dinucleotides, splice-site class, branch-point candidates and the intron's position
+# in its transcript. Each batch of introns is processed with NumPy array operations over the concatenated
+# sequences, the values are stored in the stats columns of the introns table, and the per-genome
+# distributions are written to a JSON summary. numpy is imported on first use.
+
+# Stats columns of the introns table (see metadata.py), as exported with the stats
+STATS_COLUMNS = ("gc", "donor", "acceptor", "splice_site", "branch_points", "branch_point", "position", "intron_count")
+# The columns computed from the sequence by add_intron_stats; position and intron_count are set when the
+# introns are loaded, per transcript (see database.iter_table_rows)
+SEQUENCE_STATS_COLUMNS = STATS_COLUMNS[:6]
+# Canonical splice-site classes, as donor-acceptor dinucleotides; other introns are "other"
+SPLICE_SITES = ("GT-AG", "GC-AG", "AT-AC")
+# Branch-point candidates (yUnAy, branch A at the fourth base) are searched in the last BRANCH_WINDOW bases
+# of the intron, with the branch A at least BRANCH_MIN bases upstream of the 3' end
+BRANCH_WINDOW = 50
+BRANCH_MIN = 15
+# Number of GC histogram bins, and the position from which introns are counted together in the summary
+GC_BINS = 20
+MAX_POSITION = 20
+
+
+def import_numpy():
+    """
+    Imports numpy, with an installation hint when it is missing.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Intron statistics need numpy. Install it with: pip install numpy") from None
+    return numpy
+
+def byte_tables(np):
+    """
+    Returns the tables over byte values used by batch_stats: upper-case and complement of an upper-case
+    base (other bytes map to themselves) as lookup arrays, and bytes.translate tables that map
+    G/C and A/C/G/T (either case) to 1 and every other byte to 0.
+    """
+    upper = np.frombuffer(bytes(range(256)).upper(), dtype=np.uint8)
+    complement = np.frombuffer(bytes(range(256)).translate(bytes.maketrans(b"ACGT", b"TGCA")), dtype=np.uint8)
+    is_gc = bytes(1 if byte in b"GCgc" else 0 for byte in range(256))
+    is_acgt = bytes(1 if byte in b"ACGTacgt" else 0 for byte in range(256))
+    return upper, complement, is_gc, is_acgt
+
+def batch_stats(np, tables, seqs, flip):
+    """
+    Computes the stats of a batch of sequences in array operations.
+    flip marks sequences stored in genomic orientation on the minus strand: their donor is
+    the reverse complement of the last two bases and their branch-point window is read from the start.
+    Returns gc, donor, acceptor, splice_site, branch_points and branch_point arrays.
+    """
+    upper, complement, is_gc, is_acgt = tables
+    lengths = np.fromiter(map(len, seqs), dtype=np.int64, count=len(seqs))
+    # All sequences of the batch back to back; only the bases looked up below are upper-cased
+    joined = "".join(seqs).encode("ascii") or b"N"
+    raw = np.frombuffer(joined, dtype=np.uint8)
+    starts = np.zeros(len(seqs), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    ends = starts + lengths
+    has_seq = lengths > 0
+
+    def bases(positions):
+        return upper[raw[np.clip(positions, 0, len(raw) - 1)]]
+
+    # GC content over the A/C/G/T bases (N and other IUPAC codes are left out).
+    # bytes.translate flags the bases faster than an array lookup; reduceat sums each sequence's slice
+    # (empty sequences get a meaningless value and are masked)
+    segments = np.minimum(starts, len(raw) - 1)
+    gc_bases = np.add.reduceat(np.frombuffer(joined.translate(is_gc), dtype=np.uint8), segments, dtype=np.uint32).astype(np.int64)
+    acgt = np.add.reduceat(np.frombuffer(joined.translate(is_acgt), dtype=np.uint8), segments, dtype=np.uint32).astype(np.int64)
+    gc_bases = np.where(has_seq, gc_bases, 0)
+    acgt = np.where(has_seq, acgt, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gc = np.where(acgt > 0, gc_bases / acgt, np.nan)
+
+    # Donor (first two bases) and acceptor (last two bases) in transcript orientation
+    valid = lengths >= 2
+    first = np.stack([bases(starts), bases(starts + 1)], axis=1)
+    last = np.stack([bases(ends - 2), bases(ends - 1)], axis=1)
+    donor = np.where(flip[:, None], complement[last[:, ::-1]], first)
+    acceptor = np.where(flip[:, None], complement[first[:, ::-1]], last)
+    donor = np.where(valid, np.ascontiguousarray(donor).view("S2").ravel().astype("U2"), "")
+    acceptor = np.where(valid, np.ascontiguousarray(acceptor).view("S2").ravel().astype("U2"), "")
+    dinucleotides = np.char.add(np.char.add(donor, "-"), acceptor)
+    splice_site = np.where(np.isin(dinucleotides, SPLICE_SITES), dinucleotides, "other")
+    splice_site = np.where(valid, splice_site, "")
+
+    # Window of the last BRANCH_WINDOW bases in transcript orientation, one row per sequence
+    columns = np.arange(BRANCH_WINDOW)
+    forward = ends[:, None] - BRANCH_WINDOW + columns
+    backward = starts[:, None] + BRANCH_WINDOW - 1 - columns
+    positions = np.where(flip[:, None], backward, forward)
+    inside = (positions >= starts[:, None]) & (positions < ends[:, None])
+    window = bases(positions)
+    window = np.where(flip[:, None], complement[window], window)
+    window = np.where(inside, window, 0)
+
+    # yUnAy: pyrimidine, T, any base, A, pyrimidine; matches[:, j] starts at window column j
+    pyrimidine = (window == ord("C")) | (window == ord("T"))
+    span = BRANCH_WINDOW - 4
+    matches = (pyrimidine[:, :span] & (window[:, 1:span + 1] == ord("T")) & (window[:, 2:span + 2] != 0)
+               & (window[:, 3:span + 3] == ord("A")) & pyrimidine[:, 4:span + 4])
+    # Distance of the branch A from the 3' end (1 for the last base of the intron)
+    distances = BRANCH_WINDOW - (np.arange(span) + 3)
+    matches &= distances >= BRANCH_MIN
+    branch_points = matches.sum(axis=1)
+    # The candidate closest to the acceptor is the last match of the row
+    closest = span - 1 - np.argmax(matches[:, ::-1], axis=1)
+    branch_point = np.where(branch_points > 0, distances[closest], 0)
+
+    return gc, donor, acceptor, splice_site, branch_points, branch_point
+
+class StatsSummary:
+    """
+    Collects the per-genome distributions of the intron stats, batch by batch.
+    """
+
+    def __init__(self, np):
+        self.np = np
+        self.lengths = []
+        self.gc = []
+        self.branch_distances = []
+        self.splice_sites = {}
+        self.donors = {}
+        self.acceptors = {}
+        self.positions = {}
+        self.with_branch_point = 0
+
+    def add(self, lengths, gc, donor, acceptor, splice_site, branch_points, branch_point, positions):
+        np = self.np
+        self.lengths.append(lengths)
+        self.gc.append(gc[~np.isnan(gc)])
+        self.branch_distances.append(branch_point[branch_points > 0])
+        self.with_branch_point += int((branch_points > 0).sum())
+        for counts, values in ((self.splice_sites, splice_site), (self.donors, donor), (self.acceptors, acceptor),
+                               (self.positions, np.minimum(positions, MAX_POSITION))):
+            for value, value_count in zip(*np.unique(values, return_counts=True)):
+                key = f"{MAX_POSITION}+" if value == MAX_POSITION and counts is self.positions else str(value)
+                counts[key] = counts.get(key, 0) + int(value_count)
+
+    def distribution(self, values):
+        np = self.np
+        if not len(values):
+            return None
+        quantiles = np.percentile(values, [5, 25, 50, 75, 95])
+        return {
+            "min": values.min().item(), "max": values.max().item(), "mean": round(float(values.mean()), 4),
+            **{f"p{q}": round(float(v), 4) for q, v in zip((5, 25, 50, 75, 95), quantiles)},
+        }
+
+    def to_dict(self):
+        np = self.np
+        lengths = np.concatenate(self.lengths) if self.lengths else np.zeros(0, dtype=np.int64)
+        gc = np.concatenate(self.gc) if self.gc else np.zeros(0)
+        branch_distances = np.concatenate(self.branch_distances) if self.branch_distances else np.zeros(0, dtype=np.int64)
+        # Length histogram on powers of two: bin k counts the lengths in [2^k, 2^(k+1))
+        length_bins = np.bincount(np.log2(np.maximum(lengths, 1)).astype(np.int64)) if len(lengths) else []
+        gc_bins = np.bincount(np.minimum((gc * GC_BINS).astype(np.int64), GC_BINS - 1), minlength=GC_BINS) if len(gc) else []
+        return {
+            "introns": int(len(lengths)),
+            "length": {
+                **(self.distribution(lengths) or {}),
+                "histogram": {f"{2 ** k}-{2 ** (k + 1) - 1}": int(n) for k, n in enumerate(length_bins) if n},
+            },
+            "gc": {
+                **(self.distribution(gc) or {}),
+                "histogram": {f"{k / GC_BINS:.2f}-{(k + 1) / GC_BINS:.2f}": int(n) for k, n in enumerate(gc_bins)},
+            },
+            "splice_sites": dict(sorted(self.splice_sites.items(), key=lambda item: -item[1])),
+            "donors": dict(sorted(self.donors.items(), key=lambda item: -item[1])),
+            "acceptors": dict(sorted(self.acceptors.items(), key=lambda item: -item[1])),
+            "branch_points": {
+                "with_candidate": self.with_branch_point,
+                "fraction": round(self.with_branch_point / len(lengths), 4) if len(lengths) else 0.0,
+                "distance": self.distribution(branch_distances),
+            },
+            "positions": dict(sorted(self.positions.items(), key=lambda item: int(item[0].rstrip("+")))),
+        }
+
+# Function to add the intron stats columns and write the per-genome summary
+@profiled_stage("intron_stats")
+def add_intron_stats(engine, summary_path=None, strand_aware=True, batch_size=100000):
+    """
+    Computes the sequence stats of every intron (see SEQUENCE_STATS_COLUMNS) in batches of batch_size and
+    stores them in the introns table. The summary also counts the introns by position in their transcript,
+    which create_database sets (see database.iter_table_rows).
+    strand_aware must match the orientation the sequences were extracted in (add_sequences).
+    The distributions over the genome are written to summary_path (JSON) when given. Returns the summary.
+    """
+    np = import_numpy()
+    tables = byte_tables(np)
+    logging.info("Computing intron statistics.")
+    start_time = time.perf_counter()
+    summary = StatsSummary(np)
+
+    seqs_stmt = sql.select(
+        introns.c.id, introns.c.ori, introns.c.position, sql.func.coalesce(sequences.c.seq, "").label("seq")
+    ).outerjoin(sequences, sequences.c.digest == introns.c.digest)
+    # Plain DB-API executemany with tuples: building a parameter dict per intron would cost more than the stats
+    update_sql = f"UPDATE introns SET {', '.join(f'{column} = ?' for column in SEQUENCE_STATS_COLUMNS)} WHERE id = ?"
+
+    computed = []
+    with engine.begin() as conn:
+        # The stats are kept as arrays and written once the cursor is exhausted
+        result = conn.execution_options(yield_per=batch_size).execute(seqs_stmt)
+        for batch in result.partitions():
+            seqs = [row.seq for row in batch]
+            flip = np.fromiter((not strand_aware and row.ori == "-" for row in batch), dtype=bool, count=len(batch))
+            positions = np.fromiter((row.position for row in batch), dtype=np.int64, count=len(batch))
+            lengths = np.fromiter(map(len, seqs), dtype=np.int64, count=len(seqs))
+            stats = batch_stats(np, tables, seqs, flip)
+            has_seq = lengths > 0
+            summary.add(lengths[has_seq], *(values[has_seq] for values in stats), positions[has_seq])
+            computed.append(([row.id for row in batch], has_seq, stats))
+
+        for ids, has_seq, (gc, donor, acceptor, splice_site, branch_points, branch_point) in computed:
+            # Missing values (no sequence, no A/C/G/T base, no branch-point candidate) are stored as NULL
+            gc = np.round(gc, 4).astype(object)
+            gc[np.isnan(gc.astype(float))] = None
+            branch_point = np.where(branch_points > 0, branch_point, -1).tolist()
+            branch_points = np.where(has_seq, branch_points, -1).tolist()
+            conn.exec_driver_sql(update_sql, [
+                (gc[i], donor[i] or None, acceptor[i] or None, splice_site[i] or None,
+                 None if branch_points[i] < 0 else branch_points[i], None if branch_point[i] < 0 else branch_point[i], intron_id)
+                for i, intron_id in enumerate(ids)
+            ])
+
+    updated = sum(len(ids) for ids, _, _ in computed)
+    result = summary.to_dict()
+    if summary_path:
+        with open(summary_path, "w") as out:
+            json.dump(result, out, indent=2)
+        logging.info(f"Intron statistics summary written to {summary_path}")
+    count("introns", updated)
+    logging.info(f"Computed statistics of {updated} introns in {time.perf_counter() - start_time:.2f} s.")
+    return result
@@ -0,0 +1,165 @@
+import os
+import time
+import logging
+import sqlalchemy as sql
+from logger_config import setup_logger
+from metadata import metadata, genes, introns, sequences, store_indexes
+from database import set_sqlite_pragmas
+from compressed_io import strip_compression_extension
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script keeps a persistent, file-backed SQLite store of the intron tables of many genomes.
+# It has the schema of metadata.py, with the genes and introns rows keyed by their genome (assembly) name and
+# the sequences shared by digest. Each run appends its genome from the working database; the store can
+# then be queried across genomes without processing anything again.
+#
+#     sqlite3 introns.sqlite "SELECT genome, COUNT(*) FROM introns GROUP BY genome"
+
+# Pragmas of the store: WAL lets readers query while a batch appends, NORMAL sync is safe with WAL
+STORE_PRAGMAS = {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -262144}
+# Seconds a writer waits for another process appending to the same store
+STORE_TIMEOUT = 600
+
+
+def genome_name(input_file):
+    """
+    Returns the genome key of an annotation file: its base name without compression and format extensions.
+    """
+    return os.path.splitext(os.path.basename(strip_compression_extension(input_file)))[0]
+
+def open_store(path):
+    """
+    Returns an engine on the store at path, creating the file, the tables and the store indexes when missing.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    engine = sql.create_engine(f"sqlite+pysqlite:///{path}", echo=False, connect_args={"timeout": STORE_TIMEOUT})
+    set_sqlite_pragmas(engine, STORE_PRAGMAS)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            conn.execute(sql.schema.CreateTable(table, if_not_exists=True))
+        for index in store_indexes:
+            conn.execute(sql.schema.CreateIndex(index, if_not_exists=True))
+    return engine
+
+def index_sql(index, schema="store"):
+    """
+    Returns the CREATE INDEX statement of a store index, in the given attached schema.
+    """
+    columns = ", ".join(column.name for column in index.columns)
+    return f"CREATE INDEX IF NOT EXISTS {schema}.{index.name} ON {index.table.name} ({columns})"
+
+# Function to append the intron tables of one genome to the store
+def append_genome(engine, store_path, genome):
+    """
+    Copies the genes, introns and sequences of the working database (engine) into the store under the
+    genome key, replacing the rows of an earlier run of the same genome, in one write transaction: readers
+    see the store before or after the append, and concurrent writers (batch workers) wait for each other.
+    When the genome is at least as large as the rest of the store, the store indexes are dropped before
+    the copy and rebuilt after it, which is faster than updating them row by row. Returns the number of introns appended.
+    """
+    start_time = time.perf_counter()
+    open_store(store_path).dispose()  # Creates the store on first use
+    gene_columns = ", ".join(column.name for column in genes.columns if column.name not in ("id", "genome"))
+    intron_columns = ", ".join(column.name for column in introns.columns if column.name not in ("id", "genome"))
+    sequence_columns = ", ".join(column.name for column in sequences.columns)
+    with engine.connect() as conn:
+        # The store is attached to the working connection, so the rows are copied inside SQLite
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {STORE_TIMEOUT * 1000}")
+        conn.exec_driver_sql("ATTACH DATABASE ? AS store", (store_path,))
+        conn.exec_driver_sql(f"PRAGMA store.synchronous = {STORE_PRAGMAS['synchronous']}")
+        conn.exec_driver_sql(f"PRAGMA store.cache_size = {STORE_PRAGMAS['cache_size']}")
+        conn.commit()
+        try:
+            with conn.begin():
+                # Writing first takes the store's write lock before anything is read
+                replaced = conn.exec_driver_sql("DELETE FROM store.introns WHERE genome = ?", (genome,)).rowcount
+                conn.exec_driver_sql("DELETE FROM store.genes WHERE genome = ?", (genome,))
+                incoming = conn.exec_driver_sql("SELECT COUNT(*) FROM main.introns").scalar()
+                existing = conn.exec_driver_sql("SELECT COUNT(*) FROM store.introns").scalar()
+                defer_indexes = incoming >= existing
+                if defer_indexes:
+                    for index in store_indexes:
+                        conn.exec_driver_sql(f"DROP INDEX IF EXISTS store.{index.name}")
+                conn.exec_driver_sql(
+                    f"INSERT INTO store.genes (genome, {gene_columns}) SELECT ?, {gene_columns} FROM main.genes", (genome,)
+                )
+                conn.exec_driver_sql(
+                    f"INSERT INTO store.introns (genome, {intron_columns}) SELECT ?, {intron_columns} FROM main.introns", (genome,)
+                )
+                conn.exec_driver_sql(
+                    f"INSERT OR IGNORE INTO store.sequences ({sequence_columns}) SELECT {sequence_columns} FROM main.sequences"
+                )
+                if replaced:
+                    # Sequences that only the replaced rows used
+                    conn.exec_driver_sql(
+                        "DELETE FROM store.sequences WHERE digest NOT IN "
+                        "(SELECT digest FROM store.introns WHERE digest IS NOT NULL)"
+                    )
+                if defer_indexes:
+                    for index in store_indexes:
+                        conn.exec_driver_sql(index_sql(index))
+        finally:
+            conn.exec_driver_sql("DETACH DATABASE store")
+            conn.commit()
+
+    action = "replaced" if replaced else "appended"
+    logging.info(f"Genome {genome} {action} in store {store_path}: {incoming} introns in {time.perf_counter() - start_time:.2f} s.")
+    return incoming
+
+# Function to summarize the genomes of the store
+def store_summary(store_path):
+    """
+    Returns one dict per genome of the store: genome, genes, introns, sequenced introns and distinct sequences.
+    """
+    store = open_store(store_path)
+    try:
+        with store.connect() as conn:
+            gene_counts = dict(conn.execute(sql.select(genes.c.genome, sql.func.count()).group_by(genes.c.genome)).all())
+            rows = conn.execute(
+                sql.select(
+                    introns.c.genome,
+                    sql.func.count().label("introns"),
+                    sql.func.count(introns.c.digest).label("sequenced"),
+                    sql.func.count(sql.distinct(introns.c.digest)).label("sequences"),
+                ).group_by(introns.c.genome).order_by(introns.c.genome)
+            ).all()
+    finally:
+        store.dispose()
+    return [
+        {"genome": row.genome, "genes": gene_counts.get(row.genome, 0), "introns": row.introns,
+         "sequenced": row.sequenced, "sequences": row.sequences}
+        for row in rows
+    ]
+
+# Function to query the introns of the store
+def query_introns(store_path, genome=None, contig=None, start=None, end=None, with_sequence=True, batch_size=10000):
+    """
+    Yields the introns of the store (genome, contig, gene, intron, beg, end, ori, obs, digest and seq),
+    optionally restricted to one genome, one contig and the introns overlapping [start, end] (1-based).
+    """
+    store = open_store(store_path)
+    columns = [genes.c.genome, genes.c.contig, introns.c.gene, introns.c.intron, introns.c.beg, introns.c.end,
+               introns.c.ori, introns.c.obs, introns.c.digest]
+    if with_sequence:
+        columns.append(sequences.c.seq)
+    stmt = (
+        sql.select(*columns)
+        .join(introns, (introns.c.genome == genes.c.genome) & (introns.c.gene == genes.c.gene))
+        .outerjoin(sequences, sequences.c.digest == introns.c.digest)
+        .order_by(genes.c.genome, genes.c.contig, introns.c.beg)
+    )
+    if genome is not None:
+        stmt = stmt.where(genes.c.genome == genome)
+    if contig is not None:
+        stmt = stmt.where(genes.c.contig == contig)
+    if start is not None:
+        stmt = stmt.where(introns.c.end >= start)
+    if end is not None:
+        stmt = stmt.where(introns.c.beg <= end)
+    try:
+        with store.connect() as conn:
+            for partition in conn.execution_options(yield_per=batch_size).execute(stmt).partitions():
+                yield from partition
+    finally:
+        store.dispose()
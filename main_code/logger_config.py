@@ -1,14 +1,104 @@
+import os
+import time
+import queue
+import atexit
 import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+# The queue listener that writes log records in a background thread, once setup_logger has run
+_listener = None
+_log_file = None
+_lock = threading.Lock()
+
 
 def setup_logger(log_file="GetIntronSeq.log"):
     """
     Configures the logging settings for the application.
+    Records are put on a queue by the calling thread and written to the log file and stderr by a
+    background listener thread, so logging never blocks the pipeline on disk or terminal I/O.
+    Only the first call configures logging; every module can call it on import.
+    """
+    global _listener, _log_file
+    with _lock:
+        if _listener is not None:
+            return
+        _log_file = log_file
+        formatter = logging.Formatter(LOG_FORMAT)
+        # delay=True: the log file is only created once something is logged
+        file_handler = logging.FileHandler(log_file, delay=True)
+        stream_handler = logging.StreamHandler()
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        for handler in root.handlers[:]:
+            if isinstance(handler, QueueHandler):
+                root.removeHandler(handler)
+        root.addHandler(QueueHandler(log_queue))
+        _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+        _listener.start()
+
+def stop_logger():
+    """
+    Writes the queued records and stops the background listener (called at exit).
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+
+def _restart_in_child():
+    # A forked worker inherits the queue but not the listener thread: start a listener of its own
+    global _listener
+    if _listener is not None:
+        _listener = None
+        setup_logger(_log_file)
+
+atexit.register(stop_logger)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+
+class AggregatedWarning:
+    """
+    Counts a warning that repeats once per item (duplicate introns, missing contigs, ...) and logs it
+    as a single line with the running count and a few examples, at most once every `interval` seconds
+    and once more on flush().
     """
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
-    )
\ No newline at end of file
+
+    def __init__(self, message, interval=10.0, examples=3):
+        self.message = message
+        self.interval = interval
+        self.max_examples = examples
+        self.count = 0
+        self.reported = 0
+        self.examples = []
+        self.last_report = time.monotonic()
+
+    def add(self, item=None):
+        self.count += 1
+        if item is not None and len(self.examples) < self.max_examples:
+            self.examples.append(str(item))
+        if time.monotonic() - self.last_report >= self.interval:
+            self.report()
+
+    def report(self):
+        self.last_report = time.monotonic()
+        if self.count == self.reported:
+            return
+        self.reported = self.count
+        examples = f" (e.g. {', '.join(self.examples)})" if self.examples else ""
+        logging.warning(f"{self.message}: {self.count}{examples}")
+
+    def flush(self):
+        """
+        Logs the final count, if anything was counted since the last report.
+        """
+        self.report()
@@ -1,5 +1,3 @@
-from input_processing import process_single_file, extract_gzip
-from batch_processing import process_batch
 import os
 import argparse
 
@@ -26,34 +24,210 @@ def main():
     action="store_true",
     help="Enable batch processing for multiple files in a directory or GZIP archive."
     )
+    parser.add_argument(
+        "--sqlite-journal-mode",
+        required=False,
+        help="SQLite journal_mode pragma used while loading the database (e.g. MEMORY, OFF)."
+    )
+    parser.add_argument(
+        "--sqlite-synchronous",
+        required=False,
+        help="SQLite synchronous pragma used while loading the database (e.g. OFF, NORMAL)."
+    )
+    parser.add_argument(
+        "--sqlite-cache-size",
+        type=int,
+        required=False,
+        help="SQLite cache_size pragma (pages, or KiB when negative)."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes used in batch mode (default: 1)."
+    )
+    parser.add_argument(
+        "--missing-fasta",
+        choices=["skip", "fail"],
+        default="skip",
+        help="Batch mode policy for inputs whose FASTA file is missing: skip them or abort the run (default: skip)."
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Batch mode: ignore the checkpoint manifest of an earlier run and process every input again."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        required=False,
+        help="Directory for the on-disk cache of intron tables, keyed by the content hash of the inputs."
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=2048,
+        help="Maximum size of the cache in MB; least recently used entries are evicted (default: 2048)."
+    )
+    parser.add_argument(
+        "--layout",
+        choices=["intron", "contig", "genome", "unique"],
+        default="intron",
+        help="Output layout: one FASTA per intron (default), one multi-FASTA per contig, one per genome, or each "
+             "distinct sequence once with an intron-to-digest mapping table (shared across the genomes of a batch)."
+    )
+    parser.add_argument(
+        "--compression",
+        choices=["stored", "deflate", "bgzip"],
+        default="deflate",
+        help="Output compression: ZIP stored or deflate (default), or BGZF blocks for the contig/genome layouts."
+    )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        required=False,
+        help="Compression level (0-9) for deflate or bgzip output."
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Threads used to compress BGZF output blocks in parallel (default: 1)."
+    )
+    parser.add_argument(
+        "--fai",
+        action="store_true",
+        help="Write a .fai index next to each multi-FASTA output (contig and genome layouts)."
+    )
+    parser.add_argument(
+        "--use-gffutils",
+        action="store_true",
+        help="Derive introns with a gffutils database instead of the built-in single-pass parser."
+    )
+    parser.add_argument(
+        "--genome-store",
+        action="store_true",
+        help="Extract introns from a compact 2-bit genome store built next to the FASTA file (<fasta>.gstore, needs numpy)."
+    )
+    parser.add_argument(
+        "--genomic-orientation",
+        action="store_true",
+        help="Write minus-strand introns in genomic (forward) orientation instead of reverse-complementing them."
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=1,
+        help="Worker processes that extract intron sequences in parallel, one contig at a time (default: 1)."
+    )
+    parser.add_argument(
+        "--export",
+        nargs="+",
+        choices=["bed", "tsv", "arrow", "parquet"],
+        required=False,
+        help="Also export the intron table as <output>.bed/.tsv/.arrow/.parquet, all from one database pass (Arrow and Parquet need pyarrow)."
+    )
+    parser.add_argument(
+        "--export-sequence",
+        action="store_true",
+        help="Include the intron sequence as a column of the --export files."
+    )
+    parser.add_argument(
+        "--intron-stats",
+        action="store_true",
+        help="Compute per-intron GC content, splice-site dinucleotides, branch-point candidates and position (needs numpy); "
+             "adds them to the --export files and writes <output>_intron_stats.json."
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Single-file mode: derive introns, extract their sequences and write the ZIP in overlapping stages "
+             "connected by bounded queues, without the intermediate database (intron layout only)."
+    )
+    parser.add_argument(
+        "--keep-intermediates",
+        action="store_true",
+        help="With --streaming, also write the derived <input>_introns.gff file for debugging."
+    )
+    parser.add_argument(
+        "--store",
+        required=False,
+        help="Append the intron tables to this persistent SQLite store, keyed by genome name, for queries across "
+             "genomes and runs (a re-run of a genome replaces its rows)."
+    )
+    parser.add_argument(
+        "--spill-dir",
+        required=False,
+        help="Keep the working database in a temporary file in this directory instead of in memory (for genomes larger than memory)."
+    )
+    parser.add_argument(
+        "--profile",
+        required=False,
+        help="Write per-stage metrics (wall/CPU time, peak RSS, counters) to this file: JSON, or CSV when it ends in .csv."
+    )
+    parser.add_argument(
+        "--cprofile",
+        required=False,
+        help="With --profile, also dump the cProfile stats of the slowest stage to this file (view with pstats or snakeviz)."
+    )
     args = parser.parse_args()
+    if args.streaming and args.batch:
+        parser.error("--streaming processes a single file; it cannot be combined with --batch.")
+    if args.cprofile and not args.profile:
+        parser.error("--cprofile dumps the slowest stage of the --profile metrics; it needs --profile.")
+    if args.streaming and (args.store or args.spill_dir):
+        parser.error("--streaming does not use a database; it cannot be combined with --store or --spill-dir.")
+
+    # The pipeline modules (and sqlalchemy, gffutils, numpy behind them) are imported only once the
+    # arguments are valid, so --help and argument errors return immediately
+    from input_processing import process_single_file
+    from batch_processing import process_batch
+    from profiling import enable_profiling, write_profile_report
 
     # Extract arguments
     input_file = args.input
     fasta_file = args.fasta
     output_name = args.output
     batch_mode = args.batch
+    output_options = {
+        "layout": args.layout,
+        "compression": args.compression,
+        "compresslevel": args.compress_level,
+        "threads": args.threads,
+        "write_fai": args.fai,
+    }
+    sequence_options = {
+        "strand_aware": not args.genomic_orientation,
+        "genome_store": args.genome_store,
+        "workers": args.extract_workers,
+    }
+    export_options = {"formats": args.export, "include_sequence": args.export_sequence} if args.export else None
+    stats_options = {"strand_aware": not args.genomic_orientation} if args.intron_stats else None
+    store_options = {"path": args.store, "spill_dir": args.spill_dir} if args.store or args.spill_dir else None
+    cache_options = {"cache_dir": args.cache_dir, "cache_size": args.cache_size * 1024 ** 2}
+    sqlite_pragmas = {
+        "journal_mode": args.sqlite_journal_mode,
+        "synchronous": args.sqlite_synchronous,
+        "cache_size": args.sqlite_cache_size,
+    }
 
-    # Handle GZIP files
-    if input_file.endswith(".gz"):
-        print(f"Extracting GZIP file: {input_file}")
-        gzip_dir = os.path.splitext(input_file)[0] + "_extracted"
-        extracted_file = extract_gzip(input_file, gzip_dir)
-        batch_mode = True  # Set batch mode to True for GZIP extraction
-        if batch_mode:
-            process_batch(gzip_dir, output_name)
-        else:
-            process_single_file(extracted_file, fasta_file, output_name)
-        return
-
-    # Handle directories in batch mode
-    if batch_mode and os.path.isdir(input_file):
-        print(f"Batch processing directory: {input_file}")
-        process_batch(input_file, output_name)
-        return
+    if args.profile:
+        enable_profiling(cprofile=bool(args.cprofile))
 
-    # Process a single file
-    process_single_file(input_file, fasta_file, output_name)
+    try:
+        # Handle directories in batch mode
+        if batch_mode and os.path.isdir(input_file):
+            print(f"Batch processing directory: {input_file}")
+            process_batch(input_file, output_name, args.workers, args.missing_fasta, sqlite_pragmas, args.use_gffutils, **cache_options, output_options=output_options,
+                          sequence_options=sequence_options, export_options=export_options, stats_options=stats_options,
+                          store_options=store_options, resume=not args.restart)
+        else:
+            # Process a single file (GZIP/BGZF-compressed inputs are read as streams, without extraction)
+            process_single_file(input_file, fasta_file, output_name, sqlite_pragmas, args.use_gffutils, **cache_options, output_options=output_options,
+                                sequence_options=sequence_options, export_options=export_options, stats_options=stats_options,
+                                streaming=args.streaming, keep_intermediates=args.keep_intermediates, store_options=store_options)
+    finally:
+        if args.profile:
+            write_profile_report(args.profile, args.cprofile)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -7,7 +7,8 @@ genes = sql.Table(
     "genes", metadata,
     sql.Column("id", sql.Integer, primary_key=True, autoincrement=True),
     sql.Column("contig", sql.String, nullable=False),
-    sql.Column("gene", sql.String, nullable=False)
+    sql.Column("gene", sql.String, nullable=False),
+    sql.Column("genome", sql.String, nullable=True)  # Genome/assembly key, only set in a persistent store
 )
 
 # Table for storing introns per gene
@@ -18,7 +19,56 @@ introns = sql.Table(
     sql.Column("intron", sql.String, nullable=False),
     sql.Column("beg", sql.Integer, nullable=False),
     sql.Column("end", sql.Integer, nullable=False),
-    sql.Column("seq", sql.String, nullable=True),
     sql.Column("ori", sql.String, nullable=True),
-    sql.Column("obs", sql.String, nullable=True)
-)
\ No newline at end of file
+    sql.Column("obs", sql.String, nullable=True),
+    sql.Column("transcript", sql.String, nullable=True),  # Transcript the intron was derived from (first one when shared)
+    sql.Column("digest", sql.String, nullable=True),  # Key of the intron's sequence in the sequences table
+    # Intron stats: position and intron_count are set on load, the others by intron_stats.add_intron_stats when requested
+    sql.Column("gc", sql.Float, nullable=True),
+    sql.Column("donor", sql.String, nullable=True),
+    sql.Column("acceptor", sql.String, nullable=True),
+    sql.Column("splice_site", sql.String, nullable=True),
+    sql.Column("branch_points", sql.Integer, nullable=True),
+    sql.Column("branch_point", sql.Integer, nullable=True),
+    sql.Column("position", sql.Integer, nullable=True),
+    sql.Column("intron_count", sql.Integer, nullable=True),
+    sql.Column("genome", sql.String, nullable=True)  # Genome/assembly key, only set in a persistent store
+)
+
+# Table storing each distinct intron sequence once, keyed by its content digest.
+# add_sequences fills it and sets introns.digest, through which the intron's sequence is looked up.
+sequences = sql.Table(
+    "sequences", metadata,
+    sql.Column("digest", sql.String, primary_key=True),
+    sql.Column("seq", sql.String, nullable=False),
+    sql.Column("length", sql.Integer, nullable=False)
+)
+
+# Tables of the sequence store shared by the genomes of a batch (see sequence_store.py), a database of its own:
+# the distinct sequences, and how many introns of each genome reference each of them
+sequence_store_metadata = sql.MetaData()
+shared_sequences = sequences.to_metadata(sequence_store_metadata)
+genome_sequences = sql.Table(
+    "genome_sequences", sequence_store_metadata,
+    sql.Column("genome", sql.String, primary_key=True),
+    sql.Column("digest", sql.String, primary_key=True),
+    sql.Column("copies", sql.Integer, nullable=False)
+)
+
+# Indexes on the columns that later queries filter and join on.
+# They are not created with the tables: create_database builds them after the bulk load.
+indexes = [
+    sql.Index("ix_genes_contig", genes.c.contig),
+    sql.Index("ix_genes_gene", genes.c.gene),
+    sql.Index("ix_introns_gene", introns.c.gene),
+    sql.Index("ix_introns_digest", introns.c.digest),
+]
+
+# Indexes of the persistent multi-genome store (see intron_store.py): genes and introns are looked up by
+# genome first. They are dropped and rebuilt around large appends.
+store_indexes = [
+    sql.Index("ix_store_genes_genome_gene", genes.c.genome, genes.c.gene),
+    sql.Index("ix_store_genes_genome_contig", genes.c.genome, genes.c.contig),
+    sql.Index("ix_store_introns_genome_gene", introns.c.genome, introns.c.gene),
+    sql.Index("ix_store_introns_digest", introns.c.digest),
+]
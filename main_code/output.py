@@ -1,55 +1,328 @@
+import os
+import io
+import json
+from collections import Counter
 import sqlalchemy as sql
 import zipfile
-from metadata import introns, genes  # Import the table variable from metadata.py
+from metadata import introns, genes, sequences  # Import the table variable from metadata.py
+from intron_stats import STATS_COLUMNS
 import logging
-from logger_config import setup_logger
+from logger_config import setup_logger, AggregatedWarning
+from compressed_io import BgzfWriter
+from sequence_store import SequenceStore, dedup_stats
+from profiling import profiler, profiled_stage, count
 
 # Setup logger
 setup_logger("GetIntronSeq.log")
 
+# Output layouts: one FASTA per intron, one multi-FASTA per contig, one multi-FASTA per genome,
+# or each distinct sequence once with a mapping table from introns to sequence digests
+LAYOUTS = ("intron", "contig", "genome", "unique")
+# Columns of the mapping table written with the unique layout
+MAPPING_COLUMNS = ("name", "contig", "gene", "intron", "start", "end", "strand", "digest")
+# "stored" and "deflate" write a ZIP archive; "bgzip" writes BGZF-compressed multi-FASTA files
+COMPRESSIONS = ("stored", "deflate", "bgzip")
+
+# Function to stream the intron rows from the database
+def iter_intron_rows(conn, order_by_contig=False, batch_size=10000, with_sequence=True, with_stats=False):
+    """
+    Yields the rows of the genes/introns join without loading the whole result into memory.
+    Each intron's sequence is looked up in the sequences table by its digest; with_sequence=False
+    returns only its length. with_stats adds the intron stats columns (see intron_stats.py).
+    """
+    stats_columns = [introns.c[column] for column in STATS_COLUMNS] if with_stats else []
+    result_stmt = sql.select(
+        genes.c.contig,
+        introns.c.gene,
+        introns.c.intron,
+        introns.c.beg,
+        introns.c.end,
+        sequences.c.seq if with_sequence else sequences.c.length,
+        introns.c.ori,
+        introns.c.obs,
+        introns.c.digest,
+        *stats_columns
+    ).join(introns, genes.c.gene == introns.c.gene).outerjoin(sequences, sequences.c.digest == introns.c.digest)
+    if order_by_contig:
+        result_stmt = result_stmt.order_by(genes.c.contig, introns.c.beg)
+    result = conn.execution_options(yield_per=batch_size).execute(result_stmt)
+    for partition in result.partitions():
+        yield from partition
+
+def intron_name(row):
+    return f"{row.contig}_{row.intron}_{row.beg}-{row.end}"
+
+def iter_unique_rows(rows):
+    """
+    Skips rows whose intron name was already written; the skipped names are reported as one aggregated warning.
+    """
+    written_files = set()
+    duplicates = AggregatedWarning("Duplicate entries skipped")
+    for row in rows:
+        name = intron_name(row)
+        if name in written_files:
+            duplicates.add(name)
+            continue
+        written_files.add(name)
+        yield row
+    duplicates.flush()
+    count("introns", len(written_files))
+
 # Function to write FASTA files into a ZIP archive
-def write_fastas_zip(engine, out_dir_name):
+def write_fastas_zip(engine, out_dir_name, compression="deflate", compresslevel=None):
     """
     Writes FASTA files for each intron in the database into a ZIP archive.
+    Rows are streamed from the database cursor. compression is "stored" or "deflate",
+    with an optional deflate compresslevel (0-9).
     Ensures unique file names and handles duplicates gracefully.
     """
+    with engine.connect() as conn:
+        return write_rows_zip(iter_intron_rows(conn), out_dir_name, compression, compresslevel)
+
+def write_rows_zip(rows, out_dir_name, compression="deflate", compresslevel=None):
+    """
+    Writes one FASTA file per intron row into out_dir_name.zip. rows is any iterable of rows with the
+    columns of iter_intron_rows (the streaming pipeline passes its own); duplicate names are skipped.
+    """
     logging.info(f"Writing FASTA files to ZIP: {out_dir_name}.zip")
-    with zipfile.ZipFile(out_dir_name + ".zip", mode="w") as archive:
+    with zipfile.ZipFile(out_dir_name + ".zip", mode="w", compression=zip_compression(compression),
+                         compresslevel=compresslevel) as archive:
+        for row in iter_unique_rows(rows):
+            # Create the FASTA content
+            fasta_content = (
+                f">{row.contig} {row.intron} {row.beg}-{row.end} {row.ori} {row.obs}\n{row.seq or ''}\n"
+            )
+
+            # Write the content to the ZIP archive
+            archive.writestr(f"{row.contig}/{intron_name(row)}.fasta", fasta_content)
+
+    logging.info(f"FASTA files successfully written to {out_dir_name}.zip")
+    return out_dir_name + ".zip"
+
+def zip_compression(compression):
+    if compression == "stored":
+        return zipfile.ZIP_STORED
+    if compression == "deflate":
+        return zipfile.ZIP_DEFLATED
+    raise ValueError(f"Compression {compression} is not available for ZIP archives. Choose stored or deflate.")
+
+
+class MultiFastaSink:
+    """
+    Writes intron records into one multi-FASTA stream and, optionally, builds its .fai index.
+    Each record is named after the per-intron file name and its sequence is kept on a single line.
+    """
+
+    def __init__(self, stream, name, write_fai=False):
+        self.stream = stream
+        self.name = name
+        self.write_fai = write_fai
+        self.fai_lines = []
+        self.offset = 0
+
+    def add(self, row):
+        seq = row.seq or ""
+        header = f">{intron_name(row)} {row.ori} {row.obs}\n".encode()
+        record = header + seq.encode() + b"\n"
+        if self.write_fai:
+            self.fai_lines.append(f"{intron_name(row)}\t{len(seq)}\t{self.offset + len(header)}\t{len(seq)}\t{len(seq) + 1}\n")
+        self.stream.write(record)
+        self.offset += len(record)
+
+    def fai(self):
+        return "".join(self.fai_lines)
+
+# Function to write one multi-FASTA per contig or per genome
+def write_fastas_multi(engine, out_name, layout="contig", compression="deflate", compresslevel=None, threads=1, write_fai=False):
+    """
+    Streams introns into multi-FASTA files: one per contig (layout="contig") or one for the genome (layout="genome").
+    With compression "stored"/"deflate" the files are members of out_name.zip; with "bgzip" they are written as
+    BGZF files (blocks compressed on `threads` threads) with .gzi indexes, to out_name/<contig>.fa.gz or
+    out_name.fa.gz. write_fai adds a .fai index next to each multi-FASTA.
+    Returns the path of the ZIP archive, directory or file written.
+    """
+    if layout not in ("contig", "genome"):
+        raise ValueError(f"Unsupported multi-FASTA layout: {layout}. Choose contig or genome.")
+
+    if compression == "bgzip":
+        output_path = out_name if layout == "contig" else out_name + ".fa.gz"
+        if layout == "contig":
+            os.makedirs(out_name, exist_ok=True)
+
+        def open_member(member):
+            path = os.path.join(out_name, f"{member}.fa.gz") if layout == "contig" else output_path
+            return BgzfWriter(path, threads=threads, compresslevel=6 if compresslevel is None else compresslevel)
+
+        def close_member(sink):
+            sink.stream.close()
+            if write_fai:
+                with open(sink.stream.path + ".fai", "w") as fai:
+                    fai.write(sink.fai())
+        archive = None
+    else:
+        output_path = out_name + ".zip"
+        archive = zipfile.ZipFile(output_path, mode="w", compression=zip_compression(compression), compresslevel=compresslevel)
+
+        def open_member(member):
+            return archive.open(f"{member}.fasta", mode="w", force_zip64=True)
+
+        def close_member(sink):
+            sink.stream.close()
+            if write_fai:
+                archive.writestr(f"{sink.name}.fasta.fai", sink.fai())
+
+    logging.info(f"Writing {layout} multi-FASTA output: {output_path}")
+    sink = None
+    try:
+        with engine.connect() as conn:
+            for row in iter_unique_rows(iter_intron_rows(conn, order_by_contig=True)):
+                member = row.contig if layout == "contig" else os.path.basename(out_name)
+                if sink is None or sink.name != member:
+                    if sink is not None:
+                        close_member(sink)
+                    sink = MultiFastaSink(open_member(member), member, write_fai)
+                sink.add(row)
+        if sink is not None:
+            close_member(sink)
+    finally:
+        if archive is not None:
+            archive.close()
+
+    logging.info(f"Multi-FASTA output successfully written to {output_path}")
+    return output_path
+
+# Function to write each distinct intron sequence once
+def write_fastas_unique(engine, out_name, compression="deflate", compresslevel=None, threads=1, sequence_store=None):
+    """
+    Writes every distinct intron sequence once, named by its digest, with a mapping table from intron
+    names to digests (mapping.tsv) and the space saved by deduplication (dedup_stats.json).
+    With compression "stored"/"deflate" these are members of out_name.zip (sequences.fasta); with "bgzip"
+    they are written to the out_name directory (sequences.fa.gz with its .gzi index).
+    sequence_store is the path of a SequenceStore shared by the genomes of a batch: the sequences are added
+    to it under the genome name (the base name of out_name) instead of being written here.
+    Returns the path of the ZIP archive or directory written.
+    """
+    copies = Counter()
+    lengths = {}
+    archive = None
+    if compression == "bgzip":
+        output_path = out_name
+        os.makedirs(out_name, exist_ok=True)
+        open_member = lambda name: open(os.path.join(out_name, name), "wb")
+    else:
+        output_path = out_name + ".zip"
+        archive = zipfile.ZipFile(output_path, mode="w", compression=zip_compression(compression), compresslevel=compresslevel)
+        open_member = lambda name: archive.open(name, mode="w", force_zip64=True)
+
+    logging.info(f"Writing unique intron sequences: {output_path}")
+    try:
         with engine.connect() as conn:
-            # Query the database for intron data
-            result_stmt = sql.select(
-                genes.c.contig,
-                introns.c.intron,
-                introns.c.beg,
-                introns.c.end,
-                introns.c.seq,
-                introns.c.ori,
-                introns.c.obs
-            ).join(introns, genes.c.gene == introns.c.gene)
-            result = conn.execute(result_stmt)
-            rows = result.fetchall()
-
-            # Track written file names to avoid duplicates
-            written_files = set()
-
-            # Iterate through the rows in the result
-            for row in rows:
-                # Create a proper FASTA file name
-                name = f"{row.contig}_{row.intron}_{row.beg}-{row.end}.fasta"
-
-                # Ensure the file name is unique
-                if name in written_files:
-                    logging.warning(f"Duplicate entry detected for {name}. Skipping.")
-                    continue
-                written_files.add(name)
-
-                # Create the FASTA content
-                fasta_content = (
-                    f">{row.contig} {row.intron} {row.beg}-{row.end} {row.ori} {row.obs}\n{row.seq}\n"
+            # Mapping table: one line per intron, in contig order
+            with open_member("mapping.tsv") as member, io.TextIOWrapper(member, encoding="utf-8") as mapping:
+                mapping.write("\t".join(MAPPING_COLUMNS) + "\n")
+                for row in iter_unique_rows(iter_intron_rows(conn, order_by_contig=True, with_sequence=False)):
+                    mapping.write(f"{intron_name(row)}\t{row.contig}\t{row.gene}\t{row.intron}\t{row.beg}\t{row.end}\t{row.ori}\t{row.digest or ''}\n")
+                    if row.digest is not None:
+                        copies[row.digest] += 1
+                        lengths[row.digest] = row.length
+
+            # Distinct sequences, by digest
+            sequence_rows = (
+                (row.digest, row.seq, copies[row.digest])
+                for row in conn.execution_options(yield_per=10000).execute(
+                    sql.select(sequences.c.digest, sequences.c.seq).order_by(sequences.c.digest)
                 )
+                if row.digest in copies
+            )
+            if sequence_store is not None:
+                with SequenceStore(sequence_store) as store:
+                    added = store.add_genome(os.path.basename(out_name), sequence_rows)
+                logging.info(f"{added} new sequences added to the shared sequence store {sequence_store}")
+            elif compression == "bgzip":
+                with BgzfWriter(os.path.join(out_name, "sequences.fa.gz"), threads=threads,
+                                compresslevel=6 if compresslevel is None else compresslevel) as fasta:
+                    for digest, seq, _ in sequence_rows:
+                        fasta.write(f">{digest}\n{seq}\n".encode())
+            else:
+                with archive.open("sequences.fasta", mode="w", force_zip64=True) as fasta:
+                    for digest, seq, _ in sequence_rows:
+                        fasta.write(f">{digest}\n{seq}\n".encode())
 
-                # Write the content to the ZIP archive
-                archive.writestr(f"{row.contig}/{name}", fasta_content)
+        stats = dedup_stats(sum(copies.values()), sum(copies[digest] * lengths[digest] for digest in copies),
+                            len(copies), sum(lengths.values()))
+        with open_member("dedup_stats.json") as member:
+            member.write(json.dumps(stats, indent=2).encode())
+    finally:
+        if archive is not None:
+            archive.close()
 
-    logging.info(f"FASTA files successfully written to {out_dir_name}.zip")
-    return
+    logging.info(
+        f"{stats['introns']} introns share {stats['unique_sequences']} unique sequences; "
+        f"deduplication saved {stats['saved_bases']} bases ({stats['saved_fraction']:.1%})."
+    )
+    return output_path
+
+# Function to write the sequences of a shared sequence store
+def write_sequence_store(sequence_store, out_name, genomes=None, compression="deflate", compresslevel=None, threads=1):
+    """
+    Writes the distinct sequences used by the given genomes (all by default) from a SequenceStore,
+    to out_name.zip (sequences.fasta) or, with "bgzip", out_name.fa.gz, and the cross-genome
+    deduplication statistics to out_name_dedup_stats.json. Returns the path of the sequences written.
+    """
+    with SequenceStore(sequence_store) as store:
+        if compression == "bgzip":
+            output_path = out_name + ".fa.gz"
+            with BgzfWriter(output_path, threads=threads, compresslevel=6 if compresslevel is None else compresslevel) as fasta:
+                for digest, seq in store.iter_sequences(genomes):
+                    fasta.write(f">{digest}\n{seq}\n".encode())
+        else:
+            output_path = out_name + ".zip"
+            with zipfile.ZipFile(output_path, mode="w", compression=zip_compression(compression), compresslevel=compresslevel) as archive:
+                with archive.open("sequences.fasta", mode="w", force_zip64=True) as fasta:
+                    for digest, seq in store.iter_sequences(genomes):
+                        fasta.write(f">{digest}\n{seq}\n".encode())
+        stats = store.stats(genomes)
+
+    with open(out_name + "_dedup_stats.json", "w") as out:
+        json.dump(stats, out, indent=2)
+    logging.info(
+        f"Shared sequences written to {output_path}: {stats['introns']} introns, {stats['unique_sequences']} unique sequences, "
+        f"{stats['saved_bases']} bases saved ({stats['saved_fraction']:.1%})."
+    )
+    return output_path
+
+# Function to write the output in the requested layout
+@profiled_stage("write_output")
+def write_output(engine, out_name, layout="intron", compression="deflate", compresslevel=None, threads=1, write_fai=False,
+                 sequence_store=None):
+    """
+    Writes the intron FASTA output using the given layout and compression. Returns the path written.
+    sequence_store is only used by the unique layout (see write_fastas_unique).
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unsupported output layout: {layout}. Choose from {', '.join(LAYOUTS)}.")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}. Choose from {', '.join(COMPRESSIONS)}.")
+    if layout == "intron":
+        if compression == "bgzip":
+            raise ValueError("bgzip compression needs a multi-FASTA layout (contig or genome).")
+        if write_fai:
+            logging.warning("A .fai index is only written for the contig and genome layouts.")
+        output_path = write_fastas_zip(engine, out_name, compression, compresslevel)
+    elif layout == "unique":
+        if write_fai:
+            logging.warning("A .fai index is only written for the contig and genome layouts.")
+        output_path = write_fastas_unique(engine, out_name, compression, compresslevel, threads, sequence_store)
+    else:
+        output_path = write_fastas_multi(engine, out_name, layout, compression, compresslevel, threads, write_fai)
+    if profiler.enabled:
+        count("bytes_written", output_size(output_path))
+    return output_path
+
+def output_size(path):
+    """
+    Returns the size in bytes of an output file, or of all files in an output directory.
+    """
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
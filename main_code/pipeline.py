@@ -0,0 +1,244 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import namedtuple
+from logger_config import setup_logger
+from intron_deriver import derive_introns
+from database import iter_table_rows
+from genome_store import open_genome
+from output import write_rows_zip
+from profiling import profiled_stage, count
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script is the streaming mode of process_single_file: introns are derived, their sequences extracted
+# and the output written by three stages that run at the same time, connected by bounded queues of batches.
+# Nothing goes through the SQLite database, and the introns file is only written when asked for (for debugging).
+#
+#     derive (thread) --queue--> extract (thread) --queue--> write (calling thread)
+
+# Row passed from the extract stage to the writer, with the columns output.write_rows_zip reads
+IntronRow = namedtuple("IntronRow", ("contig", "gene", "intron", "beg", "end", "seq", "ori", "obs"))
+# Output layouts the streaming mode can write: the others need every intron before writing
+# (sorted multi-FASTA files, sequence deduplication)
+STREAMING_LAYOUTS = ("intron",)
+
+
+class Pipeline:
+    """
+    Runs the stages of the streaming pipeline and connects them with bounded queues.
+    A stage that fails stops the others; run() re-raises its error in the calling thread.
+    The run time of each stage and the time it spends waiting on its queues are recorded (see busy_times).
+    """
+
+    def __init__(self, queue_size=8):
+        self.queue_size = queue_size
+        self.stopped = threading.Event()
+        self.errors = []
+        self.threads = []
+        self.waits = {}
+        self.run_times = {}
+
+    def queue(self):
+        return queue.Queue(maxsize=self.queue_size)
+
+    def wait(self, seconds):
+        name = threading.current_thread().name
+        self.waits[name] = self.waits.get(name, 0.0) + seconds
+
+    def put(self, out_queue, item):
+        """
+        Puts an item on a queue, blocking while it is full. Returns False if the pipeline was stopped.
+        """
+        start = time.perf_counter()
+        try:
+            while not self.stopped.is_set():
+                try:
+                    out_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self.wait(time.perf_counter() - start)
+
+    def iter_queue(self, in_queue):
+        """
+        Yields the items of a queue until the end-of-stream marker (None) or until the pipeline is stopped.
+        """
+        while True:
+            start = time.perf_counter()
+            item = None
+            while not self.stopped.is_set():
+                try:
+                    item = in_queue.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    continue
+            self.wait(time.perf_counter() - start)
+            if item is None:
+                return
+            yield item
+
+    def start(self, name, target, *args):
+        """
+        Runs target(*args) in a new thread named after the stage.
+        """
+        def run():
+            start = time.perf_counter()
+            try:
+                target(*args)
+            except BaseException as error:
+                self.errors.append(error)
+                self.stopped.set()
+            finally:
+                self.run_times[name] = time.perf_counter() - start
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        self.threads.append(thread)
+        thread.start()
+
+    def run(self, name, target, *args):
+        """
+        Runs the last stage in the calling thread, waits for the other stages and re-raises the first error.
+        An error of the last stage takes precedence; the errors of the other stages are logged.
+        """
+        threading.current_thread().name, previous_name = name, threading.current_thread().name
+        start = time.perf_counter()
+        try:
+            result = target(*args)
+        except BaseException:
+            self.stopped.set()
+            raise
+        finally:
+            self.run_times[name] = time.perf_counter() - start
+            threading.current_thread().name = previous_name
+            for thread in self.threads:
+                thread.join()
+            for error in self.errors:
+                logging.error(f"Pipeline stage failed: {error!r}")
+        # Raised here rather than in finally, so an error of the last stage itself keeps propagating
+        if self.errors:
+            raise self.errors[0]
+        return result
+
+    def busy_times(self):
+        """
+        Returns the time each stage spent working, i.e. not waiting on a queue, by stage name.
+        """
+        return {name: max(run_time - self.waits.get(name, 0.0), 0.0) for name, run_time in self.run_times.items()}
+
+def derive_stage(pipeline, out_queue, input_file, file_format, introns_file, batch_size):
+    """
+    Derives the introns of the annotation and puts batches of (contig, intron row) on out_queue.
+    The intron lines are also written to introns_file when given.
+    """
+    lines = derive_introns(input_file, file_format=file_format)
+    introns_out = open(introns_file, "w") if introns_file else None
+    try:
+        if introns_out is not None:
+            lines = tee_lines(lines, introns_out)
+        gene_contigs = {}
+        batch = []
+        for gene_row, intron_row in iter_table_rows(lines):
+            # Introns take the contig of their gene's first intron, as in the genes table
+            if gene_row is not None:
+                gene_contigs[gene_row["gene"]] = gene_row["contig"]
+            batch.append((gene_contigs[intron_row["gene"]], intron_row))
+            if len(batch) >= batch_size:
+                if not pipeline.put(out_queue, batch):
+                    return
+                batch = []
+        if batch and not pipeline.put(out_queue, batch):
+            return
+    finally:
+        if introns_out is not None:
+            introns_out.close()
+    pipeline.put(out_queue, None)
+
+def tee_lines(lines, out):
+    for line in lines:
+        out.write(line + "\n")
+        yield line
+
+def extract_stage(pipeline, in_queue, out_queue, fasta_file, strand_aware, genome_store):
+    """
+    Reads the sequences of each batch of introns through the FASTA index (or genome store), one contig
+    at a time, and puts the batch of IntronRows on out_queue in the same order.
+    """
+    missing_contigs = set()
+    with open_genome(fasta_file, genome_store) as genome:
+        for batch in pipeline.iter_queue(in_queue):
+            by_contig = {}
+            for index, (contig, row) in enumerate(batch):
+                by_contig.setdefault(contig, []).append(index)
+
+            seqs = [None] * len(batch)
+            for contig, indexes in by_contig.items():
+                if contig not in genome:
+                    if contig not in missing_contigs:
+                        missing_contigs.add(contig)
+                        logging.warning(f"Contig {contig} not found in FASTA file {fasta_file}. Skipping.")
+                    continue
+                # GFF coordinates are 1-based and inclusive; fetch_many() takes Python slice coordinates
+                ranges = [(batch[i][1]["beg"] - 1, batch[i][1]["end"], batch[i][1]["ori"] if strand_aware else "+") for i in indexes]
+                for i, seq in zip(indexes, genome.fetch_many(contig, ranges)):
+                    seqs[i] = seq
+
+            rows = [
+                IntronRow(contig, row["gene"], row["intron"], row["beg"], row["end"], seq, row["ori"], row["obs"])
+                for (contig, row), seq in zip(batch, seqs)
+            ]
+            count("bases_extracted", sum(len(seq) for seq in seqs if seq))
+            if not pipeline.put(out_queue, rows):
+                return
+    pipeline.put(out_queue, None)
+
+# Function to run the streaming pipeline on one annotation file
+@profiled_stage("streaming_pipeline")
+def run_pipeline(input_file, fasta_file, output_name, file_format=None, output_options=None, strand_aware=True,
+                 genome_store=False, introns_file=None, batch_size=2000, queue_size=8, **ignored_options):
+    """
+    Derives the introns of input_file, extracts their sequences from fasta_file and writes output_name.zip
+    (intron layout), with the three stages overlapping: end-to-end time approaches the slowest stage
+    instead of the sum of the stages. Each queue holds at most queue_size batches of batch_size introns,
+    which bounds memory. introns_file, when given, receives the derived intron lines (debug artifact).
+    The output has the same members and contents as process_single_file's, written in annotation order,
+    so the archive file is not byte-identical.
+    Returns the path of the output written.
+    """
+    output_options = dict(output_options or {})
+    layout = output_options.pop("layout", "intron")
+    if layout not in STREAMING_LAYOUTS:
+        raise ValueError(f"The streaming mode writes the {', '.join(STREAMING_LAYOUTS)} layout, not {layout}.")
+    if output_options.get("compression", "deflate") == "bgzip":
+        raise ValueError("bgzip compression needs a multi-FASTA layout (contig or genome).")
+    if output_options.get("write_fai"):
+        logging.warning("A .fai index is only written for the contig and genome layouts.")
+    if ignored_options.get("workers", 1) > 1:
+        logging.info("The streaming mode extracts sequences in one thread; extraction workers are not used.")
+
+    logging.info(f"Streaming pipeline: {input_file} + {fasta_file} -> {output_name}.zip")
+    start_time = time.perf_counter()
+    pipeline = Pipeline(queue_size)
+    introns_queue = pipeline.queue()
+    rows_queue = pipeline.queue()
+    pipeline.start("derive", derive_stage, pipeline, introns_queue, input_file, file_format, introns_file, batch_size)
+    pipeline.start("extract", extract_stage, pipeline, introns_queue, rows_queue, fasta_file, strand_aware, genome_store)
+
+    def write():
+        rows = (row for batch in pipeline.iter_queue(rows_queue) for row in batch)
+        return write_rows_zip(rows, output_name, output_options.get("compression", "deflate"), output_options.get("compresslevel"))
+    try:
+        output_path = pipeline.run("write", write)
+    except BaseException:
+        # Do not leave a partial archive behind
+        if os.path.exists(output_name + ".zip"):
+            os.remove(output_name + ".zip")
+        raise
+
+    elapsed = time.perf_counter() - start_time
+    busy = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in pipeline.busy_times().items())
+    logging.info(f"Streaming pipeline finished in {elapsed:.2f} s (busy time per stage: {busy}).")
+    return output_path
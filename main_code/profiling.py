@@ -0,0 +1,126 @@
+import os
+import csv
+import json
+import time
+import cProfile
+import logging
+import resource
+import functools
+import sys
+from logger_config import setup_logger
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script collects per-stage metrics (wall time, CPU time, peak RSS and item counters) for the
+# pipeline stages, and can keep a cProfile dump of the slowest stage. It is a no-op unless enabled.
+
+
+class StageProfiler:
+    """
+    Holds the metrics of the stages run in this process.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.cprofile = False
+        self.stages = []
+        self.active = []          # Stack of running stage records
+        self.hottest = None       # (wall seconds, stage name, cProfile.Profile) of the slowest profiled stage
+
+profiler = StageProfiler()
+
+
+def enable_profiling(cprofile=False):
+    """
+    Turns on stage metrics, and cProfile of every top-level stage when cprofile is True.
+    """
+    profiler.enabled = True
+    profiler.cprofile = cprofile
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the process so far, in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def count(name, value=1):
+    """
+    Adds value to the counter `name` of the running stage (e.g. introns, bases_extracted, bytes_written).
+    """
+    if profiler.enabled and profiler.active:
+        counters = profiler.active[-1]["counters"]
+        counters[name] = counters.get(name, 0) + value
+
+def profiled_stage(name):
+    """
+    Decorator that records the metrics of every call of the decorated function as stage `name`.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+
+            stage = {"stage": name, "counters": {}}
+            profile = cProfile.Profile() if profiler.cprofile and not profiler.active else None
+            profiler.active.append(stage)
+            start_wall = time.perf_counter()
+            start_cpu = time.process_time()
+            if profile is not None:
+                profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                profiler.active.pop()
+                stage["wall_seconds"] = round(time.perf_counter() - start_wall, 4)
+                stage["cpu_seconds"] = round(time.process_time() - start_cpu, 4)
+                stage["peak_rss_mb"] = round(peak_rss_mb(), 1)
+                profiler.stages.append(stage)
+                if profile is not None and (profiler.hottest is None or stage["wall_seconds"] > profiler.hottest[0]):
+                    profiler.hottest = (stage["wall_seconds"], name, profile)
+        return wrapper
+    return decorator
+
+def take_stages(since=0):
+    """
+    Removes and returns the stages recorded after the first `since` ones (used to hand worker metrics to the parent).
+    """
+    stages = profiler.stages[since:]
+    del profiler.stages[since:]
+    return stages
+
+def add_stages(stages):
+    """
+    Adds stages recorded in another process to this process' report.
+    """
+    profiler.stages.extend(stages)
+
+# Function to write the profiling report
+def write_profile_report(path, cprofile_path=None):
+    """
+    Writes the recorded stages to path as JSON, or as CSV when path ends in .csv.
+    With cprofile_path, the cProfile stats of the slowest stage are dumped there as well.
+    """
+    if path.endswith(".csv"):
+        counter_names = sorted({name for stage in profiler.stages for name in stage["counters"]})
+        columns = ["input", "stage", "wall_seconds", "cpu_seconds", "peak_rss_mb"] + counter_names
+        with open(path, "w", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=columns)
+            writer.writeheader()
+            for stage in profiler.stages:
+                row = {key: value for key, value in stage.items() if key != "counters"}
+                row.update(stage["counters"])
+                writer.writerow(row)
+    else:
+        with open(path, "w") as out:
+            json.dump({"stages": profiler.stages}, out, indent=2)
+    logging.info(f"Profile report written to {path}: {len(profiler.stages)} stages.")
+
+    if cprofile_path and profiler.hottest is not None:
+        wall_seconds, name, profile = profiler.hottest
+        os.makedirs(os.path.dirname(os.path.abspath(cprofile_path)), exist_ok=True)
+        profile.dump_stats(cprofile_path)
+        logging.info(f"cProfile stats of the slowest stage ({name}, {wall_seconds} s) written to {cprofile_path}")
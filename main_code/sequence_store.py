@@ -0,0 +1,120 @@
+import os
+import hashlib
+import logging
+from itertools import islice
+import sqlalchemy as sql
+from logger_config import setup_logger
+from metadata import sequence_store_metadata, shared_sequences, genome_sequences
+from database import set_sqlite_pragmas
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script provides content-addressed storage of intron sequences: every distinct sequence is kept once
+# under its digest. SequenceStore is a file-backed store shared by the genomes of a batch, so a sequence
+# found in several related assemblies is stored (and compressed) only once.
+
+# The store's tables are in metadata.py. WAL lets workers read the store while another one adds a genome
+SEQUENCE_STORE_PRAGMAS = {"journal_mode": "WAL"}
+
+
+def sequence_digest(seq):
+    """
+    Returns the content digest of a sequence: 128-bit BLAKE2b, as hex.
+    """
+    return hashlib.blake2b(seq.encode(), digest_size=16).hexdigest()
+
+def dedup_stats(intron_count, total_bases, unique_sequences, stored_bases):
+    """
+    Summarizes how much space deduplication saved, in bases.
+    """
+    saved = total_bases - stored_bases
+    return {
+        "introns": intron_count,
+        "unique_sequences": unique_sequences,
+        "total_bases": total_bases,
+        "stored_bases": stored_bases,
+        "saved_bases": saved,
+        "saved_fraction": round(saved / total_bases, 4) if total_bases else 0.0,
+    }
+
+
+class SequenceStore:
+    """
+    SQLite file holding distinct sequences by digest and the number of introns of each genome that use them.
+    Several worker processes can add genomes to the same store.
+    """
+
+    def __init__(self, path, timeout=600):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.engine = sql.create_engine(f"sqlite+pysqlite:///{path}", echo=False, connect_args={"timeout": timeout})
+        set_sqlite_pragmas(self.engine, SEQUENCE_STORE_PRAGMAS)
+        sequence_store_metadata.create_all(self.engine)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_genome(self, genome, entries, batch_size=10000):
+        """
+        Replaces the sequences referenced by a genome with entries, an iterable of (digest, seq, copies),
+        inserted in batches of batch_size. Returns the number of sequences that were not in the store yet.
+        """
+        count_stmt = sql.select(sql.func.count()).select_from(shared_sequences)
+        entries = iter(entries)
+        with self.engine.begin() as conn:
+            before = conn.execute(count_stmt).scalar()
+            conn.execute(sql.delete(genome_sequences).where(genome_sequences.c.genome == genome))
+            while batch := list(islice(entries, batch_size)):
+                conn.execute(shared_sequences.insert().prefix_with("OR IGNORE"),
+                             [{"digest": digest, "seq": seq, "length": len(seq)} for digest, seq, _ in batch])
+                conn.execute(genome_sequences.insert(),
+                             [{"genome": genome, "digest": digest, "copies": copies} for digest, _, copies in batch])
+            after = conn.execute(count_stmt).scalar()
+        return after - before
+
+    def used_digests(self, genomes):
+        """
+        Returns the subquery of the digests used by the given genomes (all genomes when None).
+        """
+        stmt = sql.select(genome_sequences.c.digest).distinct()
+        if genomes is not None:
+            stmt = stmt.where(genome_sequences.c.genome.in_(list(genomes)))
+        return stmt
+
+    def iter_sequences(self, genomes=None, batch_size=10000):
+        """
+        Yields (digest, seq) for every sequence used by the given genomes (all genomes by default), by digest.
+        """
+        stmt = (
+            sql.select(shared_sequences.c.digest, shared_sequences.c.seq)
+            .where(shared_sequences.c.digest.in_(self.used_digests(genomes)))
+            .order_by(shared_sequences.c.digest)
+        )
+        with self.engine.connect() as conn:
+            for partition in conn.execution_options(yield_per=batch_size).execute(stmt).partitions():
+                yield from partition
+
+    def stats(self, genomes=None):
+        """
+        Returns dedup_stats across the given genomes (all genomes by default).
+        """
+        copies = sql.select(
+            sql.func.coalesce(sql.func.sum(genome_sequences.c.copies), 0),
+            sql.func.coalesce(sql.func.sum(genome_sequences.c.copies * shared_sequences.c.length), 0),
+        ).join(shared_sequences, shared_sequences.c.digest == genome_sequences.c.digest)
+        if genomes is not None:
+            copies = copies.where(genome_sequences.c.genome.in_(list(genomes)))
+        stored = sql.select(
+            sql.func.count(), sql.func.coalesce(sql.func.sum(shared_sequences.c.length), 0)
+        ).where(shared_sequences.c.digest.in_(self.used_digests(genomes)))
+        with self.engine.connect() as conn:
+            intron_count, total_bases = conn.execute(copies).one()
+            unique_sequences, stored_bases = conn.execute(stored).one()
+        return dedup_stats(intron_count, total_bases, unique_sequences, stored_bases)
+
+    def close(self):
+        self.engine.dispose()
+        logging.info(f"Sequence store closed: {self.path}")
@@ -0,0 +1,595 @@
+import os
+import json
+import time
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+from logger_config import setup_logger
+from api import iter_introns, IntronIndex
+from genome_store import open_genome
+from output import LAYOUTS, COMPRESSIONS
+
+# Setup logger
+setup_logger("GetIntronSeq.log")
+# This script is a long-running extraction service. It keeps parsed annotations (interval indexes of their
+# introns) and opened genomes (FASTA index or 2-bit store) in memory, with LRU eviction, and answers
+# requests over a local Unix socket (one JSON object per line) or HTTP, without starting a pipeline run:
+#
+#     python service.py --socket /tmp/getintronseq.sock
+#     echo '{"op": "gene", "annotation": "genome.gff3", "fasta": "genome.fasta", "gene": "g1"}' | nc -U /tmp/getintronseq.sock
+#     python service.py --port 8765
+#     curl 'http://127.0.0.1:8765/region?annotation=genome.gff3&fasta=genome.fasta&contig=contig1&start=1&end=50000'
+#
+# Lookups run in a thread pool; exports build the database from the cached annotation and read the sequences
+# from the cached genome, in a pool of export threads.
+
+# Requests the service answers
+OPERATIONS = ("gene", "region", "export", "stats")
+# Latencies kept per operation for the percentiles
+LATENCY_WINDOW = 10000
+# Largest request line (Unix socket) or body (HTTP) accepted, in bytes
+MAX_REQUEST_SIZE = 1 << 20
+
+
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+# Output options an export request may set, each with the check of its value; anything else is rejected
+EXPORT_OUTPUT_OPTIONS = {
+    "layout": lambda value: value in LAYOUTS,
+    "compression": lambda value: value in COMPRESSIONS,
+    "compresslevel": lambda value: value is None or (is_int(value) and 0 <= value <= 9),
+    "threads": lambda value: is_int(value) and 1 <= value <= (os.cpu_count() or 1),
+    "write_fai": lambda value: isinstance(value, bool),
+}
+
+
+# Query-string fields converted from text before a GET request is validated
+QUERY_FLAGS = ("contained", "intron_stats", "write_fai")
+QUERY_INTEGERS = ("start", "end", "compresslevel", "threads")
+
+
+class ServiceError(Exception):
+    """
+    Error caused by a request (bad operation, missing field, unknown file); reported to the client.
+    """
+
+
+class LruCache:
+    """
+    Holds up to max_items values by key, evicting the least recently used one, and counts hits and misses.
+    on_evict(value) is called for every evicted value (e.g. to close a genome).
+    """
+
+    def __init__(self, max_items, on_evict=None):
+        self.max_items = max_items
+        self.on_evict = on_evict
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, valid=None):
+        """
+        Returns the value of key, or None (a miss) when it is missing or valid(value) is false.
+        """
+        if key in self.items and (valid is None or valid(self.items[key])):
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if key in self.items and self.on_evict is not None:
+            self.on_evict(self.items[key])
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_items:
+            _, evicted = self.items.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+
+    def clear(self):
+        while self.items:
+            _, value = self.items.popitem()
+            if self.on_evict is not None:
+                self.on_evict(value)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"items": len(self.items), "max_items": self.max_items, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": round(self.hits / lookups, 4) if lookups else None}
+
+
+class AnnotationEntry:
+    """
+    Parsed annotation: the interval index of its introns and the introns of each gene, plus the intron
+    database of exports, built on the first export and kept with the entry.
+    """
+
+    def __init__(self, annotation_file, signature):
+        self.annotation_file = annotation_file
+        self.signature = signature
+        self.index = IntronIndex(iter_introns(annotation_file))
+        self.genes = {}
+        for record in self.index:
+            self.genes.setdefault(record.gene, []).append(record)
+        self.scan = None
+        self.database = None
+        self.lock = threading.Lock()
+
+    def input_scan(self):
+        """
+        Returns the InputScan of the annotation (format, intron features, ##FASTA section), scanned once.
+        """
+        from input_scanner import scan_input
+        with self.lock:
+            if self.scan is None:
+                self.scan = scan_input(self.annotation_file)
+            return self.scan
+
+    def export_database(self, cache_dir=None):
+        """
+        Returns a copy of the annotation's intron database (without sequences), for one export to fill.
+        The database is derived on the first call, or read from the intron table cache in cache_dir, as the pipeline does.
+        """
+        from input_processing import make_introns_file
+        from database import create_database, copy_database
+        from annotation_cache import file_digest, cache_key, load_cached_database, store_cached_database
+
+        scan = self.input_scan()
+        with self.lock:
+            if self.database is None:
+                if not scan.has_introns:
+                    raise ServiceError(f"The annotation does not contain introns: {self.annotation_file}")
+                key = cache_key("introns", file_digest(self.annotation_file), "native") if cache_dir else None
+                db = load_cached_database(cache_dir, key) if cache_dir else None
+                if db is None:
+                    with tempfile.TemporaryDirectory() as work_dir:
+                        introns_file = make_introns_file(self.annotation_file, os.path.join(work_dir, "introns.gff"),
+                                                         file_format=scan.format)
+                        db = create_database(introns_file)
+                    if cache_dir:
+                        store_cached_database(db, cache_dir, key)
+                # Kept on one connection, so the export threads all see it
+                self.database = copy_database(db, shared=True)
+                db.dispose()
+            return copy_database(self.database)
+
+    def close(self):
+        with self.lock:
+            if self.database is not None:
+                self.database.dispose()
+                self.database = None
+
+
+class GenomeEntry:
+    """
+    Opened genome (IndexedFasta or GenomeStore). Reads are serialized per genome, since the BGZF reader seeks.
+    A read that comes after the entry was evicted opens the genome once more for itself.
+    start is the byte offset of the sequences when they are the ##FASTA section of a GFF3 file.
+    """
+
+    def __init__(self, fasta_file, genome_store, signature, start=0):
+        self.fasta_file = fasta_file
+        self.genome_store = genome_store
+        self.signature = signature
+        self.start = start
+        self.genome = open_genome(fasta_file, genome_store, start)
+        self.lock = threading.Lock()
+
+    def __contains__(self, contig):
+        with self.lock:
+            if self.genome is None:
+                with open_genome(self.fasta_file, self.genome_store, self.start) as genome:
+                    return contig in genome
+            return contig in self.genome
+
+    def fetch_many(self, contig, ranges):
+        with self.lock:
+            if self.genome is None:
+                with open_genome(self.fasta_file, self.genome_store, self.start) as genome:
+                    return genome.fetch_many(contig, ranges) if contig in genome else [None] * len(ranges)
+            if contig not in self.genome:
+                return [None] * len(ranges)
+            return self.genome.fetch_many(contig, ranges)
+
+    def close(self):
+        with self.lock:
+            if self.genome is not None:
+                self.genome.close()
+                self.genome = None
+
+
+def file_signature(path):
+    """
+    Returns (size, mtime) of a file, so cached entries are reloaded when it changes.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise ServiceError(f"File not found: {path}") from None
+    return stat.st_size, stat.st_mtime_ns
+
+def percentiles(values, points=(50, 90, 99)):
+    """
+    Returns the nearest-rank percentiles of values, in milliseconds, rounded to 0.01.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return {f"p{point}": None for point in points}
+    return {f"p{point}": round(ordered[min(len(ordered) - 1, max(0, -(-point * len(ordered) // 100) - 1))], 2) for point in points}
+
+def record_dict(record, seq):
+    return {"contig": record.contig, "gene": record.gene, "transcript": record.transcript, "start": record.beg,
+            "end": record.end, "strand": record.strand, "length": len(record), "seq": seq}
+
+def run_export(annotation, genome, output_name, options, cache_dir=None):
+    """
+    Writes one export from a cached annotation and genome: a copy of the annotation's intron database gets
+    the sequences read from the open genome, and the results are written as by the pipeline.
+    Returns the path of the output written.
+    """
+    from fasta_processing import add_sequences
+    from input_processing import write_results
+    db = annotation.export_database(cache_dir)
+    try:
+        add_sequences(db, genome.fasta_file, genome=genome, **options["sequence_options"])
+        return write_results(db, output_name, options["output_options"], stats_options=options["stats_options"])
+    finally:
+        db.dispose()
+
+
+class IntronService:
+    """
+    Answers gene, region, export and stats requests from warm caches of annotations and genomes.
+    Loads run in the thread pool, once per file even when several requests ask for it at the same time.
+    """
+
+    def __init__(self, max_annotations=8, max_genomes=4, threads=4, export_workers=1, strand_aware=True,
+                 genome_store=False, cache_dir=None, output_dir=None):
+        self.annotations = LruCache(max_annotations, on_evict=self.close_entry)
+        self.genomes = LruCache(max_genomes, on_evict=self.close_entry)
+        self.closing = False
+        self.strand_aware = strand_aware
+        self.genome_store = genome_store
+        self.cache_dir = cache_dir
+        # Exports are only written inside output_dir, and are disabled without it
+        self.output_dir = os.path.realpath(output_dir) if output_dir else None
+        self.threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="service")
+        # Exports have their own threads, so long exports do not hold up the lookups
+        self.exporters = ThreadPoolExecutor(max_workers=export_workers, thread_name_prefix="export")
+        self.loading = {}
+        self.latencies = {operation: deque(maxlen=LATENCY_WINDOW) for operation in OPERATIONS}
+        self.requests = 0
+        self.errors = 0
+        self.started = time.time()
+
+    def close_entry(self, entry):
+        """
+        Closes an evicted entry in the thread pool: unmapping a genome can wait on I/O, and an annotation's
+        database on a running export, which must not block the event loop.
+        """
+        if self.closing:
+            entry.close()
+        else:
+            self.threads.submit(entry.close)
+
+    def export_path(self, output):
+        """
+        Returns the path of an export inside the output directory, refusing names that point outside of it.
+        """
+        if self.output_dir is None:
+            raise ServiceError("Exports are disabled: start the service with --output-dir.")
+        if not isinstance(output, str) or os.path.isabs(output):
+            raise ServiceError("output must be a relative name inside the output directory.")
+        path = os.path.realpath(os.path.join(self.output_dir, output))
+        if path == self.output_dir or os.path.commonpath([path, self.output_dir]) != self.output_dir:
+            raise ServiceError(f"output must be a name inside the output directory: {output}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    async def cached(self, cache, key, signature, load):
+        """
+        Returns the cached entry for key, loading it in the thread pool when missing or stale.
+        """
+        entry = cache.get(key, valid=lambda entry: entry.signature == signature)
+        if entry is not None:
+            return entry
+        if key not in self.loading:
+            self.loading[key] = asyncio.get_running_loop().run_in_executor(self.threads, load)
+        try:
+            entry = await asyncio.shield(self.loading[key])
+        finally:
+            self.loading.pop(key, None)
+        if cache.items.get(key) is not entry:
+            cache.put(key, entry)
+        return entry
+
+    async def annotation(self, annotation_file):
+        path = os.path.abspath(annotation_file)
+        signature = file_signature(path)
+        return await self.cached(self.annotations, ("annotation", path), signature, lambda: AnnotationEntry(path, signature))
+
+    async def genome(self, fasta_file, start=0):
+        path = os.path.abspath(fasta_file)
+        signature = file_signature(path)
+        return await self.cached(self.genomes, ("genome", path, self.genome_store), signature,
+                                 lambda: GenomeEntry(path, self.genome_store, signature, start))
+
+    async def with_sequences(self, records, fasta_file):
+        """
+        Returns the records as dicts, with their sequences read from the cached genome when fasta_file is given.
+        """
+        if not fasta_file or not records:
+            return [record_dict(record, None) for record in records]
+        genome = await self.genome(fasta_file)
+
+        def fetch():
+            by_contig = {}
+            for position, record in enumerate(records):
+                by_contig.setdefault(record.contig, []).append(position)
+            seqs = [None] * len(records)
+            for contig, positions in by_contig.items():
+                ranges = [(records[i].beg - 1, records[i].end, records[i].strand if self.strand_aware else "+") for i in positions]
+                for i, seq in zip(positions, genome.fetch_many(contig, ranges)):
+                    seqs[i] = seq
+            return seqs
+        seqs = await asyncio.get_running_loop().run_in_executor(self.threads, fetch)
+        return [record_dict(record, seq) for record, seq in zip(records, seqs)]
+
+    async def gene(self, request):
+        annotation = await self.annotation(required(request, "annotation"))
+        gene = required(request, "gene")
+        records = annotation.genes.get(gene, [])
+        return {"gene": gene, "introns": await self.with_sequences(records, request.get("fasta"))}
+
+    async def region(self, request):
+        annotation = await self.annotation(required(request, "annotation"))
+        contig = required(request, "contig")
+        try:
+            start, end = int(required(request, "start")), int(required(request, "end"))
+        except ValueError:
+            raise ServiceError("start and end must be integers.") from None
+        contained = str(request.get("contained", False)).lower() in ("1", "true", "yes")
+        records = annotation.index.introns_in(contig, start, end, contained=contained)
+        return {"contig": contig, "start": start, "end": end, "introns": await self.with_sequences(records, request.get("fasta"))}
+
+    async def export(self, request):
+        annotation_file = required(request, "annotation")
+        output_name = self.export_path(required(request, "output"))
+        output_options = request.get("output_options") or {}
+        if not isinstance(output_options, dict):
+            raise ServiceError("output_options must be an object.")
+        for name, value in output_options.items():
+            if name not in EXPORT_OUTPUT_OPTIONS:
+                raise ServiceError(f"Unknown output option: {name}. Choose from {', '.join(EXPORT_OUTPUT_OPTIONS)}.")
+            if not EXPORT_OUTPUT_OPTIONS[name](value):
+                raise ServiceError(f"Invalid value for output option {name}: {value!r}")
+        if not isinstance(request.get("intron_stats", False), bool):
+            raise ServiceError("intron_stats must be true or false.")
+        options = {"output_options": output_options,
+                   "stats_options": {"strand_aware": self.strand_aware} if request.get("intron_stats") else None,
+                   "sequence_options": {"strand_aware": self.strand_aware, "genome_store": self.genome_store}}
+        annotation = await self.annotation(annotation_file)
+        if request.get("fasta"):
+            genome = await self.genome(request["fasta"])
+        else:
+            # Without a FASTA file, the sequences are read in place from the annotation's ##FASTA section
+            scan = await asyncio.get_running_loop().run_in_executor(self.threads, annotation.input_scan)
+            if not scan.has_sequences:
+                raise ServiceError("The annotation does not contain sequences; give a fasta file.")
+            genome = await self.genome(annotation.annotation_file, scan.fasta_offset)
+        output_path = await asyncio.get_running_loop().run_in_executor(
+            self.exporters, run_export, annotation, genome, output_name, options, self.cache_dir
+        )
+        return {"output": output_path}
+
+    async def stats(self, request=None):
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1), "requests": self.requests, "errors": self.errors,
+            "caches": {"annotations": self.annotations.stats(), "genomes": self.genomes.stats()},
+            "latency_ms": {operation: dict(count=len(values), **percentiles(values))
+                           for operation, values in self.latencies.items() if values},
+        }
+
+    async def handle(self, request):
+        """
+        Answers one request dict and returns the response dict ({"ok": true, ...} or {"ok": false, "error": ...}).
+        """
+        start = time.perf_counter()
+        operation = request.get("op") if isinstance(request, dict) else None
+        self.requests += 1
+        try:
+            if operation not in OPERATIONS:
+                raise ServiceError(f"Unknown operation: {operation}. Choose from {', '.join(OPERATIONS)}.")
+            response = {"ok": True, **await getattr(self, operation)(request)}
+        except ServiceError as error:
+            self.errors += 1
+            response = {"ok": False, "error": str(error)}
+        except Exception as error:
+            self.errors += 1
+            logging.exception(f"Request {operation} failed")
+            response = {"ok": False, "error": f"{type(error).__name__}: {error}"}
+        if operation in self.latencies:
+            self.latencies[operation].append((time.perf_counter() - start) * 1000)
+        return response
+
+    def close(self):
+        self.closing = True
+        self.exporters.shutdown(wait=True)
+        self.threads.shutdown(wait=True)
+        self.genomes.clear()
+        self.annotations.clear()
+
+def required(request, name):
+    if request.get(name) in (None, ""):
+        raise ServiceError(f"Missing field: {name}")
+    return request[name]
+
+# Function to serve JSON lines on a Unix socket
+async def handle_json_lines(service, reader, writer):
+    """
+    Reads one JSON request per line and writes one JSON response per line, until the client disconnects.
+    """
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as error:
+                response = {"ok": False, "error": f"Invalid JSON: {error}"}
+            else:
+                response = await service.handle(request)
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+    except (ConnectionError, ValueError) as error:
+        logging.warning(f"Client connection closed: {error}")
+    finally:
+        writer.close()
+
+# Function to turn an HTTP query string into a request dict
+def query_request(query):
+    """
+    Returns the request of a GET query string, with its flags as bool (1/true/yes, 0/false/no) and its
+    numbers as int; values that do not convert are left as text, for validation to reject.
+    Output options of an export are given as plain fields, e.g. ?output=run&layout=contig&compresslevel=9.
+    """
+    request = {}
+    for name, value in parse_qsl(query):
+        if name in QUERY_FLAGS and value.lower() in ("1", "true", "yes", "0", "false", "no"):
+            value = value.lower() in ("1", "true", "yes")
+        elif name in QUERY_INTEGERS and value.lstrip("-").isdigit():
+            value = int(value)
+        if name in EXPORT_OUTPUT_OPTIONS:
+            request.setdefault("output_options", {})[name] = value
+        else:
+            request[name] = value
+    return request
+
+# Function to serve HTTP requests
+async def handle_http(service, reader, writer):
+    """
+    Answers one HTTP request: GET /<op>?field=value... or POST / (or /<op>) with a JSON body. Responses are JSON.
+    """
+    status, response = "200 OK", None
+    try:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if len(request_line) < 2:
+            raise ServiceError("Invalid HTTP request.")
+        method, target = request_line[0], urlsplit(request_line[1])
+        request = query_request(target.query)
+        if method == "POST":
+            length = int(headers.get("content-length", 0))
+            if length > MAX_REQUEST_SIZE:
+                raise ServiceError("Request body too large.")
+            body = await reader.readexactly(length)
+            request.update(json.loads(body) if body.strip() else {})
+        elif method != "GET":
+            status = "405 Method Not Allowed"
+            raise ServiceError(f"Unsupported method: {method}")
+        if target.path.strip("/"):
+            request.setdefault("op", target.path.strip("/"))
+        response = await service.handle(request)
+        if not response["ok"]:
+            status = "400 Bad Request"
+    except (ServiceError, json.JSONDecodeError, ValueError) as error:
+        status = status if status != "200 OK" else "400 Bad Request"
+        response = {"ok": False, "error": str(error)}
+    except (ConnectionError, asyncio.IncompleteReadError):
+        writer.close()
+        return
+    body = json.dumps(response).encode()
+    writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + body)
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
+
+# Function to run the service until it is interrupted
+async def serve(service, socket_path=None, host="127.0.0.1", port=None):
+    """
+    Serves JSON lines on socket_path, or HTTP on host:port, until SIGINT or SIGTERM.
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Left behind by a service that did not shut down
+        server = await asyncio.start_unix_server(lambda r, w: handle_json_lines(service, r, w), path=socket_path,
+                                                 limit=MAX_REQUEST_SIZE)
+        address = socket_path
+    else:
+        server = await asyncio.start_server(lambda r, w: handle_http(service, r, w), host, port)
+        address = f"http://{host}:{port}"
+    logging.info(f"GetIntronSeq service listening on {address}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+        logging.info(f"GetIntronSeq service stopped: {json.dumps(await service.stats())}")
+        await loop.run_in_executor(None, service.close)
+
+# Function to send one request to a running service (Unix socket)
+def query(socket_path, timeout=60, **request):
+    """
+    Sends one request to the service on socket_path and returns its response dict, e.g.
+    query("/tmp/getintronseq.sock", op="gene", annotation="genome.gff3", fasta="genome.fasta", gene="g1").
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as response:
+            return json.loads(response.readline())
+
+def main():
+    parser = argparse.ArgumentParser(description="GetIntronSeq service: answer intron lookups from warm annotation and genome caches.")
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument("--socket", help="Serve JSON lines on this Unix socket.")
+    address.add_argument("--port", type=int, help="Serve HTTP on this port.")
+    parser.add_argument("--host", default="127.0.0.1", help="HTTP host to bind (default: 127.0.0.1).")
+    parser.add_argument("--max-annotations", type=int, default=8, help="Parsed annotations kept in memory (default: 8).")
+    parser.add_argument("--max-genomes", type=int, default=4, help="Opened genomes kept in memory (default: 4).")
+    parser.add_argument("--threads", type=int, default=4, help="Threads for annotation loading and sequence reads (default: 4).")
+    parser.add_argument("--export-workers", type=int, default=1, help="Export requests run at the same time (default: 1).")
+    parser.add_argument("--genome-store", action="store_true", help="Read sequences through the 2-bit genome store (needs numpy).")
+    parser.add_argument("--genomic-orientation", action="store_true", help="Return minus-strand introns in genomic orientation.")
+    parser.add_argument("--cache-dir", required=False, help="Intron table cache directory used by export requests.")
+    parser.add_argument("--output-dir", required=False, help="Directory export requests write into; exports are disabled without it.")
+    args = parser.parse_args()
+
+    service = IntronService(args.max_annotations, args.max_genomes, args.threads, args.export_workers,
+                            not args.genomic_orientation, args.genome_store, args.cache_dir, args.output_dir)
+    asyncio.run(serve(service, args.socket, args.host, args.port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The modules of main_code import each other by name, as when main.py is run from that directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main_code"))
+
+from logger_config import setup_logger
+
+# Keep the log of the test runs out of the working tree
+setup_logger(os.path.join(tempfile.gettempdir(), "GetIntronSeq-tests.log"))
+
+COMPLEMENT = str.maketrans("ACGT", "TGCA")
+
+
+def reverse_complement(sequence):
+    return sequence.translate(COMPLEMENT)[::-1]
+
+# Introns in transcript orientation: one GT-AG and one GC-AG intron per strand
+PLUS_GT_AG = "GTAAGTATTTTTCCCTCCAG"
+PLUS_GC_AG = "GCAAGTCTTACTAACTTCAG"
+MINUS_GT_AG = "GTGAGTACCCCCTTTTACAG"
+MINUS_GC_AG = "GCGAGTTTTTTCCCCCCTAG"
+EXONS = ("ACGTTGCAAC", "CATGCATGCA", "TTGACCTTGA")
+
+# contig1 holds a plus-strand transcript and contig2 a minus-strand one; both have exons at 1-10, 31-40 and
+# 61-70, so the introns are at 11-30 and 41-60. On the minus strand the 5' intron is the one at 41-60.
+CONTIGS = {
+    "contig1": EXONS[0] + PLUS_GT_AG + EXONS[1] + PLUS_GC_AG + EXONS[2],
+    "contig2": EXONS[0] + reverse_complement(MINUS_GC_AG) + EXONS[1] + reverse_complement(MINUS_GT_AG) + EXONS[2],
+}
+# (contig, beg, end, strand) of each intron, 1-based and inclusive, and its sequence in transcript orientation
+EXPECTED_INTRONS = {
+    ("contig1", 11, 30, "+"): PLUS_GT_AG,
+    ("contig1", 41, 60, "+"): PLUS_GC_AG,
+    ("contig2", 11, 30, "-"): MINUS_GC_AG,
+    ("contig2", 41, 60, "-"): MINUS_GT_AG,
+}
+
+
+def write_gff3(path, transcripts):
+    """
+    Writes a GFF3 file; transcripts is a list of (contig, strand, transcript ID, [(beg, end) exons]).
+    """
+    with open(path, "w") as out:
+        out.write("##gff-version 3\n")
+        for contig, strand, transcript, exons in transcripts:
+            beg, end = exons[0][0], exons[-1][1]
+            gene = transcript.rsplit(".", 1)[0]
+            out.write(f"{contig}\ttest\tgene\t{beg}\t{end}\t.\t{strand}\t.\tID={gene}\n")
+            out.write(f"{contig}\ttest\tmRNA\t{beg}\t{end}\t.\t{strand}\t.\tID={transcript};Parent={gene}\n")
+            for exon_beg, exon_end in exons:
+                out.write(f"{contig}\ttest\texon\t{exon_beg}\t{exon_end}\t.\t{strand}\t.\tParent={transcript}\n")
+    return str(path)
+
+def add_intron_features(gff):
+    """
+    Appends the intron features of the test genome to gff: process_single_file only processes
+    annotations that list introns, as AUGUSTUS writes them.
+    """
+    with open(gff, "a") as out:
+        for contig, beg, end, strand in EXPECTED_INTRONS:
+            out.write(f"{contig}\ttest\tintron\t{beg}\t{end}\t.\t{strand}\t.\tParent=g{contig[-1]}.t1\n")
+    return gff
+
+def write_fasta(path, contigs, line_width=60):
+    with open(path, "w") as out:
+        for name, sequence in contigs.items():
+            out.write(f">{name}\n")
+            for start in range(0, len(sequence), line_width):
+                out.write(sequence[start:start + line_width] + "\n")
+    return str(path)
+
+@pytest.fixture
+def genome(tmp_path):
+    """
+    Returns (annotation file, FASTA file) of the two-contig test genome (see CONTIGS and EXPECTED_INTRONS).
+    """
+    exons = [(1, 10), (31, 40), (61, 70)]
+    gff = write_gff3(tmp_path / "genome.gff3", [("contig1", "+", "g1.t1", exons), ("contig2", "-", "g2.t1", exons)])
+    return gff, write_fasta(tmp_path / "genome.fasta", CONTIGS)
+
+def load_database(gff, fasta, tmp_path, **sequence_options):
+    """
+    Derives the introns of gff into a database and adds their sequences from fasta, as process_single_file does.
+    """
+    from input_processing import make_introns_file
+    from database import create_database
+    from fasta_processing import add_sequences
+    introns_file = make_introns_file(gff, str(tmp_path / "introns.gff"))
+    return add_sequences(create_database(introns_file), fasta, **sequence_options)
@@ -0,0 +1,40 @@
+import os
+import zipfile
+import sqlalchemy as sql
+from conftest import add_intron_features
+from metadata import introns
+from annotation_cache import cache_key, load_cached_database, store_cached_database
+from input_processing import process_single_file
+
+
+def zip_members(path):
+    with zipfile.ZipFile(path) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+def test_warm_cache_reproduces_the_output(genome, tmp_path):
+    gff, fasta = genome
+    add_intron_features(gff)
+    cache_dir = str(tmp_path / "cache")
+    cold = process_single_file(gff, fasta, str(tmp_path / "cold"), cache_dir=cache_dir)
+    entries = os.listdir(cache_dir)
+    assert len(entries) == 2  # The intron table, and the table with sequences
+    warm = process_single_file(gff, fasta, str(tmp_path / "warm"), cache_dir=cache_dir, store_options={"spill_dir": str(tmp_path / "spill")})
+    assert zip_members(warm) == zip_members(cold)
+    assert sorted(os.listdir(cache_dir)) == sorted(entries)
+    assert os.listdir(tmp_path / "spill") == []
+
+def test_cache_hit_loads_into_the_spill_file(tmp_path):
+    source = sql.create_engine("sqlite+pysqlite:///:memory:")
+    introns.create(source)
+    with source.begin() as conn:
+        conn.execute(introns.insert(), [{"gene": "g1", "intron": "intron1", "beg": 11, "end": 30}])
+    key = cache_key("introns", "digest", "native")
+    store_cached_database(source, str(tmp_path / "cache"), key)
+    spill_path = str(tmp_path / "spill.sqlite")
+    engine = load_cached_database(str(tmp_path / "cache"), key, spill_path)
+    assert engine.url.database == spill_path
+    with engine.connect() as conn:
+        assert conn.execute(sql.select(sql.func.count()).select_from(introns)).scalar() == 1
+    engine.dispose()
+    assert os.path.getsize(spill_path) > 0
+    assert load_cached_database(str(tmp_path / "cache"), cache_key("introns", "other", "native")) is None
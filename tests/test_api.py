@@ -0,0 +1,16 @@
+from conftest import EXPECTED_INTRONS
+from api import iter_introns, IntronIndex
+
+
+def test_record_length_matches_sequence(genome):
+    gff, fasta = genome
+    records = list(iter_introns(gff, fasta))
+    assert len(records) == len(EXPECTED_INTRONS)
+    for record in records:
+        assert len(record) == len(record.seq) == record.end - record.beg + 1
+
+def test_index_region_query_returns_sequences(genome):
+    gff, fasta = genome
+    index = IntronIndex.from_file(gff, fasta)
+    (record,) = index.introns_in("contig2", 41, 60, contained=True)
+    assert record.seq == EXPECTED_INTRONS[("contig2", 41, 60, "-")]
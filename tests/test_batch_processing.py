@@ -0,0 +1,76 @@
+import os
+import shutil
+import zipfile
+import pytest
+from conftest import add_intron_features, EXPECTED_INTRONS
+from batch_processing import plan_batch, process_batch
+
+
+@pytest.fixture
+def batch_dir(genome, tmp_path):
+    """
+    Returns an input directory with two copies of the test genome (a and b) and an annotation without FASTA (c).
+    """
+    gff, fasta = genome
+    add_intron_features(gff)
+    input_dir = tmp_path / "inputs"
+    input_dir.mkdir()
+    for name in ("a", "b"):
+        shutil.copy(gff, input_dir / f"{name}.gff3")
+        shutil.copy(fasta, input_dir / f"{name}.fasta")
+    shutil.copy(gff, input_dir / "c.gff3")
+    return str(input_dir)
+
+def test_plan_leaves_scanning_to_the_workers(batch_dir):
+    jobs, skipped = plan_batch(batch_dir)
+    assert [(os.path.basename(gff), scan) for gff, fasta, scan in jobs] == [("a.gff3", None), ("b.gff3", None)]
+    assert [(os.path.basename(entry["input"]), entry["reason"]) for entry in skipped] == [("c.gff3", "missing FASTA file")]
+    with pytest.raises(FileNotFoundError):
+        plan_batch(batch_dir, missing_fasta="fail")
+
+def test_inputs_with_the_same_name_are_rejected(batch_dir):
+    shutil.copy(os.path.join(batch_dir, "a.gff3"), os.path.join(batch_dir, "a.gtf"))
+    with pytest.raises(ValueError, match="a.gff3, a.gtf"):
+        plan_batch(batch_dir)
+
+def test_batch_writes_one_output_per_genome(batch_dir, tmp_path):
+    output_dir = str(tmp_path / "out")
+    summary = process_batch(batch_dir, output_dir, workers=2)
+    assert [entry["status"] for entry in summary] == ["completed", "completed", "skipped"]
+    for entry in summary[:2]:
+        with zipfile.ZipFile(entry["output"]) as archive:
+            assert len(archive.namelist()) == len(EXPECTED_INTRONS)
+
+def resumed_from(summary):
+    return {os.path.basename(entry["input"]): entry.get("resumed_from") for entry in summary if entry["status"] != "skipped"}
+
+def test_rerun_skips_completed_inputs_and_resumes_changed_ones(batch_dir, tmp_path):
+    output_dir = str(tmp_path / "out")
+    process_batch(batch_dir, output_dir)
+    assert resumed_from(process_batch(batch_dir, output_dir)) == {"a.gff3": "completed", "b.gff3": "completed"}
+
+    # A changed FASTA file or output setting reuses the introns file; resume=False starts over
+    with open(os.path.join(batch_dir, "a.fasta"), "a") as fasta:
+        fasta.write(">contig3\nACGT\n")
+    summary = process_batch(batch_dir, output_dir)
+    assert resumed_from(summary) == {"a.gff3": "introns", "b.gff3": "completed"}
+    summary = process_batch(batch_dir, output_dir, output_options={"compression": "stored"})
+    assert resumed_from(summary) == {"a.gff3": "introns", "b.gff3": "introns"}
+    assert resumed_from(process_batch(batch_dir, output_dir, resume=False)) == {"a.gff3": None, "b.gff3": None}
+    for entry in summary[:2]:
+        with zipfile.ZipFile(entry["output"]) as archive:
+            assert len(archive.namelist()) == len(EXPECTED_INTRONS)
+
+def test_interrupted_input_resumes_from_its_introns_file(batch_dir, tmp_path):
+    from batch_manifest import load_manifest_entry, save_manifest_entry
+    output_dir = str(tmp_path / "out")
+    process_batch(batch_dir, output_dir)
+    # As if the run had been killed after writing the introns file of a
+    entry = load_manifest_entry(output_dir, "a")
+    os.remove(entry["output"])
+    entry.update(stage="introns", status=None, output=None)
+    save_manifest_entry(output_dir, "a", entry)
+    summary = process_batch(batch_dir, output_dir)
+    assert resumed_from(summary) == {"a.gff3": "introns", "b.gff3": "completed"}
+    assert os.path.exists(summary[0]["output"])
+    assert load_manifest_entry(output_dir, "a")["stage"] == "completed"
@@ -0,0 +1,39 @@
+import os
+import sys
+
+# The benchmark scripts import each other by name, as when they are run from the benchmarks directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import pytest
+from synthetic_data import generate_dataset, gene_models
+from intron_deriver import derive_introns, TRANSCRIPT_COMMENT
+from input_scanner import scan_input
+import run_benchmarks
+
+
+@pytest.mark.parametrize("annotation_format", ["gff3", "gtf"])
+def test_dataset_has_the_requested_introns(tmp_path, annotation_format):
+    annotation_file, fasta_file = generate_dataset(str(tmp_path), 2, 10, 4, 20_000, annotation_format, seed=1)
+    introns = [line for line in derive_introns(annotation_file) if not line.startswith(TRANSCRIPT_COMMENT)]
+    assert len(introns) == 2 * 10 * 3
+    scan = scan_input(annotation_file)
+    assert scan.format == annotation_format.upper() and scan.has_introns
+    with open(fasta_file) as fasta:
+        assert sum(line.startswith(">") for line in fasta) == 2
+
+def test_gene_models_are_reproducible_and_fit_the_contigs():
+    models = list(gene_models(2, 10, 4, 20_000, seed=1))
+    assert models == list(gene_models(2, 10, 4, 20_000, seed=1))
+    for previous, following in zip(models, models[1:]):
+        if previous[0] == following[0]:
+            assert previous[3][-1][1] < following[3][0][0]
+    assert all(1 <= exons[0][0] and exons[-1][1] <= 20_000 for _, _, _, exons in models)
+    with pytest.raises(ValueError, match="too short"):
+        list(gene_models(1, 100, 10, 20_000))
+
+def test_benchmark_times_every_stage(tmp_path, monkeypatch):
+    monkeypatch.setitem(run_benchmarks.SIZES, "tiny", (2, 10, 3, 10_000))
+    result = run_benchmarks.run_benchmark("tiny", str(tmp_path))
+    assert result["introns"] == 2 * 10 * 2
+    assert [stage["stage"] for stage in result["stages"]] == ["make_introns_file", "create_database", "add_sequences", "write_fastas_zip"]
+    assert all(stage["wall_seconds"] >= 0 and stage["process_peak_rss_mb"] > 0 for stage in result["stages"])
@@ -0,0 +1,28 @@
+import os
+from compressed_io import BgzfWriter, BgzfReader, build_gzi_index, load_gzi_index, gzi_path, open_text
+
+
+def test_empty_bgzf_file_gets_an_empty_index(tmp_path):
+    path = str(tmp_path / "empty.fa.gz")
+    BgzfWriter(path).close()
+    assert load_gzi_index(path) == [(0, 0)]
+    os.remove(gzi_path(path))
+    assert build_gzi_index(path) == [(0, 0)]
+    reader = BgzfReader(path)
+    assert reader[0:10] == b""
+    reader.close()
+
+def test_bgzf_random_access_matches_the_content(tmp_path):
+    path = str(tmp_path / "data.fa.gz")
+    data = b"".join(f">seq{i}\n{'ACGT' * 40}\n".encode() for i in range(2000))
+    with BgzfWriter(path, threads=2) as writer:
+        writer.write(data)
+    written = load_gzi_index(path)
+    os.remove(gzi_path(path))
+    assert build_gzi_index(path) == written
+    reader = BgzfReader(path)
+    for start, end in ((0, 10), (65270, 65300), (len(data) - 5, len(data) + 5)):
+        assert reader[start:end] == data[start:end]
+    reader.close()
+    with open_text(path) as f:
+        assert f.read() == data.decode()
@@ -0,0 +1,38 @@
+import pytest
+import sqlalchemy as sql
+from metadata import genes, introns, indexes
+from input_processing import make_introns_file
+from database import create_database
+
+
+def intron_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(sql.select(introns.c.gene, introns.c.intron, introns.c.beg, introns.c.end).order_by(introns.c.id)).all()
+
+def test_batched_load_matches_a_single_batch_and_builds_the_indexes(genome, tmp_path):
+    gff, _ = genome
+    introns_file = make_introns_file(gff, str(tmp_path / "introns.gff"))
+    engine = create_database(introns_file)
+    assert intron_rows(create_database(introns_file, batch_size=1)) == intron_rows(engine)
+    with engine.connect() as conn:
+        assert conn.execute(sql.select(sql.func.count()).select_from(genes)).scalar() == 2
+        names = set(conn.execute(sql.text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+    assert {index.name for index in indexes} <= names
+
+def test_shared_introns_are_loaded_once_per_gene(tmp_path):
+    # Both transcripts of gene g1 have the introns at 11-20 and 31-40
+    gtf = tmp_path / "genome.gtf"
+    with open(gtf, "w") as out:
+        for transcript, exons in {"t1": [(1, 10), (21, 30), (41, 50)], "t2": [(1, 10), (21, 30), (61, 70)]}.items():
+            for beg, end in exons:
+                out.write(f'contig1\ttest\texon\t{beg}\t{end}\t.\t+\t.\tgene_id "g1"; transcript_id "{transcript}";\n')
+    engine = create_database(make_introns_file(str(gtf), str(tmp_path / "introns.gff")), batch_size=2)
+    assert [row[1:] for row in intron_rows(engine)] == [("intron1", 11, 20), ("intron2", 31, 40), ("intron3", 31, 60)]
+
+def test_unsupported_pragmas_are_rejected(genome, tmp_path):
+    gff, _ = genome
+    introns_file = make_introns_file(gff, str(tmp_path / "introns.gff"))
+    with pytest.raises(ValueError, match="Unsupported SQLite pragma"):
+        create_database(introns_file, pragmas={"foreign_keys": "ON"})
+    with pytest.raises(ValueError, match="Invalid value"):
+        create_database(introns_file, pragmas={"cache_size": "1; DROP TABLE genes"})
@@ -0,0 +1,47 @@
+import os
+import zipfile
+import pytest
+from conftest import EXPECTED_INTRONS, add_intron_features
+from compressed_io import BgzfWriter
+from input_processing import process_single_file
+
+
+@pytest.fixture
+def embedded_gff(genome, tmp_path):
+    """
+    Returns a GFF3 file with the test genome in its ##FASTA section, in a directory of its own.
+    """
+    gff, fasta = genome
+    add_intron_features(gff)
+    path = tmp_path / "embedded" / "genome.gff3"
+    path.parent.mkdir()
+    with open(gff) as annotation, open(fasta) as sequences:
+        path.write_text(annotation.read() + "##FASTA\n" + sequences.read())
+    return str(path)
+
+def output_sequences(path):
+    with zipfile.ZipFile(path) as archive:
+        return sorted(archive.read(name).decode().split("\n")[1] for name in archive.namelist())
+
+@pytest.mark.parametrize("genome_store", [False, True], ids=["fasta-index", "genome-store"])
+def test_sequences_are_read_in_place(embedded_gff, tmp_path, genome_store):
+    if genome_store:
+        pytest.importorskip("numpy")
+    output = process_single_file(embedded_gff, None, str(tmp_path / "out"), sequence_options={"genome_store": genome_store},
+                                 work_dir=str(tmp_path))
+    assert output_sequences(output) == sorted(EXPECTED_INTRONS.values())
+    # Only the index (or genome store) is written next to the input, no FASTA copy
+    written = set(os.listdir(os.path.dirname(embedded_gff))) - {"genome.gff3"}
+    assert written == ({"genome.gff3.gstore"} if genome_store else {"genome.gff3.fai"})
+
+def test_bgzip_compressed_input_is_read_in_place(embedded_gff, tmp_path):
+    compressed = embedded_gff + ".gz"
+    with open(embedded_gff, "rb") as source, BgzfWriter(compressed) as out:
+        out.write(source.read())
+    output = process_single_file(compressed, None, str(tmp_path / "out"), work_dir=str(tmp_path))
+    assert output_sequences(output) == sorted(EXPECTED_INTRONS.values())
+
+def test_missing_sequences_are_reported(genome, tmp_path):
+    gff, _ = genome
+    with pytest.raises(ValueError, match="does not contain sequences"):
+        process_single_file(add_intron_features(gff), None, str(tmp_path / "out"))
@@ -0,0 +1,32 @@
+import csv
+import pytest
+from conftest import EXPECTED_INTRONS, load_database
+from export_sinks import export_introns
+
+
+def test_tsv_sequence_length_matches_length_column(genome, tmp_path):
+    gff, fasta = genome
+    engine = load_database(gff, fasta, tmp_path)
+    (path,) = export_introns(engine, str(tmp_path / "introns"), ["tsv"], include_sequence=True)
+    with open(path) as tsv:
+        rows = list(csv.DictReader(tsv, delimiter="\t"))
+    assert len(rows) == len(EXPECTED_INTRONS)
+    for row in rows:
+        assert len(row["sequence"]) == int(row["length"]) == int(row["end"]) - int(row["start"]) + 1
+        assert row["sequence"] == EXPECTED_INTRONS[(row["contig"], int(row["start"]), int(row["end"]), row["strand"])]
+
+@pytest.mark.parametrize("export_format", ["arrow", "parquet"])
+def test_arrow_sequence_length_matches_length_column(genome, tmp_path, export_format):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    import pyarrow.parquet
+    gff, fasta = genome
+    engine = load_database(gff, fasta, tmp_path)
+    (path,) = export_introns(engine, str(tmp_path / "introns"), [export_format], include_sequence=True)
+    if export_format == "arrow":
+        table = pyarrow.ipc.open_file(path).read_all()
+    else:
+        table = pyarrow.parquet.read_table(path)
+    lengths = table.column("length").to_pylist()
+    assert [len(seq) for seq in table.column("sequence").to_pylist()] == lengths
+    assert len(lengths) == len(EXPECTED_INTRONS)
@@ -0,0 +1,50 @@
+import zipfile
+import pytest
+from conftest import EXPECTED_INTRONS, reverse_complement, load_database
+from output import iter_intron_rows
+from api import iter_introns
+from pipeline import Pipeline, run_pipeline
+
+
+def database_sequences(engine):
+    with engine.connect() as conn:
+        return {(row.contig, row.beg, row.end, row.ori): row.seq for row in iter_intron_rows(conn)}
+
+@pytest.mark.parametrize("options", [
+    {}, {"bulk": False}, {"genome_store": True}, {"workers": 2},
+], ids=["bulk", "per-intron", "genome-store", "workers"])
+def test_database_extraction_matches_planted_introns(genome, tmp_path, options):
+    gff, fasta = genome
+    assert database_sequences(load_database(gff, fasta, tmp_path, **options)) == EXPECTED_INTRONS
+
+def test_genomic_orientation_keeps_the_forward_strand(genome, tmp_path):
+    gff, fasta = genome
+    expected = {key: reverse_complement(seq) if key[3] == "-" else seq for key, seq in EXPECTED_INTRONS.items()}
+    assert database_sequences(load_database(gff, fasta, tmp_path, strand_aware=False)) == expected
+
+def test_api_extraction_matches_planted_introns(genome):
+    gff, fasta = genome
+    records = {(record.contig, record.beg, record.end, record.strand): record.seq for record in iter_introns(gff, fasta)}
+    assert records == EXPECTED_INTRONS
+
+def test_streaming_extraction_matches_planted_introns(genome, tmp_path):
+    gff, fasta = genome
+    output = run_pipeline(gff, fasta, str(tmp_path / "out"))
+    sequences = {}
+    with zipfile.ZipFile(output) as archive:
+        for name in archive.namelist():
+            header, seq = archive.read(name).decode().splitlines()
+            contig, _, position, strand = header[1:].split(" ")[:4]
+            beg, end = map(int, position.split("-"))
+            sequences[(contig, beg, end, strand)] = seq
+    assert sequences == EXPECTED_INTRONS
+
+def test_pipeline_keeps_the_error_of_the_last_stage():
+    pipeline = Pipeline()
+    pipeline.start("derive", lambda: pipeline.stopped.set() or {}["missing"])
+    with pytest.raises(ZeroDivisionError):
+        pipeline.run("write", lambda: 1 / 0)
+    pipeline = Pipeline()
+    pipeline.start("derive", lambda: {}["missing"])
+    with pytest.raises(KeyError):
+        pipeline.run("write", lambda: None)
@@ -0,0 +1,32 @@
+import os
+import pytest
+from conftest import CONTIGS, reverse_complement, write_fasta
+from fasta_index import IndexedFasta, index_path
+
+
+def test_fetch_matches_slices_across_line_breaks(tmp_path):
+    fasta = write_fasta(tmp_path / "genome.fasta", CONTIGS, line_width=7)
+    with IndexedFasta(fasta) as genome:
+        for contig, sequence in CONTIGS.items():
+            for beg in range(0, len(sequence), 3):
+                for end in range(beg, len(sequence) + 1, 5):
+                    assert genome.fetch(contig, beg, end) == sequence[beg:end]
+                    assert genome.fetch(contig, beg, end, "-") == reverse_complement(sequence[beg:end])
+
+def test_index_is_faidx_compatible_and_rebuilt_when_stale(tmp_path):
+    fasta = write_fasta(tmp_path / "genome.fasta", CONTIGS, line_width=60)
+    IndexedFasta(fasta).close()
+    with open(index_path(fasta)) as fai:
+        assert fai.readline() == f"contig1\t{len(CONTIGS['contig1'])}\t9\t60\t61\n"
+
+    write_fasta(fasta, {"contig3": "ACGT" * 10})
+    os.utime(index_path(fasta), (0, 0))  # Older than the FASTA file
+    with IndexedFasta(fasta) as genome:
+        assert genome.contigs() == ["contig3"]
+        assert genome.fetch("contig3", 4, 8) == "ACGT"
+
+def test_inconsistent_line_lengths_are_rejected(tmp_path):
+    fasta = tmp_path / "genome.fasta"
+    fasta.write_text(">contig1\nACGT\nACGTACGT\n")
+    with pytest.raises(ValueError, match="inconsistent line lengths"):
+        IndexedFasta(str(fasta))
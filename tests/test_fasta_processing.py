@@ -0,0 +1,47 @@
+import pytest
+import sqlalchemy as sql
+from conftest import CONTIGS, write_fasta, write_gff3
+from metadata import introns, sequences
+from input_processing import make_introns_file
+from database import create_database
+from fasta_processing import add_sequences
+
+
+def table_rows(engine):
+    with engine.connect() as conn:
+        intron_rows = conn.execute(sql.select(introns.c.gene, introns.c.beg, introns.c.digest).order_by(introns.c.id)).all()
+        sequence_rows = conn.execute(sql.select(sequences).order_by(sequences.c.digest)).all()
+    return intron_rows, sequence_rows
+
+def test_bulk_attach_matches_the_per_intron_loop(genome, tmp_path):
+    gff, fasta = genome
+    introns_file = make_introns_file(gff, str(tmp_path / "introns.gff"))
+    per_intron = table_rows(add_sequences(create_database(introns_file), fasta, bulk=False))
+    assert table_rows(add_sequences(create_database(introns_file), fasta)) == per_intron
+    assert table_rows(add_sequences(create_database(introns_file), fasta, batch_size=1)) == per_intron
+
+def test_bulk_attach_is_idempotent_and_skips_missing_contigs(genome, tmp_path):
+    gff, _ = genome
+    fasta = write_fasta(tmp_path / "contig1.fasta", {"contig1": CONTIGS["contig1"]})
+    engine = add_sequences(create_database(make_introns_file(gff, str(tmp_path / "introns.gff"))), fasta)
+    first = table_rows(engine)
+    assert table_rows(add_sequences(engine, fasta)) == first
+    intron_rows, sequence_rows = first
+    assert [row.digest is None for row in intron_rows] == [False, False, True, True]  # contig2 is not in the FASTA file
+    assert len(sequence_rows) == 2
+
+@pytest.mark.parametrize("genome_store", [False, True], ids=["fasta-index", "genome-store"])
+def test_contig_workers_match_a_single_process(tmp_path, genome_store):
+    if genome_store:
+        pytest.importorskip("numpy")
+    # Five contigs with introns; contig5 is missing from the FASTA file
+    contigs = {f"contig{number}": CONTIGS["contig1"] if number % 2 else CONTIGS["contig2"] for number in range(1, 5)}
+    exons = [(1, 10), (31, 40), (61, 70)]
+    gff = write_gff3(tmp_path / "genome.gff3", [(contig, "+" if number % 2 else "-", f"g{number}.t1", exons)
+                                                 for number, contig in enumerate(list(contigs) + ["contig5"], 1)])
+    fasta = write_fasta(tmp_path / "genome.fasta", contigs)
+    introns_file = make_introns_file(gff, str(tmp_path / "introns.gff"))
+    single = table_rows(add_sequences(create_database(introns_file), fasta, genome_store=genome_store))
+    parallel = table_rows(add_sequences(create_database(introns_file), fasta, genome_store=genome_store, workers=3))
+    assert parallel == single
+    assert sum(row.digest is None for row in parallel[0]) == 2
@@ -0,0 +1,35 @@
+import os
+import pytest
+from conftest import write_fasta
+from fasta_index import IndexedFasta
+
+pytest.importorskip("numpy")
+from genome_store import open_genome, store_path, genome_store_is_current
+
+# Soft-masked runs, N runs and IUPAC codes must come back exactly as in the FASTA file
+CONTIGS = {
+    "masked": "ACGTacgtNNNNNacgRYKMtttGGGCCCnnnACGT",
+    "plain": "GATTACA" * 9,
+}
+
+
+def test_store_reproduces_the_fasta_on_both_strands(tmp_path):
+    fasta = write_fasta(tmp_path / "genome.fasta", CONTIGS, line_width=10)
+    with open_genome(fasta, use_store=True) as store, IndexedFasta(fasta) as index:
+        assert sorted(store.contigs()) == sorted(CONTIGS)
+        for contig, sequence in CONTIGS.items():
+            assert store.length(contig) == len(sequence)
+            ranges = [(beg, end, strand) for beg in range(0, len(sequence), 4)
+                      for end in range(beg, len(sequence) + 1, 7) for strand in "+-"]
+            assert store.fetch_many(contig, ranges) == index.fetch_many(contig, ranges)
+
+def test_store_is_rebuilt_when_the_fasta_changes(tmp_path):
+    fasta = write_fasta(tmp_path / "genome.fasta", CONTIGS)
+    open_genome(fasta, use_store=True).close()
+    assert genome_store_is_current(fasta, store_path(fasta))
+    write_fasta(fasta, {"plain": "ACGT" * 5})
+    os.utime(fasta, (os.path.getmtime(fasta) + 10,) * 2)
+    assert not genome_store_is_current(fasta, store_path(fasta))
+    with open_genome(fasta, use_store=True) as store:
+        assert store.contigs() == ["plain"]
+        assert store.fetch("plain", 1, 6, "-") == "GTACG"
@@ -0,0 +1,22 @@
+from conftest import write_gff3
+from input_scanner import scan_input
+
+
+def test_coding_sequence_comments_are_not_a_genome(tmp_path):
+    gff = write_gff3(tmp_path / "augustus.gff3", [("contig1", "+", "g1.t1", [(1, 10), (31, 40)])])
+    with open(gff, "a") as out:
+        out.write("# coding sequence = [atgaaacccgggttt]\n")
+    scan = scan_input(gff)
+    assert scan.has_coding_sequences
+    assert not scan.has_sequences
+
+def test_fasta_section_is_an_embedded_genome(genome, tmp_path):
+    gff, fasta = genome
+    with open(gff) as annotation:
+        content = annotation.read()
+    with open(fasta) as sequences:
+        path = tmp_path / "embedded.gff3"
+        path.write_text(content + "##FASTA\n" + sequences.read())
+    scan = scan_input(str(path))
+    assert scan.has_sequences
+    assert scan.fasta_offset == len(content.encode()) + len("##FASTA\n")
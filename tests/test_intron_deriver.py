@@ -0,0 +1,45 @@
+import pytest
+from conftest import write_gff3
+from intron_deriver import derive_introns, TRANSCRIPT_COMMENT
+
+
+def gffutils_introns(path):
+    gffutils = pytest.importorskip("gffutils")
+    db = gffutils.create_db(path, dbfn=":memory:", id_spec=None, merge_strategy="create_unique", force=True)
+    return [str(intron) for intron in db.create_introns("exon")]
+
+def write_gtf(path, transcripts):
+    with open(path, "w") as out:
+        for gene, transcript, strand, exons in transcripts:
+            for beg, end in exons:
+                out.write(f'contig1\ttest\texon\t{beg}\t{end}\t.\t{strand}\t.\tgene_id "{gene}"; transcript_id "{transcript}";\n')
+    return str(path)
+
+def test_gff3_introns_match_gffutils(tmp_path):
+    # Exons out of order, a single-exon transcript, adjacent exons (no intron) and two contigs
+    gff = write_gff3(tmp_path / "genome.gff3", [
+        ("contig1", "+", "g1.t1", [(41, 50), (1, 10), (21, 30)]),
+        ("contig1", "+", "g1.t2", [(1, 10), (61, 70)]),
+        ("contig1", "-", "g2.t1", [(101, 110)]),
+        ("contig2", "-", "g3.t1", [(1, 10), (11, 20), (31, 40)]),
+    ])
+    derived = [line for line in derive_introns(gff) if not line.startswith(TRANSCRIPT_COMMENT)]
+    assert derived == gffutils_introns(gff)
+
+def test_gtf_introns_match_gffutils(tmp_path):
+    gtf = write_gtf(tmp_path / "genome.gtf", [
+        ("g2", "g2.t1", "-", [(101, 110), (121, 130), (141, 150)]),
+        ("g1", "g1.t2", "+", [(1, 10), (61, 70)]),
+        ("g1", "g1.t1", "+", [(1, 10), (21, 30), (41, 50)]),
+    ])
+    derived = [line for line in derive_introns(gtf) if not line.startswith(TRANSCRIPT_COMMENT)]
+    assert derived == gffutils_introns(gtf)
+
+def test_transcript_comments_precede_their_introns(tmp_path):
+    gff = write_gff3(tmp_path / "genome.gff3", [
+        ("contig1", "+", "g1.t1", [(1, 10), (21, 30), (41, 50)]),
+        ("contig1", "+", "g1.t2", [(1, 10), (61, 70)]),
+    ])
+    lines = list(derive_introns(gff))
+    assert [line for line in lines if line.startswith(TRANSCRIPT_COMMENT)] == ["# transcript g1.t1", "# transcript g1.t2"]
+    assert [len(line.split("\t")) for line in lines] == [1, 9, 9, 1, 9]
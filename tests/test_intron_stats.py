@@ -0,0 +1,89 @@
+import pytest
+import sqlalchemy as sql
+from conftest import load_database
+from metadata import introns
+from intron_stats import add_intron_stats
+
+pytest.importorskip("numpy")
+
+
+def intron_stats(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(sql.select(introns.c.beg, introns.c.ori, introns.c.donor, introns.c.acceptor,
+                                       introns.c.splice_site, introns.c.position, introns.c.intron_count)).all()
+    return {(row.beg, row.ori): row for row in rows}
+
+@pytest.mark.parametrize("strand_aware", [True, False], ids=["transcript-orientation", "genomic-orientation"])
+def test_splice_sites_are_classified_on_both_strands(genome, tmp_path, strand_aware):
+    gff, fasta = genome
+    engine = load_database(gff, fasta, tmp_path, strand_aware=strand_aware)
+    add_intron_stats(engine, strand_aware=strand_aware)
+    stats = intron_stats(engine)
+    # (beg, strand) -> donor, acceptor, splice site, position from the 5' end
+    expected = {
+        (11, "+"): ("GT", "AG", "GT-AG", 1),
+        (41, "+"): ("GC", "AG", "GC-AG", 2),
+        (11, "-"): ("GC", "AG", "GC-AG", 2),
+        (41, "-"): ("GT", "AG", "GT-AG", 1),
+    }
+    for key, (donor, acceptor, splice_site, position) in expected.items():
+        row = stats[key]
+        assert (row.donor, row.acceptor, row.splice_site, row.position, row.intron_count) == (donor, acceptor, splice_site, position, 2)
+
+def test_positions_are_counted_per_transcript(tmp_path):
+    from conftest import write_gff3
+    from input_processing import make_introns_file
+    from database import create_database
+    # Both transcript names become gene "g" under the gene-name rule, but they are separate transcripts
+    gff = write_gff3(tmp_path / "collide.gff3", [
+        ("contig1", "+", "g1.t1", [(1, 10), (21, 30), (41, 50)]),
+        ("contig1", "+", "g11.t1", [(101, 110), (121, 130), (141, 150), (161, 170)]),
+    ])
+    engine = create_database(make_introns_file(gff, str(tmp_path / "introns.gff")))
+    add_intron_stats(engine)
+    with engine.connect() as conn:
+        rows = conn.execute(sql.select(introns.c.gene, introns.c.transcript, introns.c.position, introns.c.intron_count)
+                            .order_by(introns.c.beg)).all()
+    assert {row.gene for row in rows} == {"g"}
+    assert [(row.transcript, row.position, row.intron_count) for row in rows] == [
+        ("g1.t1", 1, 2), ("g1.t1", 2, 2), ("g11.t1", 1, 3), ("g11.t1", 2, 3), ("g11.t1", 3, 3),
+    ]
+
+def transcript_positions(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(sql.select(introns.c.beg, introns.c.end, introns.c.transcript, introns.c.position,
+                                       introns.c.intron_count).order_by(introns.c.beg, introns.c.end)).all()
+    return [tuple(row) for row in rows]
+
+def test_positions_of_alternative_transcripts_gtf(tmp_path):
+    from input_processing import make_introns_file
+    from database import create_database
+    # t1 and t2 share their first two introns; t2's third intron ends later
+    exons = {"g1.t1": [(1, 10), (21, 30), (41, 50), (61, 70)], "g1.t2": [(1, 10), (21, 30), (41, 50), (81, 90)]}
+    gtf = tmp_path / "alternative.gtf"
+    with open(gtf, "w") as out:
+        for transcript, transcript_exons in exons.items():
+            for beg, end in transcript_exons:
+                out.write(f'contig1\ttest\texon\t{beg}\t{end}\t.\t+\t.\tgene_id "g1"; transcript_id "{transcript}";\n')
+    engine = create_database(make_introns_file(str(gtf), str(tmp_path / "introns.gff")))
+    assert transcript_positions(engine) == [
+        (11, 20, "g1.t1", 1, 3), (31, 40, "g1.t1", 2, 3), (51, 60, "g1.t1", 3, 3), (51, 80, "g1.t2", 3, 3),
+    ]
+
+def test_positions_of_transcripts_sharing_exons_gff3(tmp_path):
+    from input_processing import make_introns_file
+    from database import create_database
+    # The first and last exons belong to both transcripts, so the merged Parent of every intron lists both
+    features = [("gene", 1, 50, "ID=g1"), ("mRNA", 1, 50, "ID=g1.t1;Parent=g1"), ("mRNA", 1, 50, "ID=g1.t2;Parent=g1"),
+                ("exon", 1, 10, "Parent=g1.t1,g1.t2"), ("exon", 21, 30, "Parent=g1.t1"),
+                ("exon", 25, 35, "Parent=g1.t2"), ("exon", 41, 50, "Parent=g1.t1,g1.t2")]
+    gff = tmp_path / "shared.gff3"
+    with open(gff, "w") as out:
+        out.write("##gff-version 3\n")
+        for featuretype, beg, end, attributes in features:
+            out.write(f"contig1\ttest\t{featuretype}\t{beg}\t{end}\t.\t-\t.\t{attributes}\n")
+    engine = create_database(make_introns_file(str(gff), str(tmp_path / "introns.gff")))
+    # Minus strand: the 5' intron of each transcript is the one closest to the end
+    assert transcript_positions(engine) == [
+        (11, 20, "g1.t1", 2, 2), (11, 24, "g1.t2", 2, 2), (31, 40, "g1.t1", 1, 2), (36, 40, "g1.t2", 1, 2),
+    ]
@@ -0,0 +1,47 @@
+import os
+import sqlalchemy as sql
+from conftest import CONTIGS, EXPECTED_INTRONS, add_intron_features, load_database, write_fasta
+from metadata import sequences
+from intron_store import append_genome, store_summary, query_introns, open_store
+from input_processing import process_single_file
+
+
+def stored_sequences(store_path):
+    store = open_store(store_path)
+    try:
+        with store.connect() as conn:
+            return conn.execute(sql.select(sql.func.count()).select_from(sequences)).scalar()
+    finally:
+        store.dispose()
+
+def test_genomes_share_the_store_sequences(genome, tmp_path):
+    gff, fasta = genome
+    store_path = str(tmp_path / "store.sqlite")
+    engine = load_database(gff, fasta, tmp_path)
+    assert append_genome(engine, store_path, "a") == append_genome(engine, store_path, "b") == 4
+    assert [(entry["genome"], entry["genes"], entry["introns"], entry["sequenced"]) for entry in store_summary(store_path)] == [
+        ("a", 2, 4, 4), ("b", 2, 4, 4),
+    ]
+    assert stored_sequences(store_path) == len(EXPECTED_INTRONS)
+    region = list(query_introns(store_path, "b", "contig2", 35, 100))
+    assert [(row.beg, row.end, row.seq) for row in region] == [(41, 60, EXPECTED_INTRONS[("contig2", 41, 60, "-")])]
+
+def test_appending_a_genome_again_replaces_it(genome, tmp_path):
+    gff, fasta = genome
+    store_path = str(tmp_path / "store.sqlite")
+    append_genome(load_database(gff, fasta, tmp_path), store_path, "a")
+    # The second run of the genome only has the sequences of contig1
+    contig1 = write_fasta(tmp_path / "contig1.fasta", {"contig1": CONTIGS["contig1"]})
+    append_genome(load_database(gff, contig1, tmp_path), store_path, "a")
+    assert [(entry["introns"], entry["sequenced"]) for entry in store_summary(store_path)] == [(4, 2)]
+    assert stored_sequences(store_path) == 2  # The contig2 sequences are no longer used
+
+def test_pipeline_appends_through_a_spilled_database(genome, tmp_path):
+    gff, fasta = genome
+    add_intron_features(gff)
+    store_path = str(tmp_path / "store.sqlite")
+    spill_dir = tmp_path / "spill"
+    process_single_file(gff, fasta, str(tmp_path / "out"), store_options={"path": store_path, "spill_dir": str(spill_dir)})
+    assert [entry["genome"] for entry in store_summary(store_path)] == ["genome"]
+    assert {(row.contig, row.beg, row.end, row.ori): row.seq for row in query_introns(store_path)} == EXPECTED_INTRONS
+    assert os.listdir(spill_dir) == []
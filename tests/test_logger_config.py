@@ -0,0 +1,36 @@
+import os
+import sys
+import logging
+import subprocess
+from logger_config import AggregatedWarning
+
+MAIN_CODE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main_code")
+
+
+def test_repeated_warnings_are_logged_once_with_a_count(caplog):
+    duplicates = AggregatedWarning("Duplicate introns skipped", interval=3600, examples=2)
+    with caplog.at_level(logging.WARNING):
+        for item in ("intron1", "intron2", "intron3"):
+            duplicates.add(item)
+        assert caplog.messages == []
+        duplicates.flush()
+        duplicates.flush()  # Nothing new to report
+    assert caplog.messages == ["Duplicate introns skipped: 3 (e.g. intron1, intron2)"]
+
+def test_warnings_are_reported_again_after_the_interval(caplog):
+    missing = AggregatedWarning("Contigs not found", interval=0)
+    with caplog.at_level(logging.WARNING):
+        missing.add()
+        missing.add()
+        missing.flush()
+    assert caplog.messages == ["Contigs not found: 1", "Contigs not found: 2"]
+
+def test_help_does_not_load_the_pipeline(tmp_path):
+    script = ("import sys; sys.argv = ['main.py', '--help']; import main\n"
+              "try:\n    main.main()\nexcept SystemExit:\n    pass\n"
+              "print(sorted(name for name in ('sqlalchemy', 'gffutils', 'numpy') if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": MAIN_CODE})
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines()[-1] == "[]"
+    assert os.listdir(tmp_path) == []  # No log file either
@@ -0,0 +1,46 @@
+import zipfile
+import pytest
+from conftest import EXPECTED_INTRONS, load_database
+from fasta_index import IndexedFasta
+from output import write_output
+
+
+def zip_members(path):
+    with zipfile.ZipFile(path) as archive:
+        return {info.filename: (info.compress_type, archive.read(info)) for info in archive.infolist()}
+
+def test_intron_layout_compression_only_changes_the_zip_method(genome, tmp_path):
+    gff, fasta = genome
+    engine = load_database(gff, fasta, tmp_path)
+    stored = zip_members(write_output(engine, str(tmp_path / "stored"), compression="stored"))
+    deflated = zip_members(write_output(engine, str(tmp_path / "deflated"), compresslevel=9))
+    assert {method for method, _ in stored.values()} == {zipfile.ZIP_STORED}
+    assert {method for method, _ in deflated.values()} == {zipfile.ZIP_DEFLATED}
+    assert {name: data for name, (_, data) in stored.items()} == {name: data for name, (_, data) in deflated.items()}
+    assert len(stored) == len(EXPECTED_INTRONS)
+
+def test_contig_layout_fai_points_at_the_sequences(genome, tmp_path):
+    gff, fasta = genome
+    path = write_output(load_database(gff, fasta, tmp_path), str(tmp_path / "contigs"), layout="contig", write_fai=True)
+    with zipfile.ZipFile(path) as archive:
+        assert sorted(archive.namelist()) == ["contig1.fasta", "contig1.fasta.fai", "contig2.fasta", "contig2.fasta.fai"]
+        for contig in ("contig1", "contig2"):
+            data = archive.read(f"{contig}.fasta")
+            sequences = set()
+            for line in archive.read(f"{contig}.fasta.fai").decode().splitlines():
+                _, length, offset, _, _ = line.split("\t")
+                sequences.add(data[int(offset):int(offset) + int(length)].decode())
+            assert sequences == {seq for key, seq in EXPECTED_INTRONS.items() if key[0] == contig}
+
+def test_bgzip_genome_layout_is_random_access(genome, tmp_path):
+    gff, fasta = genome
+    path = write_output(load_database(gff, fasta, tmp_path), str(tmp_path / "genome"), layout="genome",
+                        compression="bgzip", threads=2, write_fai=True)
+    assert path == str(tmp_path / "genome.fa.gz")
+    with IndexedFasta(path) as introns:
+        assert sorted(introns.fetch(name, 0, introns.length(name)) for name in introns.contigs()) == sorted(EXPECTED_INTRONS.values())
+
+def test_bgzip_needs_a_multi_fasta_layout(genome, tmp_path):
+    gff, fasta = genome
+    with pytest.raises(ValueError, match="multi-FASTA layout"):
+        write_output(load_database(gff, fasta, tmp_path), str(tmp_path / "introns"), compression="bgzip")
@@ -0,0 +1,28 @@
+import os
+import sys
+import json
+import subprocess
+from conftest import add_intron_features
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main_code", "main.py")
+
+
+def run_main(tmp_path, *args):
+    return subprocess.run([sys.executable, MAIN, *args], cwd=tmp_path, capture_output=True, text=True)
+
+def test_profile_report_lists_stages_and_counters(genome, tmp_path):
+    gff, fasta = genome
+    result = run_main(tmp_path, "--input", add_intron_features(gff), "--fasta", fasta, "--output", str(tmp_path / "out"),
+                      "--profile", "profile.json", "--cprofile", "slowest.prof")
+    assert result.returncode == 0, result.stderr
+    with open(tmp_path / "profile.json") as f:
+        stages = {stage["stage"]: stage for stage in json.load(f)["stages"]}
+    assert {"create_database", "add_sequences"} <= set(stages)
+    assert stages["create_database"]["counters"]["introns"] == 4
+    assert os.path.getsize(tmp_path / "slowest.prof") > 0
+
+def test_cprofile_requires_profile(genome, tmp_path):
+    gff, fasta = genome
+    result = run_main(tmp_path, "--input", gff, "--fasta", fasta, "--output", str(tmp_path / "out"), "--cprofile", "slowest.prof")
+    assert result.returncode == 2
+    assert "--profile" in result.stderr
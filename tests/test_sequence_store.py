@@ -0,0 +1,32 @@
+import json
+import zipfile
+from conftest import EXPECTED_INTRONS, load_database
+from sequence_store import SequenceStore, sequence_digest
+from output import write_output
+
+
+def entries(*seqs):
+    return [(sequence_digest(seq), seq, copies) for seq, copies in seqs]
+
+def test_store_keeps_each_sequence_once_across_genomes(tmp_path):
+    with SequenceStore(str(tmp_path / "sequences.sqlite")) as store:
+        assert store.add_genome("a", entries(("ACGT", 2), ("GGTTAA", 1))) == 2
+        assert store.add_genome("b", entries(("ACGT", 1))) == 0
+        # Adding a genome again replaces its references
+        assert store.add_genome("b", entries(("ACGT", 3))) == 0
+        assert sorted(seq for _, seq in store.iter_sequences(["b"])) == ["ACGT"]
+        assert len(list(store.iter_sequences())) == 2
+        stats = store.stats()
+    assert (stats["introns"], stats["total_bases"], stats["unique_sequences"], stats["stored_bases"]) == (6, 26, 2, 10)
+
+def test_unique_layout_writes_each_sequence_once(genome, tmp_path):
+    gff, fasta = genome
+    engine = load_database(gff, fasta, tmp_path)
+    path = write_output(engine, str(tmp_path / "unique"), layout="unique")
+    with zipfile.ZipFile(path) as archive:
+        fasta_lines = archive.read("sequences.fasta").decode().split()
+        mapping = archive.read("mapping.tsv").decode().splitlines()[1:]
+        stats = json.loads(archive.read("dedup_stats.json"))
+    assert sorted(fasta_lines[1::2]) == sorted(EXPECTED_INTRONS.values())
+    assert {line.split("\t")[-1] for line in mapping} == {sequence_digest(seq) for seq in EXPECTED_INTRONS.values()}
+    assert stats["unique_sequences"] == len(EXPECTED_INTRONS)
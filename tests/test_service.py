@@ -0,0 +1,84 @@
+import json
+import asyncio
+import zipfile
+from conftest import add_intron_features
+from service import IntronService, handle_http
+from input_processing import process_single_file
+
+
+def zip_members(path):
+    with zipfile.ZipFile(path) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+async def http_get(service, target):
+    """
+    Sends one GET request to the service over HTTP on a free local port and returns (status line, response).
+    """
+    server = await asyncio.start_server(lambda r, w: handle_http(service, r, w), "127.0.0.1", 0)
+    async with server:
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        status, _, body = (await reader.read()).decode().partition("\r\n\r\n")
+        writer.close()
+    return status.splitlines()[0], json.loads(body)
+
+
+def test_export_rejects_paths_and_options_outside_the_whitelist(genome, tmp_path):
+    gff, fasta = genome
+    service = IntronService(threads=1, output_dir=str(tmp_path / "out"))
+    try:
+        for request in ({"output": "../escape"}, {"output": str(tmp_path / "abs")}, {"output": "."},
+                        {"output": "run", "output_options": {"output_file": "/tmp/x"}},
+                        {"output": "run", "output_options": {"layout": "tree"}},
+                        {"output": "run", "output_options": {"compresslevel": 42}}):
+            response = asyncio.run(service.handle({"op": "export", "annotation": gff, "fasta": fasta, **request}))
+            assert not response["ok"]
+        assert not (tmp_path / "escape.zip").exists()
+    finally:
+        service.close()
+
+def test_export_disabled_without_output_dir(genome):
+    gff, fasta = genome
+    service = IntronService(threads=1)
+    try:
+        response = asyncio.run(service.handle({"op": "export", "annotation": gff, "fasta": fasta, "output": "run"}))
+        assert not response["ok"] and "--output-dir" in response["error"]
+    finally:
+        service.close()
+
+def test_export_reuses_the_cached_annotation_and_genome(genome, tmp_path):
+    gff, fasta = genome
+    add_intron_features(gff)
+    expected = zip_members(process_single_file(gff, fasta, str(tmp_path / "pipeline")))
+    service = IntronService(threads=1, output_dir=str(tmp_path / "out"))
+
+    async def run():
+        await service.handle({"op": "gene", "annotation": gff, "fasta": fasta, "gene": "g1"})
+        first = await service.handle({"op": "export", "annotation": gff, "fasta": fasta, "output": "first"})
+        second = await service.handle({"op": "export", "annotation": gff, "fasta": fasta, "output": "second"})
+        return first, second, await service.stats()
+    try:
+        first, second, stats = asyncio.run(run())
+    finally:
+        service.close()
+    assert first["ok"] and second["ok"]
+    # The files loaded by the lookup serve both exports
+    assert stats["caches"]["annotations"]["misses"] == 1 and stats["caches"]["genomes"]["misses"] == 1
+    assert zip_members(first["output"]) == zip_members(second["output"]) == expected
+
+def test_http_get_converts_query_flags(genome, tmp_path):
+    gff, fasta = genome
+    add_intron_features(gff)
+    service = IntronService(threads=1, output_dir=str(tmp_path / "out"))
+    try:
+        status, response = asyncio.run(http_get(
+            service, f"/export?annotation={gff}&fasta={fasta}&output=run&intron_stats=1&layout=contig&compresslevel=9"))
+        assert status == "HTTP/1.1 200 OK", response
+        assert (tmp_path / "out" / "run_intron_stats.json").exists()
+        with zipfile.ZipFile(response["output"]) as archive:
+            assert sorted(archive.namelist()) == ["contig1.fasta", "contig2.fasta"]
+        status, response = asyncio.run(http_get(service, f"/export?annotation={gff}&output=run&intron_stats=maybe"))
+        assert status == "HTTP/1.1 400 Bad Request" and "intron_stats" in response["error"]
+    finally:
+        service.close()